@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Modo por lotes del YouTube Downloader
+Procesa listas de URLs sin interacción, con un pool acotado de trabajadores
+y una política de calidad en lugar de preguntar al usuario. Las uniones de video y
+audio se hacen en el pool de FFmpeg mientras los trabajadores descargan el siguiente
+"""
+
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def iter_urls(source):
+    """Lee URLs de un archivo (o '-' para stdin) de forma perezosa"""
+    stream = sys.stdin if source == '-' else open(source, encoding='utf-8')
+    try:
+        for line in stream:
+            url = line.strip()
+            if url and not url.startswith('#'):
+                yield url
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+class BatchRunner:
+    """Ejecuta descargas en paralelo y escribe un informe JSON Lines por URL"""
+
+    def __init__(self, downloader, policy, workers=4, report_path=None, on_result=None):
+        self.downloader = downloader
+        self.policy = policy
+        self.workers = max(1, workers)
+        self.report_path = report_path
+        self.on_result = on_result  # se llama con cada resultado antes de escribirlo
+
+        self._report_lock = threading.Lock()
+        self._counts = {'ok': 0, 'error': 0, 'skipped': 0}
+
+    def run(self, urls):
+        """Procesa todas las URLs y devuelve el resumen"""
+        # Limitar los trabajos pendientes (también los que esperan su unión) para no
+        # cargar toda la lista en memoria
+        pending = self.workers * 2
+        slots = threading.BoundedSemaphore(pending)
+        report = open(self.report_path, 'a', encoding='utf-8') if self.report_path else None
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for index, url in enumerate(urls):
+                    slots.acquire()
+                    future = executor.submit(self.process, index, url)
+                    future.add_done_callback(
+                        lambda f: self._collect(*f.result(), report, slots))
+            # Esperar a las uniones que sigan en el pool de FFmpeg
+            for _ in range(pending):
+                slots.acquire()
+        finally:
+            if report:
+                report.close()
+
+        return dict(self._counts)
+
+    def process(self, index, url):
+        """Analiza y descarga una URL aplicando la política de calidad
+
+        Devuelve (resultado, Future de la unión pendiente o None).
+        """
+        started = time.monotonic()
+        result = {'index': index, 'url': url}
+        merge = None
+
+        try:
+            if not self.downloader.validate_youtube_url(url):
+                result.update(status='skipped', error='URL no válida de YouTube')
+                return result, merge
+
+            video_info = self.downloader.get_video_info(url)
+            result['title'] = video_info['title']
+
+            selected = self.policy.select(video_info['formats'])
+            if selected is None:
+                result.update(status='skipped',
+                              error=f"Ningún formato cumple la política '{self.policy}'")
+                return result, merge
+
+            result.update(format_id=selected['format_id'], quality=selected['quality'])
+            filepath = self.downloader.download_video(
+                url, selected['format_id'], video_info['title'],
+                container=self.policy.container, quiet=True, defer_merge=True)
+            if isinstance(filepath, Future):
+                merge = filepath
+            else:
+                result['status'] = 'ok'
+
+        except Exception as e:
+            result.update(status='error', error=str(e))
+
+        finally:
+            result['elapsed'] = round(time.monotonic() - started, 3)
+
+        return result, merge
+
+    def _collect(self, result, merge, report, slots):
+        """Registra el resultado ahora o, si falta unir las pistas, cuando termine la unión"""
+        if merge is None:
+            self._finish(result, report, slots)
+            return
+        started = time.monotonic() - result['elapsed']
+
+        def merged(future):
+            try:
+                future.result()
+                result['status'] = 'ok'
+            except Exception as e:
+                result.update(status='error', error=str(e))
+            result['elapsed'] = round(time.monotonic() - started, 3)
+            self._finish(result, report, slots)
+
+        merge.add_done_callback(merged)
+
+    def _finish(self, result, report, slots):
+        """Registra el resultado de un trabajo terminado"""
+        try:
+            if self.on_result:
+                self.on_result(result)
+            with self._report_lock:
+                self._counts[result['status']] += 1
+                line = json.dumps(result, ensure_ascii=False)
+                if report:
+                    report.write(line + '\n')
+                    report.flush()
+                else:
+                    print(line, flush=True)
+        finally:
+            slots.release()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la selección de formatos
+Mide select_formats sobre diccionarios de información grabados (benchmarks/data)
+y los compara con la implementación anterior, duplicando la lista de formatos
+para simular videos con cientos de entradas
+
+Uso:
+    python benchmarks/bench_format_selection.py
+    python benchmarks/bench_format_selection.py --escala 1 4 16 --repeticiones 2000
+    python benchmarks/bench_format_selection.py --grabar URL   # añade una grabación nueva
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from format_selection import COMBINED_POLICY, DEFAULT_POLICY, select_formats  # noqa: E402
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# Campos que se guardan de cada formato (sin URLs ni cabeceras firmadas)
+KEPT_FIELDS = ('format_id', 'format_note', 'ext', 'protocol', 'vcodec', 'acodec', 'width',
+               'height', 'fps', 'tbr', 'vbr', 'abr', 'asr', 'filesize', 'filesize_approx',
+               'video_ext', 'audio_ext')
+
+
+def legacy_select(info, combined_only=False, cap=10):
+    """Selección anterior (copiada en la CLI y en las GUIs), como referencia"""
+    formats = []
+    for fmt in info.get('formats', []):
+        if fmt.get('height') and fmt.get('vcodec') != 'none' and fmt.get('acodec') != 'none':
+            formats.append({'format_id': fmt['format_id'], 'height': fmt['height'],
+                            'fps': fmt.get('fps', 30), 'filesize': fmt.get('filesize', 0),
+                            'quality': f"{fmt['height']}p", 'ext': fmt.get('ext'),
+                            'type': 'combined'})
+    if not combined_only and len(formats) < 3:
+        for fmt in info.get('formats', []):
+            if fmt.get('height') and fmt.get('vcodec') != 'none' and fmt.get('acodec') == 'none':
+                formats.append({'format_id': f"{fmt['format_id']}+bestaudio",
+                                'height': fmt['height'], 'fps': fmt.get('fps', 30),
+                                'filesize': fmt.get('filesize', 0),
+                                'quality': f"{fmt['height']}p", 'ext': fmt.get('ext'),
+                                'type': 'separate'})
+    formats.sort(key=lambda x: x['height'], reverse=True)
+    seen_heights = set()
+    unique_formats = []
+    for fmt in formats:
+        if fmt['height'] not in seen_heights:
+            unique_formats.append(fmt)
+            seen_heights.add(fmt['height'])
+    return unique_formats[:cap]
+
+
+def load_recordings():
+    """Lee las grabaciones de benchmarks/data"""
+    recordings = {}
+    for path in sorted(DATA_DIR.glob("*.json")):
+        with open(path, encoding='utf-8') as f:
+            recordings[path.stem] = json.load(f)
+    return recordings
+
+
+def scale_info(info, factor):
+    """Repite 'factor' veces los formatos adaptativos, como las pistas por idioma o HDR"""
+    if factor <= 1:
+        return info
+    formats = []
+    for fmt in info['formats']:
+        formats.append(fmt)
+        if fmt.get('vcodec') == 'none' or fmt.get('acodec') == 'none':
+            formats.extend(dict(fmt, format_id=f"{fmt['format_id']}-{copy}")
+                           for copy in range(1, factor))
+    return dict(info, formats=formats)
+
+
+def measure(fn, info, repetitions, rounds=5):
+    """Mediana de microsegundos por llamada en varias rondas"""
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repetitions):
+            fn(info)
+        timings.append((time.perf_counter() - start) / repetitions * 1e6)
+    return statistics.median(timings)
+
+
+def record(url, name=None):
+    """Graba la información de un video sin URLs para usarla como referencia"""
+    import yt_dlp
+
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'noplaylist': True}) as ydl:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+
+    recording = {
+        'id': info.get('id'),
+        'title': info.get('title'),
+        'duration': info.get('duration'),
+        'uploader': info.get('uploader'),
+        'extractor': info.get('extractor'),
+        'formats': [{key: fmt[key] for key in KEPT_FIELDS if fmt.get(key) is not None}
+                    for fmt in info.get('formats') or ()],
+    }
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    path = DATA_DIR / f"{name or recording['id']}.json"
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(recording, f, ensure_ascii=False, indent=1)
+    print(f"💾 Grabado {path} ({len(recording['formats'])} formatos)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la selección de formatos")
+    parser.add_argument('--escala', type=int, nargs='+', default=[1, 8, 32],
+                        help="Veces que se repiten los formatos adaptativos")
+    parser.add_argument('--repeticiones', type=int, default=500,
+                        help="Llamadas por ronda de medición")
+    parser.add_argument('--grabar', metavar='URL',
+                        help="Graba la información de un video en benchmarks/data")
+    parser.add_argument('--nombre', help="Nombre del archivo de la grabación")
+    args = parser.parse_args(argv)
+
+    if args.grabar:
+        record(args.grabar, args.nombre)
+        return 0
+
+    recordings = load_recordings()
+    if not recordings:
+        print(f"❌ No hay grabaciones en {DATA_DIR}")
+        return 1
+
+    print(f"{'grabación':<16}{'formatos':>9}{'anterior µs':>13}{'CLI µs':>9}{'GUI µs':>9}"
+          f"{'estimados':>11}")
+    print("-" * 67)
+    for name, info in recordings.items():
+        for factor in args.escala:
+            scaled = scale_info(info, factor)
+            legacy = measure(legacy_select, scaled, args.repeticiones)
+            cli = measure(lambda i: select_formats(i, DEFAULT_POLICY), scaled, args.repeticiones)
+            gui = measure(lambda i: select_formats(i, COMBINED_POLICY), scaled, args.repeticiones)
+
+            options = select_formats(scaled)
+            estimated = sum(1 for option in options if option['filesize_estimated'])
+            unknown_before = sum(1 for option in legacy_select(scaled) if not option['filesize'])
+            print(f"{name[:15]:<16}{len(scaled['formats']):>9}{legacy:>13.1f}{cli:>9.1f}"
+                  f"{gui:>9.1f}{estimated:>6}/{len(options):<4}"
+                  f"(antes {unknown_before} sin tamaño)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
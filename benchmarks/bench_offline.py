@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Benchmarks sin conexión
+Ejecuta get_video_info, download_video y el flujo web completo contra el
+extractor de reproducción y el servidor de medios sintéticos. Cada escenario
+corre en su propio proceso para medir su CPU y su pico de memoria (RSS)
+
+Uso:
+    python benchmarks/bench_offline.py                       # todos los escenarios
+    python benchmarks/bench_offline.py info_frio progresiva  # solo algunos
+    python benchmarks/bench_offline.py --guardar-base        # guarda baselines/default.json
+    python benchmarks/bench_offline.py --comparar            # compara con la base guardada
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(BENCH_DIR))
+
+BASELINE_DIR = BENCH_DIR / "baselines"
+MIB = 1024 ** 2
+
+# Escenarios: tipo, iteraciones, concurrencia y forma del medio servido
+SCENARIOS = {
+    'info_frio': {'kind': 'info', 'iterations': 200, 'concurrency': 1},
+    'info_cache': {'kind': 'info', 'iterations': 2000, 'concurrency': 1, 'cached': True},
+    'info_concurrente': {'kind': 'info', 'iterations': 400, 'concurrency': 8,
+                         'extract_delay': 0.02},
+    'progresiva': {'kind': 'download', 'iterations': 8, 'concurrency': 1, 'size': 32 * MIB},
+    'segmentada': {'kind': 'download', 'iterations': 8, 'concurrency': 1, 'size': 32 * MIB,
+                   'connections': 4},
+    'dash': {'kind': 'download', 'iterations': 8, 'concurrency': 1, 'size': 32 * MIB,
+             'layout': 'dash'},
+    'lenta': {'kind': 'download', 'iterations': 3, 'concurrency': 1, 'size': 24 * MIB,
+              'rate': 8 * MIB},
+    'lenta_segmentada': {'kind': 'download', 'iterations': 3, 'concurrency': 1,
+                         'size': 24 * MIB, 'rate': 8 * MIB, 'connections': 4},
+    'web': {'kind': 'web', 'iterations': 24, 'concurrency': 4, 'size': 4 * MIB},
+}
+
+# Métricas comparadas con la base: (campo, True si más alto es mejor)
+COMPARED_METRICS = (
+    ('p50_ms', False),
+    ('p99_ms', False),
+    ('throughput_mib_s', True),
+    ('cpu_per_op_ms', False),
+    ('peak_rss_mib', False),
+)
+
+
+def percentile(values, fraction):
+    """Percentil con interpolación lineal entre los valores ordenados"""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def cpu_seconds():
+    """CPU del proceso y de sus hijos (FFmpeg), usuario + sistema"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+# -- Escenarios (dentro del proceso hijo) ----------------------------------------
+
+def run_info(downloader, config):
+    """Latencia de get_video_info con la caché fría o caliente"""
+    from replay import video_url
+
+    if config.get('cached'):
+        downloader.get_video_info(video_url(0))
+        return lambda index: (downloader.get_video_info(video_url(0)), 0)[1]
+
+    def operation(index):
+        # En concurrencia, grupos de 4 llamadas piden el mismo video a la vez
+        number = index // 4 if config['concurrency'] > 1 else index
+        downloader.get_video_info(video_url(number))
+        return 0
+    return operation
+
+
+def run_download(downloader, config):
+    """Latencia y rendimiento de download_video con el formato combinado"""
+    from replay import video_url
+
+    def operation(index):
+        filepath = downloader.download_video(video_url(index), '18', f"bench {index}",
+                                             quiet=True)
+        size = os.path.getsize(filepath)
+        os.remove(filepath)
+        return size
+    return operation
+
+
+def run_web(downloader, config):
+    """Flujo del frontend: /analyze, /download, /status hasta terminar y /file"""
+    import asyncio
+
+    from replay import video_url
+    from server import DownloadServer
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    # Sin envío directo: ese camino lanza yt-dlp en otro proceso, fuera del extractor
+    server = DownloadServer(downloader, max_workers=config['concurrency'] * 2,
+                            max_per_client=config['concurrency'] * 2,
+                            download_root=Path("downloads"), stream_combined=False)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_until_complete, args=(server.serve('127.0.0.1', port),),
+                     daemon=True).start()
+    _wait_for_port(port)
+
+    def request(conn, method, path, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        conn.request(method, path, body=payload, headers=headers)
+        response = conn.getresponse()
+        data = response.read()
+        if response.status >= 400:
+            raise Exception(f"{method} {path}: HTTP {response.status} {data[:200]!r}")
+        return data
+
+    def operation(index):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        try:
+            analyzed = json.loads(request(conn, 'POST', '/analyze', {
+                'url': video_url(index), 'format': 'mp4', 'quality': '360p'}))
+            job_id = analyzed['download_id']
+            request(conn, 'POST', f"/download/{job_id}")
+            while True:
+                status = json.loads(request(conn, 'GET', f"/status/{job_id}"))
+                if status['status'] == 'completed':
+                    break
+                if status['status'] == 'error':
+                    raise Exception(status.get('error'))
+                time.sleep(0.02)
+            size = len(request(conn, 'GET', f"/file/{job_id}"))
+            request(conn, 'DELETE', f"/cleanup/{job_id}")
+            return size
+        finally:
+            conn.close()
+    return operation
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise Exception(f"El servidor no arrancó en el puerto {port}")
+
+
+RUNNERS = {'info': run_info, 'download': run_download, 'web': run_web}
+
+
+def run_scenario(name, origin, iterations=None):
+    """Ejecuta un escenario en el proceso actual y devuelve sus métricas"""
+    from replay import ReplaySource, load_recordings, replay_downloader
+
+    config = dict(SCENARIOS[name])
+    if iterations:
+        config['iterations'] = iterations
+
+    source = ReplaySource(load_recordings(), origin, layout=config.get('layout', 'progressive'),
+                          media_size=config.get('size', MIB), rate=config.get('rate', 0),
+                          extract_delay=config.get('extract_delay', 0.0))
+
+    workdir = Path(tempfile.mkdtemp(prefix=f"bench-{name}-"))
+    previous_dir = os.getcwd()
+    os.chdir(workdir)  # caché, descargas y diario quedan en el directorio temporal
+    try:
+        downloader = replay_downloader(source, pool_size=max(4, config['concurrency']),
+                                       connections_per_job=config.get('connections', 1))
+        operation = RUNNERS[config['kind']](downloader, config)
+
+        latencies = []
+        errors = []
+        transferred = 0
+
+        def timed(index):
+            started = time.perf_counter()
+            size = operation(index)
+            return time.perf_counter() - started, size
+
+        cpu_before = cpu_seconds()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=config['concurrency']) as pool:
+            futures = [pool.submit(timed, index) for index in range(config['iterations'])]
+            for future in futures:
+                try:
+                    latency, size = future.result()
+                    latencies.append(latency)
+                    transferred += size
+                except Exception as e:
+                    errors.append(str(e))
+        wall = time.perf_counter() - started
+        cpu = cpu_seconds() - cpu_before
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    completed = max(1, len(latencies))
+    return {
+        'iterations': config['iterations'],
+        'concurrency': config['concurrency'],
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p90_ms': percentile(latencies, 0.90) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies, default=0) * 1000,
+        'ops_s': len(latencies) / wall if wall else 0,
+        'throughput_mib_s': transferred / MIB / wall if wall else 0,
+        'cpu_s': cpu,
+        'cpu_per_op_ms': cpu / completed * 1000,
+        # ru_maxrss está en KiB en Linux
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+# -- Proceso principal ------------------------------------------------------------
+
+def run_isolated(name, origin, iterations=None):
+    """Lanza el escenario en un proceso nuevo y lee su resultado (última línea)"""
+    command = [sys.executable, str(Path(__file__).resolve()), '--ejecutar', name,
+               '--origen', origin]
+    if iterations:
+        command += ['--iteraciones', str(iterations)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    lines = completed.stdout.strip().splitlines()
+    if completed.returncode != 0 or not lines:
+        raise Exception(completed.stderr.strip()[-500:] or f"código {completed.returncode}")
+    return json.loads(lines[-1])
+
+
+def machine_info():
+    """Datos de la máquina que se guardan junto a la base"""
+    import yt_dlp.version
+
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+        'yt_dlp': yt_dlp.version.__version__,
+    }
+
+
+def print_results(results):
+    print(f"\n{'escenario':<18}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'ops/s':>9}"
+          f"{'MiB/s':>9}{'CPU/op ms':>11}{'RSS MiB':>9}{'errores':>9}")
+    print("-" * 92)
+    for name, result in results.items():
+        print(f"{name:<18}{result['p50_ms']:>9.1f}{result['p90_ms']:>9.1f}"
+              f"{result['p99_ms']:>9.1f}{result['ops_s']:>9.1f}"
+              f"{result['throughput_mib_s']:>9.1f}{result['cpu_per_op_ms']:>11.2f}"
+              f"{result['peak_rss_mib']:>9.1f}{result['errors']:>9}")
+        if result['first_error']:
+            print(f"   ❌ {result['first_error']}")
+
+
+def compare(results, baseline, tolerance):
+    """Compara con la base y devuelve el número de regresiones"""
+    print(f"\n📊 Comparación con la base del {baseline['created']} "
+          f"(tolerancia {tolerance:.0f}%)")
+    regressions = 0
+    for name, result in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f"   {name}: sin datos en la base")
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS:
+            before, after = base.get(metric) or 0, result.get(metric) or 0
+            if not before:
+                continue
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            mark = ''
+            if worse > tolerance:
+                mark = ' ⚠️'
+                regressions += 1
+            changes.append(f"{metric} {change:+.1f}%{mark}")
+        print(f"   {name}: " + ', '.join(changes))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks sin conexión del descargador")
+    parser.add_argument('escenarios', nargs='*',
+                        help=f"escenarios a ejecutar (por defecto todos: {', '.join(SCENARIOS)})")
+    parser.add_argument('--iteraciones', type=int,
+                        help="sustituye las iteraciones de cada escenario")
+    parser.add_argument('--guardar-base', nargs='?', const='default', metavar='NOMBRE',
+                        help="guarda los resultados en benchmarks/baselines/NOMBRE.json")
+    parser.add_argument('--comparar', nargs='?', const='default', metavar='NOMBRE',
+                        help="compara con benchmarks/baselines/NOMBRE.json")
+    parser.add_argument('--tolerancia', type=float, default=15.0,
+                        help="empeoramiento en %% que cuenta como regresión (por defecto: 15)")
+    parser.add_argument('--json', metavar='ARCHIVO', help="escribe los resultados en JSON")
+    # Uso interno: ejecutar un escenario en este proceso
+    parser.add_argument('--ejecutar', help=argparse.SUPPRESS)
+    parser.add_argument('--origen', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.escenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(unknown)}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.ejecutar:
+        print(json.dumps(run_scenario(args.ejecutar, args.origen, args.iteraciones)))
+        return 0
+
+    from fake_media import FakeMediaServer
+
+    names = args.escenarios or list(SCENARIOS)
+    results = {}
+    with FakeMediaServer() as media:
+        print(f"🎞️  Medios sintéticos en {media.origin}")
+        for name in names:
+            print(f"⏱️  {name}...", flush=True)
+            try:
+                results[name] = run_isolated(name, media.origin, args.iteraciones)
+            except Exception as e:
+                print(f"   ❌ {name}: {e}")
+
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    regressions = 0
+    if args.comparar:
+        path = BASELINE_DIR / f"{args.comparar}.json"
+        if not path.exists():
+            print(f"❌ No existe la base {path}")
+            return 1
+        with open(path, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerancia)
+
+    if args.guardar_base:
+        BASELINE_DIR.mkdir(exist_ok=True)
+        path = BASELINE_DIR / f"{args.guardar_base}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'machine': machine_info(),
+                'results': results,
+            }, f, indent=2)
+        print(f"💾 Base guardada en {path}")
+
+    if regressions:
+        print(f"⚠️  {regressions} métricas empeoraron más de un {args.tolerancia:.0f}%")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de la normalización y deduplicación de URLs
+Genera listas sintéticas con las variantes habituales (watch, shorts, youtu.be,
+music, parámetros de seguimiento) y una fracción de repetidas, y compara el filtro
+de url_normalizer (tabla de IDs de 64 bits) con un set de cadenas
+
+Uso:
+    python benchmarks/bench_url_dedupe.py
+    python benchmarks/bench_url_dedupe.py --lineas 1000000 --repetidas 0.3
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from url_normalizer import UrlDeduplicator, canonical_url, video_id  # noqa: E402
+
+ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+TEMPLATES = (
+    "https://www.youtube.com/watch?v={}",
+    "https://youtube.com/watch?feature=share&v={}&t=42s",
+    "https://youtu.be/{}?si=Xy12abCD34efGH56",
+    "https://m.youtube.com/shorts/{}?feature=share",
+    "https://music.youtube.com/watch?v={}&list=RDAMVM{}",
+    "https://www.youtube.com/watch?v={}&pp=ygUEdGVzdA%3D%3D",
+)
+
+
+def make_ids(count, duplicate_ratio, seed=1):
+    """IDs reales (último carácter de 4 bits) de cada línea, con repeticiones"""
+    rng = random.Random(seed)
+    unique = max(1, int(count * (1 - duplicate_ratio)))
+    ids = [''.join(rng.choice(ALPHABET) for _ in range(10)) + rng.choice(ALPHABET[::4])
+           for _ in range(unique)]
+    ids += [rng.choice(ids) for _ in range(count - unique)]
+    rng.shuffle(ids)
+    return ids
+
+
+def iter_lines(ids, seed=2):
+    """Líneas de entrada creadas al vuelo, como al leer un archivo grande"""
+    rng = random.Random(seed)
+    for video in ids:
+        yield rng.choice(TEMPLATES).format(video, video)
+
+
+def set_dedupe(lines):
+    """Misma normalización con un set de cadenas, como referencia de memoria"""
+    seen = set()
+    for url in lines:
+        found = video_id(url)
+        if found is not None and found not in seen:
+            seen.add(found)
+            yield canonical_url(found)
+
+
+def measure(name, function, ids):
+    """Ritmo de filtrado y pico de memoria retenida (en una segunda pasada)"""
+    started = time.perf_counter()
+    kept = sum(1 for _ in function(iter_lines(ids)))
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for _ in function(iter_lines(ids)):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<12} {kept:>10} {len(ids) / elapsed:>14,.0f} {peak / 1024 ** 2:>10.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmark de la deduplicación de URLs")
+    parser.add_argument('--lineas', type=int, default=200_000,
+                        help="líneas de entrada (por defecto: 200000)")
+    parser.add_argument('--repetidas', type=float, default=0.3,
+                        help="fracción de videos repetidos (por defecto: 0.3)")
+    args = parser.parse_args(argv)
+
+    ids = make_ids(args.lineas, args.repetidas)
+    print(f"{'variante':<12} {'únicas':>10} {'líneas/s':>14} {'pico MiB':>10}")
+    print("-" * 49)
+    measure('set', set_dedupe, ids)
+    measure('VideoIdSet', lambda urls: UrlDeduplicator().filter(urls), ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Servidor local de medios sintéticos para los benchmarks
+Sirve archivos progresivos (con Range), fragmentos DASH y enlaces lentos con un
+límite de bytes por segundo por conexión, sin salir de la máquina
+
+Rutas:
+    /progressive/<tamaño>/<nombre>[?rate=N]
+    /dash/<tamaño>/<tamaño_fragmento>/<nombre>/<índice>[?rate=N]
+
+Uso:
+    python benchmarks/fake_media.py --puerto 8790
+"""
+
+import argparse
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Contenido determinista: el byte de la posición p es siempre el mismo
+BLOCK = bytes(range(256)) * 4096
+CHUNK_SIZE = 64 * 1024
+
+PROGRESSIVE_REGEX = re.compile(r'^/progressive/(?P<size>\d+)/[\w.-]+$')
+DASH_REGEX = re.compile(r'^/dash/(?P<size>\d+)/(?P<fragment>\d+)/[\w.-]+/(?P<index>\d+)$')
+RANGE_REGEX = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+
+
+def payload(start, end):
+    """Genera los bytes [start, end) del medio sintético en bloques"""
+    position = start
+    while position < end:
+        offset = position % len(BLOCK)
+        chunk = BLOCK[offset:offset + min(CHUNK_SIZE, end - position)]
+        position += len(chunk)
+        yield chunk
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Atiende las rutas de medios sintéticos"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        rate = int(parse_qs(parsed.query).get('rate', ['0'])[0] or 0)
+
+        match = PROGRESSIVE_REGEX.match(parsed.path)
+        if match:
+            return self._send_progressive(int(match.group('size')), rate)
+
+        match = DASH_REGEX.match(parsed.path)
+        if match:
+            size, fragment = int(match.group('size')), int(match.group('fragment'))
+            start = int(match.group('index')) * fragment
+            if start >= size:
+                return self._send_error(404)
+            return self._send_body(200, start, min(size, start + fragment), rate)
+
+        self._send_error(404)
+
+    def _send_progressive(self, size, rate):
+        """Archivo completo o el rango pedido (206), como un CDN de video"""
+        header = self.headers.get('Range')
+        if not header:
+            return self._send_body(200, 0, size, rate)
+
+        match = RANGE_REGEX.match(header.strip())
+        if not match or not (match.group('start') or match.group('end')):
+            return self._send_error(416, size)
+        if match.group('start'):
+            start = int(match.group('start'))
+            end = min(size, int(match.group('end')) + 1) if match.group('end') else size
+        else:
+            start, end = max(0, size - int(match.group('end'))), size
+        if start >= size or start >= end:
+            return self._send_error(416, size)
+        self._send_body(206, start, end, rate, size)
+
+    def _send_body(self, status, start, end, rate, total=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{total}")
+        self.end_headers()
+
+        started = time.monotonic()
+        sent = 0
+        try:
+            for chunk in payload(start, end):
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                if rate:
+                    # Enlace lento: no adelantarse al ritmo pedido
+                    delay = sent / rate - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_error(self, status, size=None):
+        self.send_response(status)
+        if size is not None:
+            self.send_header('Content-Range', f"bytes */{size}")
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeMediaServer:
+    """Servidor de medios sintéticos en un hilo de fondo"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), MediaHandler)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def origin(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True,
+                                        name='fake-media')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor local de medios sintéticos")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--puerto', type=int, default=8790)
+    args = parser.parse_args(argv)
+
+    server = FakeMediaServer(args.host, args.puerto)
+    print(f"🎞️  Medios sintéticos en {server.origin}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Extractor de reproducción para los benchmarks
+Devuelve las grabaciones de benchmarks/data como si fueran la respuesta de
+YouTube, con las URLs de los formatos apuntando al servidor de medios sintéticos
+"""
+
+import copy
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+
+from segmented_downloader import SegmentedYDL  # noqa: E402
+from ydl_pool import YDLPool  # noqa: E402
+
+DATA_DIR = Path(__file__).resolve().parent / "data"
+
+# IDs sintéticos de 11 caracteres: 'bench' + número de 6 cifras
+VIDEO_ID_PREFIX = 'bench'
+
+
+def load_recordings(data_dir=DATA_DIR):
+    """Lee las grabaciones de info dicts (sin URLs)"""
+    recordings = []
+    for path in sorted(Path(data_dir).glob("*.json")):
+        with open(path, encoding='utf-8') as f:
+            recordings.append(json.load(f))
+    return recordings
+
+
+def video_url(number):
+    """URL de YouTube del video sintético número 'number'"""
+    return f"https://www.youtube.com/watch?v={VIDEO_ID_PREFIX}{number:06d}"
+
+
+class ReplaySource:
+    """Convierte una grabación en un info dict servible por el servidor local"""
+
+    def __init__(self, recordings, origin, layout='progressive', media_size=8 * 1024 ** 2,
+                 fragment_size=1024 ** 2, rate=0, extract_delay=0.0):
+        if not recordings:
+            raise ValueError("No hay grabaciones en benchmarks/data")
+        self.recordings = recordings
+        self.origin = origin.rstrip('/')
+        self.layout = layout                # 'progressive' o 'dash'
+        self.media_size = media_size
+        self.fragment_size = fragment_size
+        self.rate = rate                    # bytes/s por conexión (0 = sin límite)
+        self.extract_delay = extract_delay  # simula la latencia de la extracción real
+
+    def info_for(self, video_id):
+        number = int(video_id[len(VIDEO_ID_PREFIX):])
+        recording = self.recordings[number % len(self.recordings)]
+        if self.extract_delay:
+            time.sleep(self.extract_delay)
+
+        info = copy.deepcopy(recording)
+        info.update({
+            'id': video_id,
+            'title': f"{recording.get('title') or 'Video'} #{number}",
+            'webpage_url': video_url(number),
+            'formats': [self._format(fmt, video_id) for fmt in recording.get('formats') or ()
+                        # Los storyboards no son descargables
+                        if fmt.get('vcodec') != 'none' or fmt.get('acodec') != 'none'],
+        })
+        return info
+
+    def _format(self, fmt, video_id):
+        fmt = dict(fmt)
+        name = f"{video_id}_{fmt['format_id']}.{fmt.get('ext') or 'bin'}"
+        query = f"?rate={self.rate}" if self.rate else ''
+        if self.layout == 'dash':
+            base = f"{self.origin}/dash/{self.media_size}/{self.fragment_size}/{name}/"
+            count = -(-self.media_size // self.fragment_size)
+            fmt.update({
+                'protocol': 'http_dash_segments',
+                'url': base,
+                'fragment_base_url': base,
+                'fragments': [{'path': f"{index}{query}"} for index in range(count)],
+            })
+        else:
+            fmt.update({
+                'protocol': 'https',
+                'url': f"{self.origin}/progressive/{self.media_size}/{name}{query}",
+            })
+        return fmt
+
+
+class ReplayIE(InfoExtractor):
+    """Extractor que responde con una ReplaySource en lugar de ir a YouTube"""
+
+    IE_NAME = 'replay'
+    _VALID_URL = (r'https?://(?:www\.)?youtube\.com/watch\?v='
+                  rf'(?P<id>{VIDEO_ID_PREFIX}[0-9]{{6}})')
+
+    def __init__(self, source, downloader=None):
+        super().__init__(downloader)
+        self.source = source
+
+    def _real_extract(self, url):
+        return self.source.info_for(self._match_id(url))
+
+
+class ReplayYDL(SegmentedYDL):
+    """YoutubeDL del pool que resuelve los videos sintéticos con ReplayIE"""
+
+    source = None
+
+    @classmethod
+    def for_source(cls, source):
+        return type(cls.__name__, (cls,), {'source': source})
+
+    def __init__(self, params=None, auto_init=True):
+        super().__init__(params, auto_init)
+        self.add_info_extractor(ReplayIE(self.source))
+
+    def extract_info(self, url, download=True, ie_key=None, *args, **kwargs):
+        if ie_key is None and ReplayIE.suitable(url):
+            ie_key = ReplayIE.ie_key()
+        return super().extract_info(url, download, ie_key, *args, **kwargs)
+
+
+def replay_downloader(source, pool_size=4, connections_per_job=1, max_connections=16):
+    """YouTubeDownloader cuyo pool extrae de la grabación (en el directorio actual)"""
+    from youtube_downloader import YouTubeDownloader
+
+    downloader = YouTubeDownloader(pool_size=pool_size, connections_per_job=connections_per_job,
+                                   max_connections=max_connections)
+    downloader.ydl_pool = YDLPool(max_per_partition=pool_size,
+                                  ydl_class=ReplayYDL.for_source(source))
+    return downloader
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Pool de procesos de FFmpeg
+Ejecuta como mucho un proceso de FFmpeg por núcleo (conversiones de audio y uniones
+de video+audio), pone el resto en cola por orden de llegada, los lanza con prioridad
+baja (nice) para que no quiten CPU a las descargas y anota el tiempo de CPU de cada
+proceso con os.wait4
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import FFMPEG_CPU_SECONDS, FFMPEG_QUEUE_DEPTH, FFMPEG_SECONDS, FFMPEG_WAIT_SECONDS
+
+# Prioridad de los procesos de FFmpeg (mayor = cede antes la CPU)
+DEFAULT_NICENESS = 10
+# Etapas del pool (etiqueta 'stage' de las métricas)
+STAGES = ('transcode', 'remux', 'merge')
+# Últimos caracteres de stderr que se incluyen en el error
+MAX_ERROR_OUTPUT = 500
+
+# Pools vivos del proceso: la profundidad de la cola exportada es la suma de todos
+_POOLS = weakref.WeakSet()
+for _stage in STAGES:
+    FFMPEG_QUEUE_DEPTH.labels(stage=_stage).set_function(
+        lambda stage=_stage: sum(pool._queued[stage] for pool in list(_POOLS)))
+
+
+def audio_args(source, target, codec, bitrate='192'):
+    """Argumentos para pasar una pista de audio a 'codec' (copia si no es mp3)"""
+    args = ['-i', str(source), '-vn', '-map_metadata', '0']
+    if codec == 'mp3':
+        args += ['-c:a', 'libmp3lame', '-b:a', f"{bitrate}k"]
+    else:
+        args += ['-c:a', 'copy']
+    return args + [str(target)]
+
+
+def merge_args(video, audio, target, container='mp4', reencode_audio=False):
+    """Argumentos para unir una pista de video y una de audio copiando el video"""
+    args = ['-i', str(video), '-i', str(audio), '-map', '0:v:0', '-map', '1:a:0',
+            '-c:v', 'copy']
+    if reencode_audio:
+        # Para audios que el contenedor no admite tal cual (p. ej. AAC en WebM)
+        args += ['-c:a', 'libopus' if container == 'webm' else 'aac', '-b:a', '192k']
+    else:
+        args += ['-c:a', 'copy']
+    return args + [str(target)]
+
+
+class FFmpegPool:
+    """Cola de trabajos de FFmpeg con 'workers' procesos simultáneos como mucho"""
+
+    def __init__(self, workers=None, niceness=DEFAULT_NICENESS, ffmpeg=None):
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.niceness = niceness
+        self.ffmpeg = ffmpeg or shutil.which('ffmpeg')
+        self._nice = shutil.which('nice') if niceness else None
+        # Cada hilo solo espera a su proceso: la CPU la consumen los procesos de FFmpeg
+        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                            thread_name_prefix='ffmpeg')
+        self._lock = threading.Lock()
+        self._queued = dict.fromkeys(STAGES, 0)
+        self._running = 0
+        self._stats = {'completed': 0, 'failed': 0, 'reencoded': 0, 'cpu_seconds': 0.0}
+        _POOLS.add(self)
+
+    @property
+    def available(self):
+        return self.ffmpeg is not None
+
+    def submit(self, args, stage, fallback=None):
+        """Pone en cola 'ffmpeg <args>'; el Future devuelve los tiempos del proceso
+
+        Si el proceso falla y hay 'fallback' (p. ej. recodificar en lugar de copiar),
+        se ejecuta a continuación en el mismo turno.
+        """
+        if self.ffmpeg is None:
+            raise Exception("FFmpeg no está instalado. Instálalo para convertir o unir archivos.")
+        with self._lock:
+            self._queued[stage] += 1
+        return self._executor.submit(self._run, list(args), stage, time.monotonic(),
+                                     list(fallback) if fallback else None)
+
+    def run(self, args, stage, fallback=None):
+        """Como submit, esperando el resultado"""
+        return self.submit(args, stage, fallback).result()
+
+    def _run(self, args, stage, queued_at, fallback):
+        with self._lock:
+            self._queued[stage] -= 1
+            self._running += 1
+        waited = time.monotonic() - queued_at
+        FFMPEG_WAIT_SECONDS.labels(stage=stage).observe(waited)
+
+        started = time.monotonic()
+        try:
+            returncode, cpu_seconds, errors = self._execute(self._command(args))
+            reencoded = bool(returncode and fallback)
+            if reencoded:
+                returncode, fallback_cpu, errors = self._execute(self._command(fallback))
+                cpu_seconds += fallback_cpu
+        finally:
+            with self._lock:
+                self._running -= 1
+        elapsed = time.monotonic() - started
+
+        FFMPEG_SECONDS.labels(stage=stage).observe(elapsed)
+        FFMPEG_CPU_SECONDS.labels(stage=stage).inc(cpu_seconds)
+        with self._lock:
+            self._stats['failed' if returncode else 'completed'] += 1
+            self._stats['reencoded'] += reencoded
+            self._stats['cpu_seconds'] += cpu_seconds
+        if returncode:
+            raise Exception(f"FFmpeg terminó con código {returncode}: "
+                            f"{errors.strip()[-MAX_ERROR_OUTPUT:]}")
+        return {
+            'stage': stage,
+            'wait_seconds': round(waited, 3),
+            'seconds': round(elapsed, 3),
+            'cpu_seconds': round(cpu_seconds, 3),
+            'reencoded': reencoded,
+        }
+
+    def _command(self, args):
+        command = [self.ffmpeg, '-hide_banner', '-nostdin', '-loglevel', 'error', '-y'] + args
+        if self._nice:
+            command = [self._nice, '-n', str(self.niceness)] + command
+        return command
+
+    @staticmethod
+    def _execute(command):
+        """Lanza el proceso y devuelve (código de salida, segundos de CPU, stderr)"""
+        process = subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        with process.stderr:
+            errors = process.stderr.read().decode('utf-8', 'replace')
+        if not hasattr(os, 'wait4'):
+            return process.wait(), 0.0, errors
+
+        # wait4 da el uso de CPU de este hijo, sin mezclarlo con los demás procesos
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return process.returncode, usage.ru_utime + usage.ru_stime, errors
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, cpu_seconds=round(self._stats['cpu_seconds'], 2),
+                        workers=self.workers, queued=dict(self._queued), running=self._running,
+                        available=self.available)
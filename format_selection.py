@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Selección de formatos
+Recorre info['formats'] de yt-dlp una sola vez, elige el mejor formato de cada
+altura según una política declarativa y estima el tamaño cuando yt-dlp no lo da
+"""
+
+import re
+
+POLICY_REGEX = re.compile(
+    r'^\s*(?P<mode>best|worst)?\s*'
+    r'(?:(?P<op><=|≤|<|=)?\s*(?P<height>\d+)p?)?\s*'
+    r'(?P<container>mp4|webm|mkv)?\s*$',
+    re.IGNORECASE
+)
+
+# Códecs de video de más a menos compatible (los reproductores de MP4 esperan avc1)
+DEFAULT_CODECS = ('avc1', 'h264', 'vp09', 'vp9', 'av01')
+
+# Códecs de audio que se entregan copiando la pista original, sin recodificar:
+# extensión y códec de la pista, y selector de yt-dlp si no se conoce su format_id
+LOSSLESS_AUDIO = {
+    'm4a': {'ext': 'm4a', 'acodec': 'mp4a', 'selector': 'bestaudio[ext=m4a]'},
+    'opus': {'ext': 'webm', 'acodec': 'opus', 'selector': 'bestaudio[acodec=opus]'},
+}
+AUDIO_CODECS = ('mp3',) + tuple(LOSSLESS_AUDIO)
+
+# Opciones genéricas cuando el video no tiene formatos combinados reconocibles
+FALLBACK_FORMATS = (
+    ('best[ext=mp4]/best', 'Mejor calidad disponible'),
+    ('worst[ext=mp4]/worst', 'Menor calidad disponible'),
+)
+
+
+class FormatPolicy:
+    """Qué formatos se ofrecen y cómo se ordenan las variantes de una misma altura"""
+
+    def __init__(self, combined_only=False, extensions=None, max_options=10, min_combined=3,
+                 preferred_ext='mp4', codecs=DEFAULT_CODECS, fallback=False):
+        self.combined_only = combined_only      # solo video+audio en una pista (sin FFmpeg)
+        self.extensions = tuple(extensions) if extensions else None
+        self.max_options = max_options
+        self.min_combined = min_combined        # por debajo se añaden video+bestaudio
+        self.preferred_ext = preferred_ext
+        self.codecs = tuple(codecs)
+        self.fallback = fallback                # ofrecer FALLBACK_FORMATS si no hay nada
+        self._codec_scores = {}                 # las listas repiten pocos códecs
+
+    def codec_score(self, vcodec):
+        """Puntuación del códec: mayor cuanto antes aparezca en la lista"""
+        score = self._codec_scores.get(vcodec)
+        if score is None:
+            name = (vcodec or '').lower()
+            score = next((len(self.codecs) - position
+                          for position, prefix in enumerate(self.codecs)
+                          if name.startswith(prefix)), 0)
+            self._codec_scores[vcodec] = score
+        return score
+
+    def rank(self, fmt):
+        """Clave de orden entre formatos de la misma altura (mayor es mejor)"""
+        return (
+            fmt.get('fps') or 0,
+            fmt.get('ext') == self.preferred_ext,
+            self.codec_score(fmt.get('vcodec')),
+            fmt.get('tbr') or 0,
+        )
+
+    def audio_rank(self, fmt):
+        """Clave de orden entre pistas de solo audio"""
+        # m4a se une a MP4 sin recodificar; opus/webm a WebM
+        wanted = 'm4a' if self.preferred_ext == 'mp4' else self.preferred_ext
+        return (fmt.get('ext') == wanted, fmt.get('abr') or fmt.get('tbr') or 0)
+
+
+# Políticas de cada interfaz
+DEFAULT_POLICY = FormatPolicy()
+COMBINED_POLICY = FormatPolicy(combined_only=True, extensions=('mp4', 'webm'), fallback=True)
+
+
+def estimate_size(fmt, duration):
+    """Tamaño en bytes y si es una estimación (filesize, filesize_approx o tbr × duración)"""
+    if fmt.get('filesize'):
+        return int(fmt['filesize']), False
+    if fmt.get('filesize_approx'):
+        return int(fmt['filesize_approx']), True
+    if fmt.get('tbr') and duration:
+        return int(fmt['tbr'] * 1000 / 8 * duration), True
+    return 0, False
+
+
+def select_formats(info, policy=DEFAULT_POLICY):
+    """Devuelve las opciones de descarga, una por altura, de mayor a menor calidad"""
+    duration = info.get('duration')
+    combined = {}   # altura -> (clave, formato)
+    video_only = {}
+    best_audio = None
+    best_audio_rank = None
+
+    for fmt in info.get('formats') or ():
+        vcodec = fmt.get('vcodec')
+        acodec = fmt.get('acodec')
+
+        if vcodec == 'none':
+            if acodec not in (None, 'none'):
+                rank = policy.audio_rank(fmt)
+                if best_audio is None or rank > best_audio_rank:
+                    best_audio, best_audio_rank = fmt, rank
+            continue
+
+        height = fmt.get('height')
+        if not height:
+            continue
+        if policy.extensions and fmt.get('ext') not in policy.extensions:
+            continue
+
+        table = video_only if acodec == 'none' else combined
+        rank = policy.rank(fmt)
+        current = table.get(height)
+        if current is None or rank > current[0]:
+            table[height] = (rank, fmt)
+
+    options = [_option(fmt, duration, 'combined') for _, fmt in combined.values()]
+
+    # Si no hay suficientes formatos combinados, yt-dlp une video y audio con FFmpeg
+    if not policy.combined_only and len(options) < policy.min_combined:
+        audio_size = estimate_size(best_audio, duration) if best_audio else (0, False)
+        for height, (_, fmt) in video_only.items():
+            if height not in combined:
+                options.append(_option(fmt, duration, 'separate', audio_size))
+
+    options.sort(key=lambda option: option['height'], reverse=True)
+
+    if not options and policy.fallback:
+        options = [{
+            'format_id': selector,
+            'height': 0,
+            'fps': 30,
+            'filesize': 0,
+            'filesize_estimated': False,
+            'quality': label,
+            'ext': policy.preferred_ext,
+            'type': 'basic',
+        } for selector, label in FALLBACK_FORMATS]
+
+    return options[:policy.max_options]
+
+
+def select_audio_formats(info):
+    """La mejor pista de solo audio de cada extensión, de mayor a menor bitrate"""
+    duration = info.get('duration')
+    best = {}   # extensión -> (clave, formato)
+    for fmt in info.get('formats') or ():
+        if fmt.get('vcodec') != 'none' or fmt.get('acodec') in (None, 'none'):
+            continue
+        # Primero el idioma original y las pistas sin compresión de rango dinámico
+        rank = (fmt.get('language_preference') or 0,
+                not str(fmt.get('format_id')).endswith('-drc'),
+                fmt.get('abr') or fmt.get('tbr') or 0)
+        current = best.get(fmt.get('ext'))
+        if current is None or rank > current[0]:
+            best[fmt.get('ext')] = (rank, fmt)
+
+    tracks = []
+    for _, fmt in sorted(best.values(), key=lambda item: item[0], reverse=True):
+        size, estimated = estimate_size(fmt, duration)
+        tracks.append({
+            'format_id': fmt['format_id'],
+            'ext': fmt.get('ext'),
+            'acodec': fmt.get('acodec'),
+            'abr': round(fmt.get('abr') or fmt.get('tbr') or 0),
+            'filesize': size,
+            'filesize_estimated': estimated,
+        })
+    return tracks
+
+
+def pick_audio(tracks, accept=('mp3',)):
+    """(pista, códec de salida) para el primer códec aceptado que se pueda entregar
+
+    m4a y opus solo si hay una pista de ese tipo (se copia sin pérdida); mp3 convierte
+    la mejor pista. Sin pistas conocidas se usa el selector de yt-dlp (pista None).
+    """
+    if not tracks:
+        return None, accept[0] if accept else None
+    for codec in accept:
+        if codec == 'mp3':
+            return tracks[0], codec
+        lossless = LOSSLESS_AUDIO.get(codec)
+        for track in tracks if lossless else ():
+            if track['ext'] == lossless['ext'] and \
+                    (track['acodec'] or '').startswith(lossless['acodec']):
+                return track, codec
+    return None, None
+
+
+def _option(fmt, duration, kind, audio_size=(0, False)):
+    """Opción reducida que usan la CLI, las GUIs y el servidor"""
+    size, estimated = estimate_size(fmt, duration)
+    if kind == 'separate':
+        size = size + audio_size[0] if size else 0
+        estimated = estimated or audio_size[1]
+    return {
+        'format_id': fmt['format_id'] if kind == 'combined' else f"{fmt['format_id']}+bestaudio",
+        'height': fmt['height'],
+        'fps': fmt.get('fps') or 30,
+        'filesize': size,
+        'filesize_estimated': estimated,
+        'quality': f"{fmt['height']}p",
+        'ext': fmt.get('ext'),
+        'vcodec': fmt.get('vcodec'),
+        'tbr': fmt.get('tbr'),
+        'type': kind,
+    }
+
+
+def format_filesize(size_bytes, estimated=False):
+    """Convierte bytes a formato legible ('~' si es una estimación)"""
+    if not size_bytes:
+        return "Tamaño desconocido"
+
+    prefix = '~' if estimated else ''
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size_bytes < 1024.0:
+            return f"{prefix}{size_bytes:.1f} {unit}"
+        size_bytes /= 1024.0
+    return f"{prefix}{size_bytes:.1f} TB"
+
+
+class QualityPolicy:
+    """Política de calidad, p. ej. 'best<=1080p mp4' o 'worst 360p'"""
+
+    def __init__(self, mode='best', max_height=None, exact=False, container='mp4'):
+        self.mode = mode
+        self.max_height = max_height
+        self.exact = exact
+        self.container = container
+
+    @classmethod
+    def parse(cls, text):
+        """Interpreta una política escrita como texto"""
+        match = POLICY_REGEX.match(text or '')
+        if not match:
+            raise ValueError(f"Política de calidad no válida: {text!r}")
+
+        height = match.group('height')
+        max_height = int(height) if height else None
+        op = match.group('op') or ('<=' if height else None)
+        if op == '<' and max_height:
+            max_height -= 1
+
+        return cls(
+            mode=(match.group('mode') or 'best').lower(),
+            max_height=max_height,
+            exact=op == '=',
+            container=(match.group('container') or 'mp4').lower(),
+        )
+
+    def select(self, formats):
+        """Elige una opción de la lista devuelta por select_formats"""
+        candidates = [
+            fmt for fmt in formats
+            if self.max_height is None or
+            (fmt['height'] == self.max_height if self.exact else fmt['height'] <= self.max_height)
+        ]
+        if not candidates:
+            return None
+
+        pick = max if self.mode == 'best' else min
+        return pick(candidates, key=lambda fmt: (fmt['height'], fmt.get('fps') or 0))
+
+    def __str__(self):
+        parts = [self.mode]
+        if self.max_height:
+            parts.append(f"{'=' if self.exact else '<='}{self.max_height}p")
+        parts.append(self.container)
+        return ' '.join(parts)
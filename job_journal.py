@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Diario de trabajos del servidor
+Registro de solo escritura (SQLite en modo WAL) con los cambios de estado de cada
+trabajo. Al arrancar se reproduce para recuperar los trabajos pendientes y
+continuar las descargas a medias desde sus archivos parciales
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Estados que se vuelven a encolar al recuperar el diario
+RESUMABLE_STATUSES = ('queued', 'downloading', 'processing')
+
+
+class JobJournal:
+    """Diario de solo escritura con un registro compacto por cambio de estado"""
+
+    def __init__(self, db_path=Path("downloads") / "jobs.sqlite3"):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " job_id TEXT NOT NULL,"
+            " ts REAL NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def record(self, job_id, kind, **data):
+        """Añade un registro: 'created', 'status' o 'released'"""
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO events (job_id, ts, kind, data) VALUES (?, ?, ?, ?)",
+                (job_id, time.time(), kind, payload)
+            )
+            self._db.commit()
+
+    def replay(self):
+        """Reconstruye el último estado de cada trabajo no liberado, en orden de creación"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT job_id, ts, kind, data FROM events ORDER BY seq"
+            ).fetchall()
+
+        jobs = {}
+        for job_id, ts, kind, data in rows:
+            if kind == 'released':
+                jobs.pop(job_id, None)
+                continue
+            state = jobs.setdefault(job_id, {'id': job_id, 'created_at': ts})
+            state.update(json.loads(data))
+            state['updated_at'] = ts
+        # Un trabajo sin registro 'created' no se puede reconstruir
+        return [state for state in jobs.values() if 'url' in state]
+
+    def compact(self):
+        """Sustituye el historial por un único registro por trabajo vivo"""
+        states = self.replay()
+        with self._lock:
+            self._db.execute("DELETE FROM events")
+            for state in states:
+                data = {k: v for k, v in state.items() if k not in ('id', 'updated_at')}
+                self._db.execute(
+                    "INSERT INTO events (job_id, ts, kind, data) VALUES (?, ?, 'created', ?)",
+                    (state['id'], state['updated_at'],
+                     json.dumps(data, ensure_ascii=False, separators=(',', ':')))
+                )
+            self._db.commit()
+        return len(states)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
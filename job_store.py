@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+Almacén compartido de trabajos para varias réplicas del servidor
+Guarda el registro de cada trabajo, su último estado de /status y dónde está su
+archivo, para que cualquier réplica pueda informar de un trabajo, servirlo o
+retomarlo. Las descargas en curso tienen un arriendo que su réplica renueva con
+latidos; si la réplica cae, el arriendo caduca y otra continúa la descarga.
+Dos implementaciones: SQLite en un volumen compartido y el protocolo de Redis
+(RESP), con un sustituto local de Redis para pruebas
+
+Uso del sustituto:
+    python job_store.py --port 6379
+"""
+
+import argparse
+import json
+import socket
+import socketserver
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from job_journal import RESUMABLE_STATUSES
+
+# Duración de un arriendo; la réplica que lo tiene lo renueva cada LEASE_TTL / 3
+LEASE_TTL = 30
+# Los registros que nadie toca en este tiempo se olvidan (como JOB_TTL del servidor)
+RECORD_TTL = 6 * 60 * 60
+KEY_PREFIX = 'ytdl'
+
+
+def encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+
+
+class JobStore:
+    """Base de los almacenes: todas las operaciones van en orden por un único hilo
+
+    record() y publish() no esperan (escritura diferida, como el diario); las
+    consultas se lanzan con submit() y devuelven un Future.
+    """
+
+    backend = None
+
+    def __init__(self, record_ttl=RECORD_TTL):
+        self.record_ttl = record_ttl
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='job-store')
+        self._stats = {'writes': 0, 'errors': 0}
+
+    def submit(self, fn, *args):
+        """Ejecuta fn(*args) en el hilo del almacén, después de las escrituras pendientes"""
+        return self._executor.submit(fn, *args)
+
+    def sync(self):
+        """Future que se completa cuando se han aplicado las escrituras anteriores"""
+        return self._executor.submit(lambda: None)
+
+    def record(self, job_id, kind, **data):
+        """Como JobJournal.record: 'created' y 'status' actualizan, 'released' borra"""
+        self._executor.submit(self._write, self._record, job_id, kind, data)
+
+    def publish(self, job_id, status):
+        """Último estado del trabajo tal como lo muestra /status"""
+        self._executor.submit(self._write, self.set_progress, job_id, status)
+
+    def _write(self, fn, *args):
+        try:
+            fn(*args)
+            self._stats['writes'] += 1
+        except Exception as e:
+            self._stats['errors'] += 1
+            print(f"⚠️  Error en el almacén de trabajos: {e}", file=sys.stderr)
+
+    def _record(self, job_id, kind, data):
+        if kind == 'released':
+            self.delete(job_id)
+        else:
+            self.update(job_id, data)
+
+    def stats(self):
+        return dict(self._stats, backend=self.backend)
+
+
+class SQLiteJobStore(JobStore):
+    """Registros en una base SQLite de un volumen que comparten todas las réplicas
+
+    Los arriendos usan el reloj de cada máquina, que deben estar sincronizados.
+    """
+
+    backend = 'sqlite'
+
+    def __init__(self, db_path, record_ttl=RECORD_TTL):
+        super().__init__(record_ttl)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), timeout=10, isolation_level=None,
+                                   check_same_thread=False)
+        # WAL necesita memoria compartida entre los procesos: en un volumen de red se
+        # usa el diario clásico, que se apoya en los bloqueos del sistema de archivos
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " status TEXT,"
+            " progress TEXT,"
+            " owner TEXT,"
+            " lease_until REAL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)")
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE toma el bloqueo de escritura al empezar: dos réplicas no pueden
+        # leer el mismo registro y sobrescribirse
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def update(self, job_id, fields):
+        now = time.time()
+        with self._transaction():
+            row = self._db.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            data = json.loads(row[0]) if row else {'created_at': now}
+            data.update(fields)
+            self._db.execute(
+                "INSERT INTO jobs (id, data, status, updated_at) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(id) DO UPDATE SET data = excluded.data,"
+                " status = excluded.status, updated_at = excluded.updated_at",
+                (job_id, encode(data), data.get('status'), now)
+            )
+
+    def set_progress(self, job_id, status):
+        self._db.execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?",
+                         (encode(status), time.time(), job_id))
+
+    def get(self, job_id):
+        """Registro del trabajo con 'progress' y 'lease_owner', o None"""
+        row = self._db.execute(
+            "SELECT data, progress, owner, lease_until, updated_at FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        data, progress, owner, lease_until, updated_at = row
+        state = json.loads(data)
+        state.update(id=job_id, updated_at=updated_at,
+                     progress=json.loads(progress) if progress else None,
+                     lease_owner=owner if lease_until and lease_until > time.time() else None)
+        return state
+
+    def delete(self, job_id):
+        self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def acquire(self, job_id, owner, ttl=LEASE_TTL):
+        """Toma el arriendo si nadie lo tiene vigente; True si se ha conseguido"""
+        now = time.time()
+        cursor = self._db.execute(
+            "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ?"
+            " AND (lease_until IS NULL OR lease_until < ?)",
+            (owner, now + ttl, job_id, now)
+        )
+        return cursor.rowcount == 1
+
+    def renew(self, job_ids, owner, ttl=LEASE_TTL):
+        """Renueva los arriendos de 'owner'; devuelve los que ya no son suyos"""
+        marks = ','.join('?' * len(job_ids))
+        with self._transaction():
+            self._db.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE owner = ? AND id IN ({marks})",
+                (time.time() + ttl, owner, *job_ids)
+            )
+            kept = {row[0] for row in self._db.execute(
+                f"SELECT id FROM jobs WHERE owner = ? AND id IN ({marks})", (owner, *job_ids))}
+        return set(job_ids) - kept
+
+    def release(self, job_id, owner):
+        self._db.execute(
+            "UPDATE jobs SET owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?",
+            (job_id, owner)
+        )
+
+    def orphans(self):
+        """Trabajos a medias sin arriendo vigente (su réplica ha caído)"""
+        now = time.time()
+        self._db.execute(
+            "DELETE FROM jobs WHERE updated_at < ? AND (lease_until IS NULL OR lease_until < ?)",
+            (now - self.record_ttl, now)
+        )
+        marks = ','.join('?' * len(RESUMABLE_STATUSES))
+        return [row[0] for row in self._db.execute(
+            f"SELECT id FROM jobs WHERE status IN ({marks})"
+            " AND (lease_until IS NULL OR lease_until < ?) ORDER BY updated_at",
+            (*RESUMABLE_STATUSES, now)
+        )]
+
+    def existing(self, job_ids):
+        """Los IDs de la lista que siguen en el almacén"""
+        marks = ','.join('?' * len(job_ids))
+        return {row[0] for row in self._db.execute(
+            f"SELECT id FROM jobs WHERE id IN ({marks})", tuple(job_ids))}
+
+
+class RespError(Exception):
+    """Respuesta de error del servidor RESP"""
+
+
+class RespClient:
+    """Cliente mínimo del protocolo de Redis (RESP2) sobre un socket, con pipelining"""
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._file = None
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), self.timeout)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._sock.makefile('rb')
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            self._send(setup)
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+        self._sock = self._file = None
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands):
+        """Envía todas las órdenes de una vez y devuelve sus respuestas en orden"""
+        for attempt in (0, 1):
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._send(commands)
+            except OSError:
+                # Conexión caída (p. ej. reinicio de Redis): se reintenta una vez
+                self.close()
+                if attempt:
+                    raise
+
+    def _send(self, commands):
+        self._sock.sendall(b''.join(self._encode(command) for command in commands))
+        replies = [self._read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    @staticmethod
+    def _encode(command):
+        parts = [b'*%d\r\n' % len(command)]
+        for arg in command:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts += [b'$%d\r\n' % len(data), data, b'\r\n']
+        return b''.join(parts)
+
+    def _read(self):
+        line = self._file.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Conexión cerrada por el servidor RESP")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            return RespError(rest.decode('utf-8', 'replace'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            return None if length < 0 else self._file.read(length + 2)[:-2]
+        if kind == b'*':
+            length = int(rest)
+            return None if length < 0 else [self._read() for _ in range(length)]
+        raise RespError(f"Respuesta RESP no válida: {line[:40]!r}")
+
+
+class RedisJobStore(JobStore):
+    """Registros en Redis (o cualquier servidor que hable RESP)
+
+    Cada trabajo es un hash con los campos en JSON; el arriendo es una clave con
+    caducidad (SET NX PX) y el conjunto 'active' lista los trabajos a medias.
+    """
+
+    backend = 'redis'
+
+    def __init__(self, host='localhost', port=6379, db=0, password=None, prefix=KEY_PREFIX,
+                 record_ttl=RECORD_TTL):
+        super().__init__(record_ttl)
+        self.client = RespClient(host, port, db, password)
+        self.prefix = prefix
+        self._active = f"{prefix}:active"
+
+    def _keys(self, job_id):
+        return (f"{self.prefix}:job:{job_id}", f"{self.prefix}:progress:{job_id}",
+                f"{self.prefix}:lease:{job_id}")
+
+    def update(self, job_id, fields):
+        job_key = self._keys(job_id)[0]
+        now = encode(time.time())
+        values = [item for name, value in fields.items() for item in (name, encode(value))]
+        commands = [('HSETNX', job_key, 'created_at', now),
+                    ('HSET', job_key, 'updated_at', now, *values),
+                    ('EXPIRE', job_key, int(self.record_ttl))]
+        status = fields.get('status')
+        if status is not None:
+            commands.append(('SADD' if status in RESUMABLE_STATUSES else 'SREM',
+                             self._active, job_id))
+        self.client.pipeline(commands)
+
+    def set_progress(self, job_id, status):
+        job_key, progress_key, _ = self._keys(job_id)
+        self.client.pipeline([('SET', progress_key, encode(status), 'EX', int(self.record_ttl)),
+                              ('EXPIRE', job_key, int(self.record_ttl))])
+
+    def get(self, job_id):
+        """Registro del trabajo con 'progress' y 'lease_owner', o None"""
+        job_key, progress_key, lease_key = self._keys(job_id)
+        fields, progress, owner = self.client.pipeline(
+            [('HGETALL', job_key), ('GET', progress_key), ('GET', lease_key)])
+        if not fields:
+            return None
+        state = {fields[i].decode('utf-8'): json.loads(fields[i + 1])
+                 for i in range(0, len(fields), 2)}
+        state.update(id=job_id, progress=json.loads(progress) if progress else None,
+                     lease_owner=owner.decode('utf-8') if owner else None)
+        return state
+
+    def delete(self, job_id):
+        self.client.pipeline([('DEL', *self._keys(job_id)), ('SREM', self._active, job_id)])
+
+    def acquire(self, job_id, owner, ttl=LEASE_TTL):
+        """Toma el arriendo si nadie lo tiene vigente; True si se ha conseguido"""
+        if not self.client.execute('EXISTS', self._keys(job_id)[0]):
+            return False
+        lease_key = self._keys(job_id)[2]
+        return self.client.execute('SET', lease_key, owner, 'NX', 'PX', int(ttl * 1000)) == 'OK'
+
+    def renew(self, job_ids, owner, ttl=LEASE_TTL):
+        """Renueva los arriendos de 'owner'; devuelve los que ya no son suyos"""
+        lease_keys = [self._keys(job_id)[2] for job_id in job_ids]
+        owners = self.client.pipeline([('GET', key) for key in lease_keys])
+        mine = [key for key, current in zip(lease_keys, owners)
+                if current is not None and current.decode('utf-8') == owner]
+        if mine:
+            self.client.pipeline([('PEXPIRE', key, int(ttl * 1000)) for key in mine])
+        return {job_id for job_id, current in zip(job_ids, owners)
+                if current is None or current.decode('utf-8') != owner}
+
+    def release(self, job_id, owner):
+        lease_key = self._keys(job_id)[2]
+        current = self.client.execute('GET', lease_key)
+        if current is not None and current.decode('utf-8') == owner:
+            self.client.execute('DEL', lease_key)
+
+    def orphans(self):
+        """Trabajos a medias sin arriendo vigente (su réplica ha caído)"""
+        job_ids = [member.decode('utf-8')
+                   for member in self.client.execute('SMEMBERS', self._active) or []]
+        if not job_ids:
+            return []
+        replies = self.client.pipeline(
+            [('EXISTS', key) for job_id in job_ids for key in self._keys(job_id)[::2]])
+        orphans, gone = [], []
+        for job_id, exists, leased in zip(job_ids, replies[::2], replies[1::2]):
+            if not exists:
+                gone.append(job_id)     # el registro caducó
+            elif not leased:
+                orphans.append(job_id)
+        if gone:
+            self.client.execute('SREM', self._active, *gone)
+        return orphans
+
+    def existing(self, job_ids):
+        """Los IDs de la lista que siguen en el almacén"""
+        job_ids = list(job_ids)
+        replies = self.client.pipeline([('EXISTS', self._keys(job_id)[0]) for job_id in job_ids])
+        return {job_id for job_id, exists in zip(job_ids, replies) if exists}
+
+
+def open_job_store(url):
+    """Almacén a partir de una URL: sqlite:///ruta.sqlite3 o redis://[:clave@]host[:puerto][/db]"""
+    parts = urlsplit(url)
+    if parts.scheme == 'sqlite':
+        # Como en SQLAlchemy: sqlite:///relativa.sqlite3 y sqlite:////absoluta.sqlite3
+        path = unquote(url[len('sqlite:///'):]) if url.startswith('sqlite:///') else ''
+        if not path:
+            raise ValueError(f"Falta la ruta de la base en {url!r}")
+        return SQLiteJobStore(path)
+    if parts.scheme == 'redis':
+        db = parts.path.strip('/')
+        return RedisJobStore(parts.hostname or 'localhost', parts.port or 6379,
+                             int(db) if db else 0, unquote(parts.password or '') or None)
+    raise ValueError(f"Almacén de trabajos no soportado: {url!r} (usa sqlite:/// o redis://)")
+
+
+# -- Sustituto local de Redis ----------------------------------------------------
+
+class _Status(str):
+    """Respuesta de estado simple (+OK)"""
+
+
+class LocalRespServer(socketserver.ThreadingTCPServer):
+    """Servidor RESP en memoria con las órdenes que usa RedisJobStore (para pruebas)"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0):
+        super().__init__((host, port), _RespHandler)
+        self.data = {}      # clave -> bytes, dict o set
+        self.expires = {}   # clave -> instante de caducidad (monotonic)
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Atiende conexiones en un hilo de fondo"""
+        threading.Thread(target=self.serve_forever, name='resp-standin', daemon=True).start()
+        return self
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return key in self.data
+
+    def _set_expiry(self, key, milliseconds):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + milliseconds / 1000
+        return 1
+
+    def execute(self, command, args):
+        with self.lock:
+            handler = getattr(self, f"_cmd_{command.lower()}", None)
+            if handler is None:
+                raise RespError(f"ERR orden desconocida '{command}'")
+            return handler(*args)
+
+    def _cmd_ping(self, *args):
+        return args[0] if args else _Status('PONG')
+
+    def _cmd_auth(self, *args):
+        return _Status('OK')
+
+    def _cmd_select(self, db):
+        return _Status('OK')
+
+    def _cmd_flushall(self):
+        self.data.clear()
+        self.expires.clear()
+        return _Status('OK')
+
+    def _cmd_get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    def _cmd_set(self, key, value, *options):
+        options = [option.upper() for option in options]
+        exists = self._alive(key)
+        if (b'NX' in options and exists) or (b'XX' in options and not exists):
+            return None
+        self.data[key] = value
+        self.expires.pop(key, None)
+        for unit, scale in ((b'PX', 1), (b'EX', 1000)):
+            if unit in options:
+                self._set_expiry(key, int(options[options.index(unit) + 1]) * scale)
+        return _Status('OK')
+
+    def _cmd_del(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return removed
+
+    def _cmd_exists(self, *keys):
+        return sum(self._alive(key) for key in keys)
+
+    def _cmd_expire(self, key, seconds):
+        return self._set_expiry(key, int(seconds) * 1000)
+
+    def _cmd_pexpire(self, key, milliseconds):
+        return self._set_expiry(key, int(milliseconds))
+
+    def _cmd_hset(self, key, *pairs):
+        self._alive(key)
+        fields = self.data.setdefault(key, {})
+        added = sum(name not in fields for name in pairs[::2])
+        fields.update(zip(pairs[::2], pairs[1::2]))
+        return added
+
+    def _cmd_hsetnx(self, key, name, value):
+        self._alive(key)
+        fields = self.data.setdefault(key, {})
+        if name in fields:
+            return 0
+        fields[name] = value
+        return 1
+
+    def _cmd_hgetall(self, key):
+        fields = self.data.get(key) if self._alive(key) else None
+        return [item for pair in (fields or {}).items() for item in pair]
+
+    def _cmd_sadd(self, key, *members):
+        self._alive(key)
+        values = self.data.setdefault(key, set())
+        added = len(set(members) - values)
+        values.update(members)
+        return added
+
+    def _cmd_srem(self, key, *members):
+        values = self.data.get(key) if self._alive(key) else None
+        if not values:
+            return 0
+        removed = len(values & set(members))
+        values.difference_update(members)
+        if not values:
+            del self.data[key]
+            self.expires.pop(key, None)
+        return removed
+
+    def _cmd_smembers(self, key):
+        return list(self.data[key]) if self._alive(key) else []
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    """Una conexión del sustituto: lee órdenes RESP y escribe sus respuestas"""
+
+    def handle(self):
+        while True:
+            command = self._read_command()
+            if command is None:
+                return
+            try:
+                reply = self.server.execute(command[0].decode('utf-8'), command[1:])
+            except RespError as e:
+                reply = e
+            except (TypeError, ValueError, IndexError):
+                reply = RespError(f"ERR argumentos no válidos para '{command[0].decode()}'")
+            self.wfile.write(self._encode(reply))
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b'*'):
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _encode(self, reply):
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, RespError):
+            return b'-' + str(reply).encode('utf-8') + b'\r\n'
+        if isinstance(reply, _Status):
+            return b'+' + reply.encode('utf-8') + b'\r\n'
+        if isinstance(reply, int):
+            return b':%d\r\n' % reply
+        if isinstance(reply, list):
+            return b'*%d\r\n' % len(reply) + b''.join(self._encode(item) for item in reply)
+        return b'$%d\r\n' % len(reply) + reply + b'\r\n'
+
+
+def main(argv=None):
+    """Arranca el sustituto local de Redis"""
+    parser = argparse.ArgumentParser(description="Sustituto local de Redis para el almacén de trabajos")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    args = parser.parse_args(argv)
+
+    server = LocalRespServer(args.host, args.port)
+    print(f"🗄️  Sustituto de Redis escuchando en redis://{args.host}:{server.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Sustituto detenido")
+
+
+if __name__ == "__main__":
+    main()
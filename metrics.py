@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Métricas en formato Prometheus
+Contadores, medidores e histogramas en memoria (sin dependencias) y las
+métricas de cada etapa: extracción, cola, descarga, posprocesado y envío
+"""
+
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Límites (segundos) pensados para etapas de décimas de segundo a varios minutos
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+# Mensajes de yt-dlp/FFmpeg -> clase de error para las etiquetas
+ERROR_CLASSES = (
+    ('http_429', re.compile(r'HTTP Error 429|Too Many Requests', re.IGNORECASE)),
+    ('http_403', re.compile(r'HTTP Error 403|Forbidden', re.IGNORECASE)),
+    ('http_404', re.compile(r'HTTP Error 404|Not Found', re.IGNORECASE)),
+    ('unavailable', re.compile(r'unavailable|private video|removed|terminated', re.IGNORECASE)),
+    ('geo', re.compile(r'not available in your country|geo.?restrict|geo.?block', re.IGNORECASE)),
+    ('auth', re.compile(r'sign in|confirm your age|login', re.IGNORECASE)),
+    ('ffmpeg', re.compile(r'ffmpeg|ffprobe|postprocess', re.IGNORECASE)),
+    ('network', re.compile(r'timed out|timeout|connection|network|resolve|Name or service|SSL',
+                           re.IGNORECASE)),
+    ('disk', re.compile(r'No space left|Permission denied|Errno 28', re.IGNORECASE)),
+)
+
+
+def error_class(error):
+    """Clasifica una excepción (o su mensaje) en una clase corta y estable"""
+    message = str(error)
+    for name, pattern in ERROR_CLASSES:
+        if pattern.search(message):
+            return name
+    return 'other'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class _Metric:
+    """Base común: nombre, ayuda, etiquetas y un hijo por combinación de valores"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        if registry is not False:
+            (registry or REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        """Devuelve la serie de estos valores de etiqueta"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name}: se esperaban las etiquetas {self.labelnames}")
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    def _default(self):
+        if self.labelnames:
+            raise ValueError(f"{self.name}: faltan las etiquetas {self.labelnames}")
+        return self.labels()
+
+    def render(self):
+        """Líneas del formato de exposición de texto"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        if amount < 0:
+            raise ValueError("Un contador solo puede aumentar")
+        with self._lock:
+            self.value += amount
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    """Valor que solo aumenta (bytes, aciertos, errores)"""
+
+    kind = 'counter'
+    _new_child = _CounterChild
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+        self.function = None
+
+    def set(self, value):
+        with self._lock:
+            self.value = float(value)
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Calcula el valor al exportar las métricas"""
+        self.function = function
+
+    def get(self):
+        if self.function is not None:
+            try:
+                return float(self.function())
+            except Exception:
+                return math.nan
+        return self.value
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.get())}"]
+
+
+class Gauge(_Metric):
+    """Valor que sube y baja (trabajos activos, cola, disco)"""
+
+    kind = 'gauge'
+    _new_child = _GaugeChild
+
+    def set(self, value):
+        self._default().set(value)
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+    def get(self):
+        return self._default().get()
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+
+    def observe(self, value):
+        with self._lock:
+            self.sum += value
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+    def render(self, name, labelnames, key):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            labels = _format_labels(labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, key)
+        lines.append(f"{name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{name}_count{labels} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribución de duraciones por intervalos acumulados"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry=None):
+        bounds = sorted(float(bound) for bound in buckets)
+        if bounds[-1] != math.inf:
+            bounds.append(math.inf)
+        self.buckets = tuple(bounds)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Mide la duración del bloque with"""
+        target = self.labels(**labels) if labels else self._default()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            target.observe(time.monotonic() - started)
+
+
+class Registry:
+    """Conjunto de métricas que se exportan juntas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"La métrica {metric.name} ya está registrada")
+            self._metrics[metric.name] = metric
+
+    def render(self):
+        """Texto del formato de exposición de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# -- Etapas -----------------------------------------------------------------------
+
+EXTRACTION_SECONDS = Histogram(
+    'ytdl_extraction_seconds', "Duración de la extracción de información con yt-dlp")
+QUEUE_WAIT_SECONDS = Histogram(
+    'ytdl_queue_wait_seconds', "Espera de una tarea hasta que queda libre un hilo del pool")
+DOWNLOAD_SECONDS = Histogram(
+    'ytdl_download_seconds', "Duración de la descarga sin contar el posprocesado",
+    ['kind'])
+POSTPROCESS_SECONDS = Histogram(
+    'ytdl_postprocess_seconds', "Duración de cada posprocesador (unión, remux, conversión)",
+    ['postprocessor'])
+FILE_SERVE_SECONDS = Histogram(
+    'ytdl_file_serve_seconds', "Duración del envío de un resultado al cliente", ['mode'])
+
+# -- Contadores -------------------------------------------------------------------
+
+BYTES_DOWNLOADED = Counter(
+    'ytdl_downloaded_bytes_total', "Bytes descargados desde el origen")
+BYTES_SERVED = Counter(
+    'ytdl_served_bytes_total', "Bytes enviados a los clientes", ['mode'])
+CACHE_REQUESTS = Counter(
+    'ytdl_cache_requests_total', "Consultas a las cachés por resultado",
+    ['cache', 'result'])
+FAILURES = Counter(
+    'ytdl_failures_total', "Errores por etapa y clase de error", ['stage', 'error'])
+ORIGIN_SIGNALS = Counter(
+    'ytdl_origin_signals_total', "Señales de saturación del origen (429, 403, estrangulado)",
+    ['kind', 'signal'])
+
+# -- Medidores ----------------------------------------------------------------------
+
+ACTIVE_JOBS = Gauge('ytdl_active_jobs', "Trabajos en cola o descargando")
+QUEUE_DEPTH = Gauge('ytdl_queue_depth', "Tareas esperando un hilo libre del pool")
+SCRATCH_BYTES = Gauge(
+    'ytdl_scratch_bytes', "Espacio en disco de las descargas en curso y del almacén",
+    ['area'])
+SCRATCH_RECLAIMED_BYTES = Counter(
+    'ytdl_scratch_reclaimed_bytes_total',
+    "Bytes liberados por la limpieza (caducidad o presión de disco)", ['reason'])
+DISK_USED_RATIO = Gauge(
+    'ytdl_disk_used_ratio', "Fracción usada del disco de las descargas")
+
+# -- Control de ritmo ---------------------------------------------------------------
+
+RATE_LIMIT_CONCURRENCY = Gauge(
+    'ytdl_rate_limit_concurrency', "Llamadas simultáneas al origen permitidas (AIMD)", ['kind'])
+RATE_LIMIT_EXTRACT_RATE = Gauge(
+    'ytdl_rate_limit_extractions_per_second', "Ritmo permitido de extracciones (0 = sin límite)")
+RATE_LIMIT_BACKOFF = Gauge(
+    'ytdl_rate_limit_backoff_seconds', "Pausa restante tras un 429 o 403 del origen")
+
+# -- FFmpeg ---------------------------------------------------------------------------
+
+FFMPEG_QUEUE_DEPTH = Gauge(
+    'ytdl_ffmpeg_queue_depth', "Trabajos de FFmpeg esperando un proceso libre", ['stage'])
+FFMPEG_WAIT_SECONDS = Histogram(
+    'ytdl_ffmpeg_wait_seconds', "Espera de un trabajo de FFmpeg en la cola del pool", ['stage'])
+FFMPEG_SECONDS = Histogram(
+    'ytdl_ffmpeg_seconds', "Duración de cada proceso de FFmpeg", ['stage'])
+FFMPEG_CPU_SECONDS = Counter(
+    'ytdl_ffmpeg_cpu_seconds_total', "Tiempo de CPU (usuario + sistema) de los procesos de FFmpeg",
+    ['stage'])
+
+
+class DownloadInstrument:
+    """Hooks de yt-dlp que separan el tiempo de descarga del de posprocesado"""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.postprocess_seconds = 0.0
+        self._started = {}
+
+    def progress_hook(self, d):
+        if d.get('status') == 'finished':
+            BYTES_DOWNLOADED.inc(d.get('downloaded_bytes') or d.get('total_bytes') or 0)
+
+    def postprocessor_hook(self, d):
+        name = d.get('postprocessor') or 'desconocido'
+        if d.get('status') == 'started':
+            self._started[name] = time.monotonic()
+        elif d.get('status') == 'finished' and name in self._started:
+            elapsed = time.monotonic() - self._started.pop(name)
+            self.postprocess_seconds += elapsed
+            POSTPROCESS_SECONDS.labels(postprocessor=name).observe(elapsed)
+
+    @contextmanager
+    def measure(self):
+        """Mide la llamada completa y anota la parte de descarga o el error"""
+        started = time.monotonic()
+        try:
+            yield self
+        except Exception as e:
+            FAILURES.labels(stage='download', error=error_class(e)).inc()
+            raise
+        elapsed = time.monotonic() - started
+        DOWNLOAD_SECONDS.labels(kind=self.kind).observe(max(0.0, elapsed - self.postprocess_seconds))
+
+
+def render():
+    """Exporta todas las métricas registradas"""
+    return REGISTRY.render()
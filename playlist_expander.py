@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Expansión de listas de reproducción y canales
+Convierte las URLs de listas y canales en un flujo perezoso de URLs de videos
+(extracción plana, página a página), adelanta la información de los siguientes
+videos en paralelo y guarda el último índice procesado para poder reanudar
+"""
+
+import json
+import os
+import re
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+from video_cache import extract_video_id
+
+COLLECTION_REGEX = re.compile(
+    r'(?:https?://)?(?:www\.|m\.)?youtube\.com/'
+    r'(?:playlist\?(?:.*&)?list=|@[\w.-]+|channel/[\w-]+|c/[^/?#]+|user/[^/?#]+)',
+    re.IGNORECASE
+)
+LIST_PARAM_REGEX = re.compile(r'[?&]list=([\w-]+)')
+
+# Opciones de la extracción plana: solo IDs y títulos, sin resolver cada video
+FLAT_OPTIONS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': 'in_playlist',
+    'lazy_playlist': True,
+}
+
+# Listas anidadas (pestañas de un canal) que se recorren como máximo
+MAX_NESTING = 3
+
+
+def is_collection_url(url):
+    """Indica si la URL es de una lista de reproducción o de un canal"""
+    url = url.strip()
+    if COLLECTION_REGEX.match(url):
+        return True
+    # watch?v=...&list=... se trata como video suelto: download_video usa noplaylist
+    return extract_video_id(url) is None and LIST_PARAM_REGEX.search(url) is not None
+
+
+class PlaylistExpander:
+    """Expande listas y canales en URLs de videos a medida que se descubren"""
+
+    def __init__(self, downloader, metadata_workers=4, lookahead=None, state_path=None):
+        self.downloader = downloader
+        self.metadata_workers = max(1, metadata_workers)
+        self.lookahead = lookahead or self.metadata_workers * 2
+        self.state_path = Path(state_path) if state_path else None
+
+        self._lock = threading.Lock()
+        self._state = self._load_state()    # URL de la lista -> siguiente índice
+        self._pending = {}                  # URL del video -> deque[(lista, índice)]
+        self._done = {}                     # lista -> índices terminados fuera de orden
+        self._totals = {}                   # lista -> número de entradas (al terminar)
+
+    def expand(self, urls, deduplicator=None):
+        """Genera URLs de videos; las listas se expanden sin esperar al listado completo
+
+        Con un UrlDeduplicator, cada video sale una sola vez aunque aparezca suelto y
+        en una o varias listas.
+        """
+        for url in urls:
+            if deduplicator is not None:
+                url = deduplicator.admit(url)
+                if url is None:
+                    continue
+            if is_collection_url(url):
+                yield from self._expand_collection(url.strip(), deduplicator)
+            else:
+                yield url
+
+    def iter_entries(self, url):
+        """Recorre las entradas de una lista con extracción plana (perezosa)"""
+        with self.downloader.ydl_pool.acquire(FLAT_OPTIONS) as ydl:
+            result = ydl.extract_info(url, download=False, process=False)
+            yield from self._walk(ydl, result, 0)
+
+    def _walk(self, ydl, result, depth):
+        """Devuelve las URLs de videos de un resultado, siguiendo listas anidadas"""
+        kind = result.get('_type', 'video')
+        if kind == 'video' or (kind in ('url', 'url_transparent') and
+                               result.get('ie_key') in (None, 'Youtube')):
+            video_id = result.get('id') or extract_video_id(result.get('url') or '')
+            if video_id:
+                yield f"https://www.youtube.com/watch?v={video_id}"
+            return
+
+        if depth >= MAX_NESTING:
+            return
+
+        if kind in ('url', 'url_transparent'):
+            nested = ydl.extract_info(result['url'], download=False, process=False,
+                                      ie_key=result.get('ie_key'))
+            yield from self._walk(ydl, nested, depth + 1)
+            return
+
+        for entry in result.get('entries') or ():
+            if entry:
+                yield from self._walk(ydl, entry, depth + 1)
+
+    def _expand_collection(self, source, deduplicator=None):
+        """Entrega los videos de una lista reanudando desde el último índice procesado"""
+        start = self._state.get(source, 0)
+        total = start
+        window = deque()
+
+        with ThreadPoolExecutor(max_workers=self.metadata_workers,
+                                thread_name_prefix='metadata') as prefetch:
+            entries = islice(self.iter_entries(source), start, None)
+            for index, video_url in enumerate(entries, start):
+                total = index + 1
+                if deduplicator is not None:
+                    video_url = deduplicator.admit(video_url)
+                    if video_url is None:
+                        # Repetido: ya está en la cola, la posición cuenta como hecha
+                        with self._lock:
+                            self._done.setdefault(source, set()).add(index)
+                            self._advance(source)
+                        continue
+                # Adelantar la información: la descarga la encontrará en la caché
+                # o se unirá a la extracción en curso
+                prefetch.submit(self._prefetch, video_url)
+                window.append((index, video_url))
+                if len(window) >= self.lookahead:
+                    yield self._register(source, *window.popleft())
+
+            while window:
+                yield self._register(source, *window.popleft())
+
+        with self._lock:
+            self._totals[source] = total
+            self._advance(source)
+
+    def _prefetch(self, video_url):
+        """Obtiene la información de un video antes de que llegue a la cola"""
+        try:
+            self.downloader.get_video_info(video_url)
+        except Exception:
+            pass  # El error se informará al procesar el video
+
+    def _register(self, source, index, video_url):
+        """Apunta a qué lista e índice pertenece un video entregado"""
+        with self._lock:
+            self._pending.setdefault(video_url, deque()).append((source, index))
+        return video_url
+
+    def mark_done(self, result):
+        """Callback de BatchRunner: anota el resultado y avanza el índice guardado"""
+        with self._lock:
+            positions = self._pending.get(result['url'])
+            if not positions:
+                return
+            source, index = positions.popleft()
+            if not positions:
+                del self._pending[result['url']]
+
+            result['playlist'] = source
+            result['playlist_index'] = index
+            self._done.setdefault(source, set()).add(index)
+            self._advance(source)
+
+    def _advance(self, source):
+        """Mueve el índice guardado hasta el primer video sin terminar"""
+        done = self._done.get(source, set())
+        position = self._state.get(source, 0)
+        while position in done:
+            done.discard(position)
+            position += 1
+
+        if self._totals.get(source) is not None and position >= self._totals[source]:
+            # Lista completa: la próxima ejecución empieza de nuevo
+            self._state.pop(source, None)
+            self._done.pop(source, None)
+            self._totals.pop(source, None)
+        else:
+            self._state[source] = position
+        self._save_state()
+
+    def _load_state(self):
+        """Lee el índice guardado de cada lista"""
+        if self.state_path is None or not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        """Escribe el estado de forma atómica"""
+        if self.state_path is None:
+            return
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_path)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Perfilado opcional por trabajo
+Envuelve las fases de extracción y descarga con un perfilador de muestreo (pilas
+colapsadas para flamegraph.pl o speedscope) o determinista (cProfile/pstats).
+Se activa por trabajo o por muestreo; desactivado solo cuesta leer un thread-local
+"""
+
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+MODES = ('sample', 'deterministic')
+# Intervalo de muestreo por defecto: 200 muestras por segundo
+DEFAULT_INTERVAL = 0.005
+
+_local = threading.local()
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Muestrea la pila de un hilo en segundo plano y cuenta las pilas colapsadas"""
+
+    def __init__(self, thread_id, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True, name='profiler')
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        """Formato colapsado: 'marco;marco;marco muestras' por línea"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileSession:
+    """Perfiles de las fases de un trabajo, guardados con su identificador"""
+
+    def __init__(self, profiler, tag):
+        self.profiler = profiler
+        self.tag = re.sub(r'[^\w.-]', '_', str(tag))[:80]
+        self.artifacts = []
+        self._active = False
+
+    @contextmanager
+    def phase(self, name):
+        """Perfila el bloque; las fases anidadas quedan dentro de la exterior"""
+        if self._active:
+            yield
+            return
+
+        self._active = True
+        directory = self.profiler.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        stem = directory / f"{self.tag}-{name}-{time.strftime('%Y%m%d-%H%M%S')}"
+        started = time.monotonic()
+
+        profile = None
+        if self.profiler.mode == 'deterministic':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+: solo un cProfile activo a la vez; se muestrea en su lugar
+                profile = None
+
+        if profile is not None:
+            try:
+                yield
+            finally:
+                profile.disable()
+                self._active = False
+                path = stem.with_suffix('.pstats')
+                profile.dump_stats(str(path))
+                self._saved(path, name, started)
+        else:
+            sampler = StackSampler(threading.get_ident(), self.profiler.interval)
+            sampler.start()
+            try:
+                yield
+            finally:
+                sampler.stop()
+                self._active = False
+                path = stem.with_suffix('.folded')
+                sampler.write(path)
+                self._saved(path, name, started)
+
+    def _saved(self, path, name, started):
+        self.artifacts.append({'phase': name, 'path': str(path),
+                               'seconds': round(time.monotonic() - started, 3)})
+
+
+class Profiler:
+    """Configuración del perfilado: carpeta, modo y fracción de trabajos muestreados"""
+
+    def __init__(self, directory=Path("profiles"), sample_rate=0.0, mode='sample',
+                 interval=DEFAULT_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Modo de perfilado no válido: {mode!r} (usa {' o '.join(MODES)})")
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval
+
+    def wanted(self, forced=False):
+        """Decide si se perfila un trabajo (forzado o por muestreo)"""
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def session(self, tag, enabled=True):
+        """Activa el perfilado para las fases que se ejecuten en este hilo"""
+        if not enabled:
+            yield None
+            return
+        previous = getattr(_local, 'session', None)
+        session = _local.session = ProfileSession(self, tag)
+        try:
+            yield session
+        finally:
+            _local.session = previous
+
+
+def current_session():
+    """Sesión de perfilado activa en este hilo (o None)"""
+    return getattr(_local, 'session', None)
+
+
+def phase(name):
+    """Perfila una fase si hay una sesión activa en el hilo; si no, no hace nada"""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        return nullcontext()
+    return session.phase(name)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Seguimiento del progreso de descargas
+Agrega los eventos de los progress_hooks y postprocessor_hooks de yt-dlp
+(bytes, velocidad, ETA y fase) y avisa a los callbacks suscritos con frecuencia limitada
+"""
+
+import threading
+import time
+
+from format_selection import format_filesize
+
+# Fases de un trabajo, en orden
+PHASES = ('queued', 'downloading', 'merging', 'processing', 'done', 'error')
+
+# Postprocesadores de yt-dlp que corresponden a la fase de unión de video+audio
+MERGE_POSTPROCESSORS = ('Merger', 'FFmpegMerger', 'VideoRemuxer', 'FFmpegVideoRemuxer')
+
+
+def format_progress(snapshot):
+    """Texto corto de una instantánea: porcentaje, bytes, velocidad y tiempo restante"""
+    parts = []
+    if snapshot['total_bytes']:
+        parts.append(f"{snapshot['percent']:.1f}%")
+        parts.append(f"{format_filesize(snapshot['downloaded_bytes'])} de "
+                     f"{format_filesize(snapshot['total_bytes'])}")
+    elif snapshot['downloaded_bytes']:
+        parts.append(format_filesize(snapshot['downloaded_bytes']))
+    if snapshot['speed']:
+        parts.append(f"{format_filesize(snapshot['speed'])}/s")
+    if snapshot['eta'] is not None:
+        minutes, seconds = divmod(int(snapshot['eta']), 60)
+        parts.append(f"quedan {minutes}:{seconds:02d}")
+    return " • ".join(parts)
+
+
+class ProgressTracker:
+    """Estado de progreso agregado de todas las pistas de una descarga"""
+
+    def __init__(self, on_update=None, min_interval=0.25):
+        self.listeners = [on_update] if on_update else []
+        self.min_interval = min_interval
+
+        self._lock = threading.Lock()
+        self._streams = {}      # format_id -> [descargado, total]
+        self._expected = {}     # format_id -> tamaño estimado antes de empezar
+        self._phase = 'queued'
+        self._speed = None
+        self._eta = None
+        self._last_notify = 0.0
+
+    def progress_hook(self, d):
+        """Hook para 'progress_hooks' de yt-dlp"""
+        info = d.get('info_dict') or {}
+        key = info.get('format_id') or d.get('filename')
+
+        with self._lock:
+            if not self._expected:
+                for fmt in info.get('requested_formats') or ():
+                    size = fmt.get('filesize') or fmt.get('filesize_approx') or 0
+                    self._expected[fmt.get('format_id')] = size
+
+            total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+            downloaded = d.get('downloaded_bytes') or 0
+            if d['status'] == 'finished':
+                downloaded = total = max(downloaded, total, d.get('total_bytes') or 0)
+            self._streams[key] = [downloaded, total]
+
+            self._speed = d.get('speed') if d['status'] == 'downloading' else None
+            self._eta = d.get('eta') if d['status'] == 'downloading' else None
+            phase_changed = self._phase == 'queued'
+            if phase_changed:
+                self._phase = 'downloading'
+
+        self._notify(force=phase_changed or d['status'] == 'finished')
+
+    def postprocessor_hook(self, d):
+        """Hook para 'postprocessor_hooks' de yt-dlp"""
+        if d.get('status') != 'started':
+            return
+        phase = 'merging' if d.get('postprocessor') in MERGE_POSTPROCESSORS else 'processing'
+        self.set_phase(phase)
+
+    def set_phase(self, phase):
+        """Cambia la fase y avisa siempre (sin limitar la frecuencia)"""
+        with self._lock:
+            if self._phase == phase:
+                return
+            self._phase = phase
+            if phase != 'downloading':
+                self._speed = self._eta = None
+        self._notify(force=True)
+
+    def subscribe(self, on_update):
+        """Añade otro callback (trabajos que comparten esta descarga)"""
+        self.listeners.append(on_update)
+
+    @property
+    def phase(self):
+        return self._phase
+
+    def snapshot(self):
+        """Devuelve el estado actual como diccionario"""
+        with self._lock:
+            downloaded = sum(done for done, _ in self._streams.values())
+            total = sum(size for _, size in self._streams.values())
+            total += sum(size for key, size in self._expected.items() if key not in self._streams)
+            phase = self._phase
+            speed, eta = self._speed, self._eta
+
+        if phase == 'done':
+            percent = 100.0
+        elif total:
+            percent = min(99.0, downloaded * 100.0 / total)
+        else:
+            percent = 0.0
+
+        return {
+            'phase': phase,
+            'downloaded_bytes': downloaded,
+            'total_bytes': total or None,
+            'percent': round(percent, 1),
+            'speed': speed,
+            'eta': eta,
+        }
+
+    def _notify(self, force=False):
+        """Llama al callback respetando el intervalo mínimo entre avisos"""
+        if not self.listeners:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_notify < self.min_interval:
+                return
+            self._last_notify = now
+        for on_update in list(self.listeners):
+            on_update()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Control adaptativo del ritmo de peticiones al origen
+Clasifica las respuestas de YouTube (429, 403, flujos estrangulados), ajusta las
+extracciones y descargas simultáneas con AIMD (suma al acertar, divide al saturar),
+pausa todas las llamadas con esperas exponenciales con jitter y, tras un 429,
+espacia las extracciones con un cubo de fichas que se relaja poco a poco
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+from metrics import (ORIGIN_SIGNALS, RATE_LIMIT_BACKOFF, RATE_LIMIT_CONCURRENCY,
+                     RATE_LIMIT_EXTRACT_RATE, error_class)
+
+# Clase de error (metrics.error_class) -> señal de saturación del origen
+SIGNALS = {'http_429': 'rate_limited', 'http_403': 'forbidden'}
+
+# Por debajo de este ritmo medio una descarga de más de THROTTLE_MIN_BYTES se
+# considera estrangulada por el origen
+THROTTLE_BPS = 64 * 1024
+THROTTLE_MIN_BYTES = 4 * 1024 ** 2
+
+
+class RateLimitedError(Exception):
+    """El origen sigue limitando las peticiones tras agotar los reintentos"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Cubo de fichas para espaciar llamadas (rate=None: sin límite)"""
+
+    def __init__(self, rate=None, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Toma una ficha, esperando a que haya una si hace falta"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.rate is None or self._tokens >= 1:
+                    self._tokens = max(0.0, self._tokens - 1)
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AIMDLimiter:
+    """Límite de llamadas simultáneas con aumento aditivo y reducción multiplicativa"""
+
+    def __init__(self, maximum, minimum=1, backoff=0.5, cooldown=5.0):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.backoff = backoff
+        self.cooldown = cooldown    # una sola reducción por episodio de saturación
+        self.limit = float(self.maximum)
+        self.in_use = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_use >= int(self.limit):
+                self._condition.wait()
+            self.in_use += 1
+
+    def release(self, congested=False):
+        with self._condition:
+            self.in_use -= 1
+            if congested:
+                self.decrease()
+            else:
+                # +1 cada 'limit' llamadas correctas, como la ventana de TCP
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+    def decrease(self):
+        """Divide el límite (como mucho una vez por 'cooldown' segundos)"""
+        with self._condition:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self.limit = max(self.minimum, self.limit * self.backoff)
+
+
+class ThroughputMonitor:
+    """Hook de progreso que detecta descargas estranguladas por el origen"""
+
+    def __init__(self, threshold=THROTTLE_BPS, min_bytes=THROTTLE_MIN_BYTES):
+        self.threshold = threshold
+        self.min_bytes = min_bytes
+        self.throttled = False
+        self._started = {}
+
+    def progress_hook(self, d):
+        name = d.get('tmpfilename') or d.get('filename')
+        if d.get('status') == 'downloading':
+            self._started.setdefault(name, (time.monotonic(), d.get('downloaded_bytes') or 0))
+        elif d.get('status') == 'finished' and name in self._started:
+            started, initial = self._started.pop(name)
+            downloaded = (d.get('downloaded_bytes') or d.get('total_bytes') or 0) - initial
+            elapsed = time.monotonic() - started
+            if downloaded >= self.min_bytes and elapsed > 0 and \
+                    downloaded / elapsed < self.threshold:
+                self.throttled = True
+
+
+class RateController:
+    """Ritmo global de extracciones y descargas contra el origen"""
+
+    def __init__(self, max_extractions=4, max_downloads=4, extract_rate=None,
+                 max_extract_rate=10.0, extract_rate_step=0.1, min_extract_rate=0.2,
+                 max_retries=2, base_delay=2.0, max_delay=120.0, cooldown=5.0):
+        self.limiters = {
+            'extract': AIMDLimiter(max_extractions, cooldown=cooldown),
+            'download': AIMDLimiter(max_downloads, cooldown=cooldown),
+        }
+        # Sin ritmo fijo, las extracciones se espacian solo a partir del primer 429; con
+        # ritmo fijo, la recuperación tras un 429 nunca lo supera
+        self.extract_rate = extract_rate
+        self.extract_bucket = TokenBucket(extract_rate)
+        self.max_extract_rate = max_extract_rate
+        self.extract_rate_step = extract_rate_step
+        self.min_extract_rate = min_extract_rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cooldown = cooldown
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=32)     # inicio de las últimas extracciones
+        self._paused_until = 0.0
+        self._strikes = 0
+        self._last_rate_cut = 0.0
+
+        for kind, limiter in self.limiters.items():
+            RATE_LIMIT_CONCURRENCY.labels(kind=kind).set_function(lambda l=limiter: l.limit)
+        RATE_LIMIT_EXTRACT_RATE.set_function(lambda: self.extract_bucket.rate or 0)
+        RATE_LIMIT_BACKOFF.set_function(self.backoff_remaining)
+
+    @staticmethod
+    def classify(error):
+        """Señal de saturación del origen que representa un error (o None)"""
+        return SIGNALS.get(error_class(error))
+
+    def backoff_remaining(self):
+        return max(0.0, self._paused_until - time.monotonic())
+
+    def call(self, kind, fn, *args, throttled=None, **kwargs):
+        """Ejecuta fn respetando el ritmo; reintenta tras un 429 o 403 con espera"""
+        limiter = self.limiters[kind]
+        attempt = 0
+        while True:
+            remaining = self.backoff_remaining()
+            if remaining:
+                time.sleep(remaining)
+            if kind == 'extract':
+                self.extract_bucket.acquire()
+                self._recent.append(time.monotonic())
+
+            limiter.acquire()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                signal = self.classify(e)
+                limiter.release(congested=signal is not None)
+                if signal is None:
+                    raise
+                delay = self._congested(kind, signal)
+                if attempt >= self.max_retries:
+                    raise RateLimitedError(
+                        f"YouTube está limitando las peticiones ({e}); "
+                        f"reintenta en {int(delay) + 1} s", delay) from e
+                attempt += 1
+                continue
+
+            if throttled is not None and throttled():
+                limiter.release(congested=True)
+                ORIGIN_SIGNALS.labels(kind=kind, signal='throttled').inc()
+            else:
+                limiter.release()
+                self._succeeded(kind)
+            return result
+
+    def _congested(self, kind, signal):
+        """Pausa global con espera exponencial y jitter; frena las extracciones"""
+        ORIGIN_SIGNALS.labels(kind=kind, signal=signal).inc()
+        with self._lock:
+            self._strikes += 1
+            ceiling = min(self.max_delay, self.base_delay * 2 ** (self._strikes - 1))
+            # Mitad fija y mitad aleatoria: los hilos no reintentan todos a la vez
+            delay = ceiling / 2 + random.uniform(0, ceiling / 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+            now = time.monotonic()
+            if signal == 'rate_limited' and now - self._last_rate_cut >= self.cooldown:
+                # Los 429 de una misma ráfaga solo reducen el ritmo una vez
+                self._last_rate_cut = now
+                current = self.extract_bucket.rate or self._observed_rate()
+                self.extract_bucket.set_rate(max(self.min_extract_rate, current / 2))
+        return self.backoff_remaining()
+
+    def _succeeded(self, kind):
+        with self._lock:
+            self._strikes = 0
+            rate = self.extract_bucket.rate
+            if kind == 'extract' and rate is not None and rate != self.extract_rate:
+                rate += self.extract_rate_step
+                # Recuperado el ritmo configurado (o, sin él, el máximo) se vuelve a ese
+                ceiling = self.extract_rate or self.max_extract_rate
+                self.extract_bucket.set_rate(self.extract_rate if rate >= ceiling else rate)
+
+    def _observed_rate(self):
+        """Extracciones por segundo recientes (para fijar el primer ritmo tras un 429)"""
+        if len(self._recent) < 2:
+            return 1.0
+        span = self._recent[-1] - self._recent[0]
+        return (len(self._recent) - 1) / span if span > 0 else self.max_extract_rate
+
+    def stats(self):
+        return {
+            'extract_limit': round(self.limiters['extract'].limit, 2),
+            'download_limit': round(self.limiters['download'].limit, 2),
+            'extract_rate': self.extract_bucket.rate,
+            'backoff_seconds': round(self.backoff_remaining(), 1),
+        }
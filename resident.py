@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Daemon residente para la CLI
+Mantiene yt-dlp importado, sus extractores cargados y las cachés en memoria en un
+proceso que atiende por un socket Unix; la CLI le delega la extracción y la
+descarga y arranca en decenas de milisegundos en lugar de cientos
+"""
+
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+from youtube_downloader import YouTubeDownloader
+
+DEFAULT_SOCKET = Path("cache") / "daemon.sock"
+MAX_REQUEST_SIZE = 1024 * 1024
+# Frecuencia máxima de eventos de progreso por descarga
+PROGRESS_INTERVAL = 0.1
+# Mismas opciones que get_video_info: el precalentado crea la instancia que usará
+INFO_OPTIONS = {'quiet': True, 'no_warnings': True, 'noplaylist': True}
+
+PROGRESS_FIELDS = ('status', 'downloaded_bytes', 'total_bytes', 'total_bytes_estimate',
+                   'speed', 'eta', 'elapsed', 'filename', 'tmpfilename',
+                   'fragment_index', 'fragment_count')
+
+
+def _progress_event(d):
+    """Copia serializable del diccionario de progreso de yt-dlp"""
+    event = {key: d[key] for key in PROGRESS_FIELDS if d.get(key) is not None}
+    info = d.get('info_dict') or {}
+    event['info_dict'] = {
+        'format_id': info.get('format_id'),
+        'requested_formats': [
+            {key: fmt.get(key) for key in ('format_id', 'filesize', 'filesize_approx')}
+            for fmt in info.get('requested_formats') or ()
+        ],
+    }
+    return event
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """Atiende una petición JSON por conexión y responde con líneas JSON"""
+
+    def handle(self):
+        self._write_lock = threading.Lock()
+        line = self.rfile.readline(MAX_REQUEST_SIZE)
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            operation = getattr(self.server, f"op_{request.get('op')}", None)
+            if operation is None:
+                raise Exception(f"Operación desconocida: {request.get('op')!r}")
+            self.send({'type': 'result', 'result': operation(request, self.send)})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # El cliente se fue: la descarga ya se interrumpió
+        except Exception as e:
+            try:
+                self.send({'type': 'error', 'error': str(e)})
+            except OSError:
+                pass
+
+    def send(self, message):
+        data = json.dumps(message, ensure_ascii=False, default=str).encode('utf-8') + b'\n'
+        with self._write_lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+
+class ResidentDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Servidor del socket Unix con un YouTubeDownloader compartido y caliente"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, downloader):
+        self.socket_path = Path(socket_path)
+        self.downloader = downloader
+        self.started_at = time.time()
+        self.requests = 0
+        super().__init__(str(self.socket_path), DaemonHandler)
+        # Solo el usuario que lo arrancó puede pedirle descargas
+        os.chmod(self.socket_path, 0o600)
+
+    def warm_up(self):
+        """Importa yt-dlp y crea la instancia que usarán las extracciones"""
+        self.downloader.ydl_pool.warm(INFO_OPTIONS)
+
+    def op_ping(self, request, send):
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at, 1),
+            'requests': self.requests,
+            'pool': self.downloader.ydl_pool.stats(),
+            'cache': self.downloader.info_cache.stats(),
+        }
+
+    def op_info(self, request, send):
+        self.requests += 1
+        return self.downloader.get_video_info(request['url'])
+
+    def op_download(self, request, send):
+        self.requests += 1
+        last_sent = [0.0]
+
+        def progress_hook(d):
+            now = time.monotonic()
+            if d.get('status') == 'downloading' and now - last_sent[0] < PROGRESS_INTERVAL:
+                return
+            last_sent[0] = now
+            send({'type': 'progress', 'data': _progress_event(d)})
+
+        def postprocessor_hook(d):
+            send({'type': 'postprocessor',
+                  'data': {'status': d.get('status'), 'postprocessor': d.get('postprocessor')}})
+
+        return self.downloader._download(
+            request['url'], request['ydl_opts'], request['title'], True,
+            [progress_hook], [postprocessor_hook], kind=request.get('kind', 'video'),
+            all_files=request.get('all_files', False))
+
+    def op_shutdown(self, request, send):
+        threading.Thread(target=self.shutdown, daemon=True).start()
+        return {'stopping': True}
+
+
+class RemoteDownloader(YouTubeDownloader):
+    """YouTubeDownloader que delega la extracción y la descarga en el daemon"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, **kwargs):
+        super().__init__(**kwargs)
+        self.socket_path = Path(socket_path)
+
+    def call(self, request, on_event=None, timeout=None):
+        """Envía una petición y procesa las respuestas hasta el resultado"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(str(self.socket_path))
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with sock.makefile('rb') as responses:
+                for line in responses:
+                    message = json.loads(line)
+                    if message['type'] == 'result':
+                        return message['result']
+                    if message['type'] == 'error':
+                        raise Exception(message['error'])
+                    if on_event is not None:
+                        on_event(message)
+        raise Exception("El daemon cerró la conexión sin responder")
+
+    def ping(self, timeout=1.0):
+        """Devuelve el estado del daemon o None si no responde"""
+        try:
+            return self.call({'op': 'ping'}, timeout=timeout)
+        except Exception:
+            return None
+
+    def get_video_info(self, url):
+        try:
+            return self.call({'op': 'info', 'url': url})
+        except OSError as e:
+            raise Exception(f"Error al obtener información del video: {str(e)}")
+
+    def _download(self, url, ydl_opts, title, quiet, progress_hooks, postprocessor_hooks,
+                  kind='video', all_files=False):
+        """Pide la descarga al daemon y reproduce su progreso en los hooks locales"""
+        options = {key: value for key, value in ydl_opts.items()
+                   if key not in ('progress_hooks', 'postprocessor_hooks')}
+        if options.get('outtmpl'):
+            # El daemon puede tener otro directorio de trabajo
+            options['outtmpl'] = str(Path(options['outtmpl']).absolute())
+
+        if not quiet:
+            print(f"\n🔄 Descargando: {title}")
+            print("=" * 50)
+
+        def on_event(message):
+            if message['type'] == 'progress':
+                for hook in progress_hooks or ():
+                    hook(message['data'])
+                if not quiet:
+                    self._print_progress(message['data'])
+            elif message['type'] == 'postprocessor':
+                for hook in postprocessor_hooks or ():
+                    hook(message['data'])
+
+        filepath = self.call({'op': 'download', 'url': url, 'ydl_opts': options,
+                              'title': title, 'kind': kind, 'all_files': all_files}, on_event)
+
+        if not quiet:
+            last = filepath[-1]['filepath'] if all_files and filepath else filepath
+            location = Path(last).parent if last else self.download_path
+            print("\n✅ ¡Descarga completada!")
+            print(f"📁 Ubicación: {location.absolute()}")
+        return filepath
+
+    def _print_progress(self, d):
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        downloaded = d.get('downloaded_bytes') or 0
+        percent = f"{downloaded / total * 100:5.1f}%" if total else "  ?  "
+        speed = f"{self.format_filesize(d['speed'])}/s" if d.get('speed') else ''
+        eta = f"ETA {int(d['eta'])} s" if d.get('eta') is not None else ''
+        print(f"\r⬇️  {percent} de {self.format_filesize(total)} {speed} {eta}".ljust(70),
+              end='', flush=True)
+        if d.get('status') == 'finished':
+            print()
+
+
+def connect(socket_path=DEFAULT_SOCKET):
+    """RemoteDownloader conectado al daemon, o None si no hay ninguno escuchando"""
+    if not hasattr(socket, 'AF_UNIX') or not Path(socket_path).exists():
+        return None
+    remote = RemoteDownloader(socket_path)
+    return remote if remote.ping() is not None else None
+
+
+def serve(socket_path=DEFAULT_SOCKET, downloader=None):
+    """Arranca el daemon en primer plano hasta Ctrl+C o la operación 'shutdown'"""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise Exception("El daemon necesita sockets Unix (no disponible en este sistema)")
+
+    socket_path = Path(socket_path)
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    if socket_path.exists():
+        if connect(socket_path) is not None:
+            raise Exception(f"Ya hay un daemon escuchando en {socket_path}")
+        socket_path.unlink()  # socket de un daemon que terminó mal
+
+    daemon = ResidentDaemon(socket_path, downloader or YouTubeDownloader())
+    try:
+        started = time.monotonic()
+        daemon.warm_up()
+        print(f"🔥 Daemon listo en {socket_path} (yt-dlp cargado en "
+              f"{time.monotonic() - started:.2f} s)", file=sys.stderr)
+        daemon.serve_forever()
+    finally:
+        daemon.server_close()
+        try:
+            socket_path.unlink()
+        except OSError:
+            pass
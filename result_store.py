@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Almacén de resultados direccionado por contenido
+Guarda los archivos terminados por (ID de video, format_id, contenedor) con el
+nombre de su hash SHA-256, los reparte con contador de referencias y expulsa
+los menos usados cuando se supera el presupuesto de disco. Las referencias se
+guardan en el índice para que varios procesos puedan compartir el almacén
+"""
+
+import hashlib
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Un temporal sin escribir durante este tiempo es de una escritura interrumpida
+STALE_TMP_SECONDS = 60 * 60
+# Las referencias de otro proceso más antiguas que esto se dan por perdidas (caída)
+REF_TTL = 12 * 60 * 60
+
+
+def result_key(video_id, format_id, container):
+    """Clave de un resultado: el mismo video, formato y contenedor dan el mismo archivo"""
+    return f"{video_id}:{format_id}:{container}"
+
+
+class StoreWriter:
+    """Archivo temporal del almacén que calcula el hash mientras se escribe"""
+
+    def __init__(self, store, key, filename):
+        self.store = store
+        self.key = key
+        self.filename = filename
+        self.path = store.tmp_path()
+        self._file = open(self.path, 'wb')
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self._file.write(data)
+        self._hash.update(data)
+        self.size += len(data)
+
+    def commit(self):
+        """Cierra el archivo y lo incorpora al almacén"""
+        self._file.close()
+        return self.store._commit(self.key, self.path, self._hash.hexdigest(),
+                                  self.size, self.filename)
+
+    def abort(self):
+        """Descarta lo escrito"""
+        self._file.close()
+        self.path.unlink(missing_ok=True)
+
+
+class ResultStore:
+    """Archivos descargados reutilizables entre trabajos, con límite de disco"""
+
+    def __init__(self, root=Path("downloads") / ".store", budget_bytes=10 * 1024 ** 3,
+                 policy='lru', ref_ttl=REF_TTL):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"Política de expulsión no válida: {policy!r}")
+
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.tmp_dir = self.root / "tmp"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = budget_bytes
+        self.policy = policy
+        self.ref_ttl = ref_ttl
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+        self._lock = threading.Lock()
+        self._refs = {}  # clave -> trabajos de este proceso que están usando el archivo
+        self._stats = {'hits': 0, 'misses': 0, 'stored': 0, 'deduplicated': 0,
+                       'evictions': 0, 'evicted_bytes': 0}
+
+        self._db = sqlite3.connect(str(self.root / "index.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " digest TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " filename TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_digest ON results(digest)")
+        # Referencias de todos los procesos que comparten el almacén
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS refs ("
+            " key TEXT NOT NULL,"
+            " owner TEXT NOT NULL,"
+            " count INTEGER NOT NULL,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (key, owner))"
+        )
+        self._db.commit()
+
+        # Restos de escrituras interrumpidas; las de otros procesos (o réplicas con el
+        # mismo volumen) siguen creciendo
+        stale = time.time() - STALE_TMP_SECONDS
+        for leftover in self.tmp_dir.iterdir():
+            try:
+                if leftover.name.startswith(f"{self.owner}-") or \
+                        leftover.stat().st_mtime < stale:
+                    leftover.unlink(missing_ok=True)
+            except OSError:
+                pass
+
+    def tmp_path(self):
+        """Ruta de un temporal nuevo, con el dueño (host, PID y sufijo) que lo escribe"""
+        return self.tmp_dir / f"{self.owner}-{uuid.uuid4().hex}.part"
+
+    @contextmanager
+    def _transaction(self):
+        """Transacción con el bloqueo de escritura: otro proceso no puede colarse en medio"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+    def blob_path(self, digest):
+        """Ruta del archivo con ese hash"""
+        return self.blob_dir / digest[:2] / digest
+
+    def acquire(self, key):
+        """Devuelve (ruta, nombre) si el resultado existe y suma una referencia"""
+        with self._lock, self._transaction():
+            row = self._db.execute(
+                "SELECT digest, filename FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                path = self.blob_path(row[0])
+                if not path.exists():
+                    self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                    row = None
+
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+
+            now = time.time()
+            self._db.execute(
+                "UPDATE results SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key)
+            )
+            self._add_ref(key, now)
+            self._stats['hits'] += 1
+            return path, row[1]
+
+    def release(self, key):
+        """Quita una referencia; los archivos sin referencias pueden expulsarse"""
+        with self._lock, self._transaction():
+            remaining = self._refs.get(key, 0) - 1
+            if remaining > 0:
+                self._refs[key] = remaining
+            else:
+                self._refs.pop(key, None)
+            self._db.execute(
+                "UPDATE refs SET count = count - 1 WHERE key = ? AND owner = ?", (key, self.owner)
+            )
+            self._db.execute("DELETE FROM refs WHERE count <= 0")
+
+    def _add_ref(self, key, now):
+        """Suma una referencia de este proceso (dentro de una transacción)"""
+        self._db.execute(
+            "INSERT INTO refs (key, owner, count, updated) VALUES (?, ?, 1, ?)"
+            " ON CONFLICT (key, owner) DO UPDATE SET count = count + 1, updated = excluded.updated",
+            (key, self.owner, now)
+        )
+        self._refs[key] = self._refs.get(key, 0) + 1
+
+    def writer(self, key, filename):
+        """Abre un escritor que calcula el hash a medida que recibe datos"""
+        return StoreWriter(self, key, filename)
+
+    def put_file(self, key, src, filename=None):
+        """Incorpora un archivo ya descargado (lo mueve al almacén) y suma una referencia
+
+        El archivo se vuelve a leer entero para calcular su hash: yt-dlp y FFmpeg lo
+        escriben fuera de este proceso. Quien escriba los bytes por sí mismo debe usar
+        writer(), que calcula el hash sin esa segunda lectura.
+        """
+        src = Path(src)
+        filename = filename or src.name
+        digest = hashlib.sha256()
+        with open(src, 'rb') as f:
+            for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b''):
+                digest.update(chunk)
+
+        tmp = self.tmp_path()
+        try:
+            os.replace(src, tmp)
+        except OSError:
+            # Otro sistema de archivos: copiar en lugar de mover
+            shutil.copyfile(src, tmp)
+            src.unlink(missing_ok=True)
+
+        return self._commit(key, tmp, digest.hexdigest(), tmp.stat().st_size, filename)
+
+    def _commit(self, key, tmp, digest, size, filename):
+        """Mueve el temporal a su ruta definitiva, lo indexa y aplica el presupuesto"""
+        final = self.blob_path(digest)
+        final.parent.mkdir(exist_ok=True)
+        now = time.time()
+
+        with self._lock:
+            with self._transaction():
+                if final.exists():
+                    tmp.unlink(missing_ok=True)
+                    self._stats['deduplicated'] += 1
+                else:
+                    os.replace(tmp, final)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO results (key, digest, size, filename, created, last_access, hits)"
+                    " VALUES (?, ?, ?, ?, ?, ?, 0)",
+                    (key, digest, size, filename, now, now)
+                )
+                self._add_ref(key, now)
+                self._stats['stored'] += 1
+            self._evict()
+
+        return final, filename
+
+    def trim(self, bytes_needed):
+        """Expulsa resultados sin referencias hasta liberar bytes_needed (falta de disco)"""
+        with self._lock:
+            return self._evict(self._used_bytes() - bytes_needed)
+
+    def _evict(self, budget_bytes=None):
+        """Expulsa resultados sin referencias hasta el presupuesto; devuelve lo liberado"""
+        with self._transaction():
+            return self._evict_locked(budget_bytes)
+
+    def _evict_locked(self, budget_bytes):
+        budget_bytes = self.budget_bytes if budget_bytes is None else budget_bytes
+        total = self._used_bytes()
+        if total <= budget_bytes:
+            return 0
+        freed = 0
+
+        # Las referencias de un proceso caído no impiden la expulsión para siempre
+        self._db.execute("DELETE FROM refs WHERE owner != ? AND updated < ?",
+                         (self.owner, time.time() - self.ref_ttl))
+        referenced = {key for key, in self._db.execute("SELECT DISTINCT key FROM refs")}
+
+        order = "last_access ASC" if self.policy == 'lru' else "hits ASC, last_access ASC"
+        candidates = self._db.execute(
+            f"SELECT key, digest, size FROM results ORDER BY {order}"
+        ).fetchall()
+
+        for key, digest, size in candidates:
+            if total <= budget_bytes:
+                break
+            if key in self._refs or key in referenced:
+                continue
+
+            self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+            shared = self._db.execute(
+                "SELECT 1 FROM results WHERE digest = ? LIMIT 1", (digest,)
+            ).fetchone()
+            self._stats['evictions'] += 1
+            if not shared:
+                self.blob_path(digest).unlink(missing_ok=True)
+                total -= size
+                freed += size
+                self._stats['evicted_bytes'] += size
+
+        return freed
+
+    def _used_bytes(self):
+        """Bytes ocupados en disco (los resultados con el mismo hash comparten archivo)"""
+        return self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM results)"
+        ).fetchone()[0]
+
+    def stats(self):
+        """Devuelve contadores del almacén y la tasa de aciertos"""
+        with self._lock:
+            stats = dict(self._stats)
+            entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+            used = self._used_bytes()
+            stats['in_use'] = len(self._refs)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['entries'] = entries
+        stats['bytes'] = used
+        stats['budget_bytes'] = self.budget_bytes
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
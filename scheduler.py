@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Planificador de tareas del servidor
+Decide qué tarea en espera ocupa el siguiente hilo libre: clases de prioridad
+(interactiva y por lotes), reparto justo ponderado entre clientes (WFQ), límite
+de tareas simultáneas por cliente y hilos reservados para las tareas interactivas.
+Incluye un límite de ancho de banda por cliente compartido entre sus descargas
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+
+# Peso de cada clase: con ambas en espera, las interactivas avanzan 8 veces más rápido
+PRIORITY_WEIGHTS = {'interactive': 8, 'batch': 1}
+DEFAULT_PRIORITY = 'interactive'
+
+
+class Ticket:
+    """Turno de una tarea en el planificador"""
+
+    __slots__ = ('scheduler', 'client', 'priority', 'finish', 'order', 'future', 'running')
+
+    def __init__(self, scheduler, client, priority, finish, order, future):
+        self.scheduler = scheduler
+        self.client = client
+        self.priority = priority
+        self.finish = finish    # etiqueta de fin virtual (WFQ)
+        self.order = order      # desempate por orden de llegada
+        self.future = future
+        self.running = False
+
+    def position(self):
+        """Posición estimada en la cola (1 = la siguiente), o None si ya se ejecuta"""
+        return self.scheduler.position(self)
+
+
+class FairScheduler:
+    """Reparte 'slots' hilos entre clientes y clases de prioridad (en el bucle de eventos)"""
+
+    def __init__(self, slots, max_running_per_client=4, reserved_interactive=1,
+                 weights=None):
+        self.slots = max(1, slots)
+        self.max_running_per_client = max(1, max_running_per_client)
+        # Hilos que las tareas por lotes no pueden ocupar
+        self.reserved_interactive = min(max(0, reserved_interactive), self.slots - 1)
+        self.weights = dict(PRIORITY_WEIGHTS, **(weights or {}))
+
+        self._waiting = []
+        self._running = 0
+        self._running_batch = 0
+        self._running_by_client = {}
+        self._waiting_by_client = {}
+        self._last_finish = {}      # (cliente, clase) -> última etiqueta de fin
+        self._virtual_time = 0.0
+        self._order = itertools.count()
+        self._stats = {'dispatched': 0, 'interactive': 0, 'batch': 0}
+
+    def enqueue(self, client, priority=DEFAULT_PRIORITY):
+        """Pone una tarea en la cola y devuelve su Ticket (esperar con wait)"""
+        if priority not in self.weights:
+            raise ValueError(f"Clase de prioridad desconocida: {priority!r}")
+        flow = (client, priority)
+        start = max(self._virtual_time, self._last_finish.get(flow, 0.0))
+        finish = self._last_finish[flow] = start + 1.0 / self.weights[priority]
+
+        ticket = Ticket(self, client, priority, finish, next(self._order),
+                        asyncio.get_running_loop().create_future())
+        self._waiting.append(ticket)
+        self._waiting_by_client[client] = self._waiting_by_client.get(client, 0) + 1
+        self._dispatch()
+        return ticket
+
+    async def wait(self, ticket):
+        """Espera el turno del ticket; si se cancela, deja su sitio libre"""
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.running:
+                self.release(ticket)
+            elif ticket in self._waiting:
+                self._forget(ticket)
+            raise
+        return ticket
+
+    async def acquire(self, client, priority=DEFAULT_PRIORITY):
+        """Espera un hilo libre y devuelve el Ticket (liberar con release)"""
+        return await self.wait(self.enqueue(client, priority))
+
+    def release(self, ticket):
+        """Libera el hilo de una tarea terminada y da paso a la siguiente"""
+        if not ticket.running:
+            return
+        ticket.running = False
+        self._running -= 1
+        if ticket.priority == 'batch':
+            self._running_batch -= 1
+        remaining = self._running_by_client[ticket.client] - 1
+        if remaining:
+            self._running_by_client[ticket.client] = remaining
+        else:
+            del self._running_by_client[ticket.client]
+        self._dispatch()
+
+    def _eligible(self, ticket):
+        if self._running_by_client.get(ticket.client, 0) >= self.max_running_per_client:
+            return False
+        if ticket.priority == 'batch':
+            return self._running_batch < self.slots - self.reserved_interactive
+        return True
+
+    def _dispatch(self):
+        """Asigna los hilos libres a las tareas con menor etiqueta de fin"""
+        while self._running < self.slots:
+            chosen = None
+            for ticket in self._waiting:
+                if (chosen is None or (ticket.finish, ticket.order) < (chosen.finish, chosen.order)) \
+                        and self._eligible(ticket):
+                    chosen = ticket
+            if chosen is None:
+                return
+
+            self._forget(chosen)
+            self._virtual_time = max(self._virtual_time, chosen.finish)
+            chosen.running = True
+            self._running += 1
+            if chosen.priority == 'batch':
+                self._running_batch += 1
+            self._running_by_client[chosen.client] = \
+                self._running_by_client.get(chosen.client, 0) + 1
+            self._stats['dispatched'] += 1
+            self._stats[chosen.priority] += 1
+            chosen.future.set_result(None)
+
+    def _forget(self, ticket):
+        """Retira un ticket de la cola de espera"""
+        self._waiting.remove(ticket)
+        remaining = self._waiting_by_client[ticket.client] - 1
+        if remaining:
+            self._waiting_by_client[ticket.client] = remaining
+        else:
+            del self._waiting_by_client[ticket.client]
+        if not self._waiting:
+            # Cola vacía: se reinicia el reloj virtual para que no crezca sin límite
+            self._virtual_time = 0.0
+            self._last_finish.clear()
+
+    def position(self, ticket):
+        """Tareas que saldrán antes que esta (según las etiquetas actuales) + 1"""
+        if ticket.running or ticket not in self._waiting:
+            return None
+        key = (ticket.finish, ticket.order)
+        return 1 + sum(1 for other in self._waiting if (other.finish, other.order) < key)
+
+    def waiting(self, client=None):
+        """Tareas en espera (de un cliente o en total)"""
+        if client is None:
+            return len(self._waiting)
+        return self._waiting_by_client.get(client, 0)
+
+    def running(self, client=None):
+        """Tareas en ejecución (de un cliente o en total)"""
+        if client is None:
+            return self._running
+        return self._running_by_client.get(client, 0)
+
+    def stats(self):
+        return dict(self._stats, waiting=len(self._waiting), running=self._running,
+                    running_batch=self._running_batch, clients=len(self._running_by_client))
+
+
+class BandwidthLimiter:
+    """Límite de bytes por segundo por cliente, compartido entre sus descargas"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._lock = threading.Lock()
+        self._buckets = {}  # cliente -> [fichas, última actualización]
+
+    def consume(self, client, amount):
+        """Descuenta 'amount' bytes y duerme lo necesario para no superar el ritmo"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [self.burst, now]
+                if len(self._buckets) > 1024:
+                    self._prune(now)
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate) - amount
+            bucket[0], bucket[1] = tokens, now
+        if tokens < 0:
+            # Deuda: cada descarga del cliente espera su parte
+            time.sleep(-tokens / self.rate)
+
+    def _prune(self, now):
+        """Olvida los clientes con el cubo lleno (sin actividad reciente)"""
+        for client, (tokens, updated) in list(self._buckets.items()):
+            if tokens + (now - updated) * self.rate >= self.burst:
+                del self._buckets[client]
+
+    def progress_hook(self, client):
+        """Hook de progreso de yt-dlp que aplica el límite del cliente"""
+        downloaded = {}
+
+        def hook(d):
+            if d.get('status') != 'downloading':
+                return
+            name = d.get('tmpfilename') or d.get('filename')
+            current = d.get('downloaded_bytes') or 0
+            delta = current - downloaded.get(name, 0)
+            downloaded[name] = current
+            if delta > 0:
+                self.consume(client, delta)
+
+        return hook
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Limpieza del espacio temporal de las descargas
+Recorre la carpeta de descargas, asocia cada archivo (resultado final, .part,
+fragmentos o pistas sin unir) a su trabajo y a su último acceso, borra los que
+caducan y, si el disco pasa de la marca de agua alta, expulsa primero los restos y
+después los más antiguos hasta bajar de la marca baja. Informa de los bytes liberados
+"""
+
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+from format_selection import format_filesize
+from metrics import SCRATCH_RECLAIMED_BYTES
+
+# Descargas a medias de yt-dlp (.part, .ytdl, fragmentos) y temporales de FFmpeg
+PARTIAL_REGEX = re.compile(r'\.(?:part|ytdl|temp)$|\.part-Frag\d+|\.temp\.\w+$')
+# Pistas de video o audio descargadas por separado que no llegaron a unirse
+TRACK_REGEX = re.compile(r'\.f\d+(?:-\w+)?\.\w+$')
+
+# Caducidad de los resultados y de los restos de trabajos que ya no están en curso
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_PARTIAL_TTL = 60 * 60
+# En la CLI y las GUIs un .part puede reanudarse en otra sesión
+LOCAL_PARTIAL_TTL = 24 * 60 * 60
+# Fracción del disco a partir de la cual se expulsa sin esperar a la caducidad, y
+# margen por debajo de ella hasta el que se libera
+DEFAULT_HIGH_WATER = 0.9
+PRESSURE_MARGIN = 0.05
+# Un resto escrito hace menos de esto puede ser una descarga en curso de otro proceso
+ACTIVE_WRITE_SECONDS = 5 * 60
+DEFAULT_INTERVAL = 60
+
+
+def classify(name):
+    """Tipo de artefacto: 'partial', 'track' (pista sin unir) o 'final'"""
+    if PARTIAL_REGEX.search(name):
+        return 'partial'
+    if TRACK_REGEX.search(name):
+        return 'track'
+    return 'final'
+
+
+class Artifact:
+    """Archivo de la carpeta de descargas con su trabajo y su último acceso"""
+
+    __slots__ = ('path', 'owner', 'kind', 'size', 'last_access')
+
+    def __init__(self, path, owner, kind, size, last_access):
+        self.path = path
+        self.owner = owner          # carpeta del trabajo (None: suelto en la raíz)
+        self.kind = kind
+        self.size = size
+        self.last_access = last_access
+
+
+class ScratchSweeper:
+    """Borra los artefactos caducados y expulsa los más antiguos si falta disco"""
+
+    def __init__(self, root, ttl=DEFAULT_TTL, partial_ttl=DEFAULT_PARTIAL_TTL,
+                 high_water=DEFAULT_HIGH_WATER, keep_finals=False, owners_only=False,
+                 owner_info=None, reclaimers=(), verbose=False):
+        self.root = Path(root)
+        self.ttl = ttl
+        self.partial_ttl = partial_ttl
+        self.high_water = high_water            # None o 0: sin expulsión por presión
+        self.low_water = max(0.0, (high_water or 0) - PRESSURE_MARGIN)
+        self.keep_finals = keep_finals          # CLI/GUI: los resultados son del usuario
+        self.owners_only = owners_only          # servidor: solo las carpetas de trabajos
+        # owner -> None (desconocido) o (en curso, último acceso)
+        self.owner_info = owner_info
+        # Funciones fn(bytes) -> bytes liberados que se llaman si sigue faltando disco
+        self.reclaimers = list(reclaimers)
+        self.verbose = verbose
+
+        self._lock = threading.Lock()
+        self._stats = {'sweeps': 0, 'expired': 0, 'evicted': 0, 'reclaimed_bytes': 0,
+                       'files': 0, 'bytes': 0, 'last_sweep': None}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def scan(self):
+        """Artefactos actuales (sin entrar en carpetas ocultas como .store)
+
+        Sin owner_info (CLI y GUIs) solo se miran los archivos sueltos de la raíz: las
+        subcarpetas son del usuario o de descargas de otros procesos.
+        """
+        artifacts = []
+        try:
+            entries = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return artifacts
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if self.owner_info is None and not self.owners_only:
+                    continue
+                for dirpath, _, filenames in os.walk(entry.path):
+                    for name in filenames:
+                        self._add(artifacts, os.path.join(dirpath, name), entry.name)
+            elif not self.owners_only and entry.is_file(follow_symlinks=False):
+                self._add(artifacts, entry.path, None)
+        return artifacts
+
+    @staticmethod
+    def _add(artifacts, path, owner):
+        try:
+            stat = os.stat(path, follow_symlinks=False)
+        except OSError:
+            return
+        artifacts.append(Artifact(path, owner, classify(os.path.basename(path)),
+                                  stat.st_size, stat.st_mtime))
+
+    def disk_usage(self):
+        """(fracción usada, bytes totales) del disco de la carpeta, o None"""
+        try:
+            usage = shutil.disk_usage(self.root)
+        except OSError:
+            return None
+        return usage.used / usage.total if usage.total else 0.0, usage.total
+
+    def sweep(self):
+        """Una pasada completa; devuelve el informe con los bytes liberados"""
+        now = time.time()
+        artifacts = self.scan()
+        report = {'files': len(artifacts), 'bytes': sum(a.size for a in artifacts),
+                  'expired': 0, 'evicted': 0, 'reclaimed_bytes': 0, 'reclaimed_elsewhere': 0,
+                  'owners': set()}
+
+        owners = {}
+        candidates = []
+        for artifact in artifacts:
+            if artifact.owner is not None and self.owner_info is not None:
+                if artifact.owner not in owners:
+                    owners[artifact.owner] = self.owner_info(artifact.owner)
+                info = owners[artifact.owner]
+                if info is not None:
+                    active, last_access = info
+                    if active:
+                        continue    # descarga, unión o envío en curso
+                    artifact.last_access = max(artifact.last_access, last_access or 0)
+            if artifact.kind == 'final' and self.keep_finals:
+                continue
+            if artifact.kind != 'final' and now - artifact.last_access < ACTIVE_WRITE_SECONDS:
+                continue    # puede estar escribiéndolo otro proceso, aun con falta de disco
+            candidates.append(artifact)
+
+        remaining = []
+        for artifact in candidates:
+            ttl = self.ttl if artifact.kind == 'final' else self.partial_ttl
+            if now - artifact.last_access >= ttl:
+                self._remove(artifact, 'ttl', report)
+            else:
+                remaining.append(artifact)
+
+        usage = self.disk_usage() if self.high_water else None
+        if usage is not None and usage[0] >= self.high_water:
+            needed = (usage[0] - self.low_water) * usage[1]
+            # Primero los restos y las pistas sin unir, después lo que lleva más sin usarse
+            remaining.sort(key=lambda a: (a.kind == 'final', a.last_access))
+            for artifact in remaining:
+                if needed <= 0:
+                    break
+                if self._remove(artifact, 'pressure', report):
+                    needed -= artifact.size
+            for reclaim in self.reclaimers:
+                if needed <= 0:
+                    break
+                freed = reclaim(int(needed))
+                needed -= freed
+                report['reclaimed_elsewhere'] += freed
+                SCRATCH_RECLAIMED_BYTES.labels(reason='pressure').inc(freed)
+
+        self._prune_dirs(report['owners'])
+        with self._lock:
+            self._stats['sweeps'] += 1
+            self._stats['expired'] += report['expired']
+            self._stats['evicted'] += report['evicted']
+            self._stats['reclaimed_bytes'] += report['reclaimed_bytes'] + report['reclaimed_elsewhere']
+            self._stats['files'] = report['files'] - report['expired'] - report['evicted']
+            self._stats['bytes'] = report['bytes'] - report['reclaimed_bytes']
+            self._stats['last_sweep'] = now
+        reclaimed = report['reclaimed_bytes'] + report['reclaimed_elsewhere']
+        if self.verbose and reclaimed:
+            print(f"🧹 Limpieza: {report['expired']} caducados, {report['evicted']} expulsados, "
+                  f"{format_filesize(reclaimed)} liberados", file=sys.stderr)
+        return report
+
+    def _remove(self, artifact, reason, report):
+        try:
+            os.remove(artifact.path)
+        except OSError:
+            return False
+        report['expired' if reason == 'ttl' else 'evicted'] += 1
+        report['reclaimed_bytes'] += artifact.size
+        SCRATCH_RECLAIMED_BYTES.labels(reason=reason).inc(artifact.size)
+        if artifact.owner is not None:
+            # El dueño se anota aunque solo pierda restos: su carpeta puede quedar vacía
+            report['owners'].add(artifact.owner)
+        return True
+
+    def _prune_dirs(self, owners):
+        """Borra las carpetas de trabajo que se han quedado vacías"""
+        for owner in owners:
+            for dirpath, _, _ in sorted(os.walk(self.root / owner), reverse=True):
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    def start(self, interval=DEFAULT_INTERVAL):
+        """Barre cada 'interval' segundos en un hilo de fondo"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, args=(interval,),
+                                            name='scratch-sweeper', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"⚠️  Error en la limpieza de {self.root}: {e}", file=sys.stderr)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        usage = self.disk_usage()
+        stats['disk_used'] = round(usage[0], 3) if usage else None
+        stats['high_water'] = self.high_water
+        return stats
+
+
+def sweep_in_background(root, **kwargs):
+    """Una sola pasada en un hilo de fondo (arranque de la CLI y de las GUIs)"""
+    sweeper = ScratchSweeper(root, **kwargs)
+
+    def run():
+        try:
+            sweeper.sweep()
+        except Exception:
+            pass    # la limpieza nunca debe impedir descargar
+
+    threading.Thread(target=run, name='scratch-sweeper', daemon=True).start()
+    return sweeper
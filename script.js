@@ -340,7 +340,7 @@ async function handleFinalDownload() {
         downloadText.textContent = 'Iniciando descarga...';
         
         // Start the download process on the backend
-        const startResponse = await fetch(`http://localhost:8000/download/${currentVideoData.download_id}`, {
+        const startResponse = await fetch(`${API_BASE_URL}/download/${currentVideoData.download_id}`, {
             method: 'POST'
         });
         
@@ -349,8 +349,15 @@ async function handleFinalDownload() {
             throw new Error(errorData.detail || 'Error starting download');
         }
         
-        // Poll for download status
-        await pollDownloadStatus(currentVideoData.download_id);
+        // Single-stream formats are piped from the origin as they arrive: save right away
+        const startData = await startResponse.json();
+        if (startData.stream) {
+            await finishDownload(currentVideoData.download_id, startData);
+            return;
+        }
+        
+        // Follow download progress (streamed, with polling fallback)
+        await watchDownloadProgress(currentVideoData.download_id);
         
     } catch (error) {
         showError('Error durante la descarga. Por favor, intenta nuevamente.');
@@ -360,63 +367,117 @@ async function handleFinalDownload() {
     }
 }
 
-// Poll download status until completion
-async function pollDownloadStatus(downloadId) {
-    const maxAttempts = 60; // 5 minutes max
-    let attempts = 0;
-    
+// Follow download progress through Server-Sent Events, falling back to polling
+async function watchDownloadProgress(downloadId) {
     // Show progress container
     progressContainer.style.display = 'block';
     updateProgress(0, 'Iniciando descarga...');
     
-    while (attempts < maxAttempts) {
-        try {
-            const statusResponse = await fetch(`${API_BASE_URL}/status/${downloadId}`);
-            
-            if (!statusResponse.ok) {
-                throw new Error('Error checking download status');
-            }
-            
-            const statusData = await statusResponse.json();
-            const progress = statusData.progress || 0;
-            
-            if (statusData.status === 'downloading') {
-                updateProgress(progress, 'Descargando archivo...');
-                downloadText.textContent = `Descargando... ${Math.round(progress)}%`;
-            } else if (statusData.status === 'processing') {
-                updateProgress(progress, 'Procesando archivo...');
-                downloadText.textContent = 'Procesando archivo...';
-            } else if (statusData.status === 'completed') {
-                updateProgress(100, '¡Descarga completada!');
-                
-                // Download the file
-                downloadText.textContent = 'Descargando archivo...';
-                await downloadCompletedFile(downloadId);
-                
-                // Cleanup
-                await cleanupDownload(downloadId);
-                
-                // Reset UI
-                resetDownloadForm();
-                showSuccessMessage();
-                return;
-                
-            } else if (statusData.status === 'error') {
-                throw new Error(statusData.error || 'Download failed');
+    if (!window.EventSource) {
+        return pollDownloadStatus(downloadId);
+    }
+    
+    const finalStatus = await new Promise((resolve) => {
+        const source = new EventSource(`${API_BASE_URL}/progress/${downloadId}`);
+        
+        source.onmessage = (event) => {
+            const statusData = JSON.parse(event.data);
+            if (statusData.status === 'completed' || statusData.status === 'error') {
+                source.close();
+                resolve(statusData);
+            } else {
+                showDownloadProgress(statusData);
             }
-            
-            // Wait before next poll
-            await delay(2000); // 2 seconds for more responsive updates
-            attempts++;
-            
-        } catch (error) {
-            throw error;
+        };
+        
+        source.onerror = () => {
+            // Stream unavailable or dropped: continue with polling
+            source.close();
+            resolve(null);
+        };
+    });
+    
+    if (!finalStatus) {
+        return pollDownloadStatus(downloadId);
+    }
+    
+    await finishDownload(downloadId, finalStatus);
+}
+
+// Poll download status until completion (fallback when streaming is unavailable)
+async function pollDownloadStatus(downloadId) {
+    const maxAttempts = 60; // 5 minutes max
+    let attempts = 0;
+    
+    while (attempts < maxAttempts) {
+        const statusResponse = await fetch(`${API_BASE_URL}/status/${downloadId}`);
+        
+        if (!statusResponse.ok) {
+            throw new Error('Error checking download status');
         }
+        
+        const statusData = await statusResponse.json();
+        
+        if (statusData.status === 'completed' || statusData.status === 'error') {
+            await finishDownload(downloadId, statusData);
+            return;
+        }
+        
+        showDownloadProgress(statusData);
+        
+        // Wait before next poll
+        await delay(2000); // 2 seconds for more responsive updates
+        attempts++;
     }
     
     throw new Error('Download timeout - please try again');
 }
 
+// Show an in-progress status update
+function showDownloadProgress(statusData) {
+    const progress = statusData.progress || 0;
+    
+    if (statusData.status === 'queued' && statusData.queue_position) {
+        updateProgress(0, `En cola (posición ${statusData.queue_position})...`);
+        downloadText.textContent = 'En cola...';
+    } else if (statusData.status === 'downloading') {
+        updateProgress(progress, `Descargando archivo...${formatTransferDetails(statusData)}`);
+        downloadText.textContent = `Descargando... ${Math.round(progress)}%`;
+    } else if (statusData.status === 'processing') {
+        updateProgress(progress, 'Procesando archivo...');
+        downloadText.textContent = 'Procesando archivo...';
+    }
+}
+
+// Speed and remaining time, e.g. " (2.4 MB/s • 12s restantes)"
+function formatTransferDetails(statusData) {
+    const parts = [];
+    if (statusData.speed) {
+        parts.push(`${(statusData.speed / (1024 * 1024)).toFixed(1)} MB/s`);
+    }
+    if (statusData.eta !== null && statusData.eta !== undefined) {
+        parts.push(`${statusData.eta}s restantes`);
+    }
+    return parts.length ? ` (${parts.join(' • ')})` : '';
+}
+
+// Handle the final status of a download
+async function finishDownload(downloadId, statusData) {
+    if (statusData.status === 'error') {
+        throw new Error(statusData.error || 'Download failed');
+    }
+    
+    updateProgress(100, '¡Descarga completada!');
+    
+    // Download the file
+    downloadText.textContent = 'Descargando archivo...';
+    await downloadCompletedFile(downloadId);
+    
+    // Reset UI
+    resetDownloadForm();
+    showSuccessMessage();
+}
+
 // Update progress bar and text
 function updateProgress(percentage, message) {
     const clampedPercentage = Math.max(0, Math.min(100, percentage));
@@ -437,50 +498,17 @@ function updateProgress(percentage, message) {
 
 // Download the completed file
 async function downloadCompletedFile(downloadId) {
-    try {
-        const response = await fetch(`${API_BASE_URL}/file/${downloadId}`);
-        
-        if (!response.ok) {
-            throw new Error('Error downloading file');
-        }
-        
-        // Get filename from response headers or use default
-        const contentDisposition = response.headers.get('content-disposition');
-        let filename = 'download';
-        
-        if (contentDisposition) {
-            const filenameMatch = contentDisposition.match(/filename="(.+)"/);
-            if (filenameMatch) {
-                filename = filenameMatch[1];
-            }
-        }
-        
-        // Create blob and download
-        const blob = await response.blob();
-        const url = URL.createObjectURL(blob);
-        
-        const a = document.createElement('a');
-        a.href = url;
-        a.download = filename;
-        document.body.appendChild(a);
-        a.click();
-        document.body.removeChild(a);
-        URL.revokeObjectURL(url);
-        
-    } catch (error) {
-        throw new Error(`Error downloading file: ${error.message}`);
-    }
-}
-
-// Cleanup download on backend
-async function cleanupDownload(downloadId) {
-    try {
-        await fetch(`${API_BASE_URL}/cleanup/${downloadId}`, {
-            method: 'DELETE'
-        });
-    } catch (error) {
-        console.warn('Error cleaning up download:', error);
-    }
+    // Let the browser save the file straight to disk instead of buffering it in a Blob:
+    // the server sends Content-Disposition: attachment and supports Range requests,
+    // so large files use constant memory and interrupted downloads can be resumed.
+    // The server removes the file on its own some minutes after a complete delivery.
+    const a = document.createElement('a');
+    a.href = `${API_BASE_URL}/file/${downloadId}`;
+    a.download = '';
+    a.rel = 'noopener';
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
 }
 
 // Simulate download process (replace with actual download logic)
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Descarga segmentada con varias conexiones
+Los archivos HTTP grandes se piden por rangos en paralelo y los formatos
+fragmentados (DASH/HLS) descargan varios fragmentos a la vez. Un manifiesto en
+disco guarda los segmentos terminados para reanudar tras un reinicio
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+import yt_dlp
+from yt_dlp.downloader import get_suitable_downloader
+from yt_dlp.downloader.fragment import FragmentFD
+from yt_dlp.downloader.http import HttpFD
+from yt_dlp.networking import Request
+from yt_dlp.networking.exceptions import RequestError
+from yt_dlp.utils import DownloadError
+
+# YouTube limita la velocidad de los rangos de más de ~10 MB
+SEGMENT_SIZE = 10 * 1024 * 1024
+# Por debajo de este tamaño no compensa abrir varias conexiones
+MIN_SEGMENTED_SIZE = 2 * SEGMENT_SIZE
+READ_SIZE = 256 * 1024
+SEGMENT_RETRIES = 5
+PROGRESS_INTERVAL = 0.5
+MANIFEST_SUFFIX = '.segments.json'
+
+
+class ConnectionLimiter:
+    """Límite global de conexiones repartido entre las descargas en curso"""
+
+    def __init__(self, max_connections=16):
+        self.max_connections = max(1, max_connections)
+        self._available = self.max_connections
+        self._cond = threading.Condition()
+
+    def reserve(self, wanted):
+        """Reserva hasta 'wanted' conexiones; espera si no queda ninguna libre"""
+        with self._cond:
+            while self._available == 0:
+                self._cond.wait()
+            granted = min(max(1, wanted), self._available)
+            self._available -= granted
+            return granted
+
+    def release(self, granted):
+        """Devuelve conexiones reservadas"""
+        with self._cond:
+            self._available += granted
+            self._cond.notify_all()
+
+    def stats(self):
+        """Devuelve el límite y las conexiones en uso"""
+        with self._cond:
+            return {'max_connections': self.max_connections,
+                    'in_use': self.max_connections - self._available}
+
+
+class SegmentedHttpFD(HttpFD):
+    """Descargador HTTP que pide el archivo por rangos con varias conexiones"""
+
+    FD_NAME = 'segmented'
+
+    def __init__(self, ydl, params, connections=4):
+        super().__init__(ydl, params)
+        self.connections = connections
+
+    def real_download(self, filename, info_dict):
+        headers = dict(info_dict.get('http_headers') or {})
+        tmpfilename = self.temp_name(filename)
+        manifest_path = tmpfilename + MANIFEST_SUFFIX
+        if info_dict.get('request_data') or any(name.lower() == 'range' for name in headers):
+            self._discard_segmented(tmpfilename, manifest_path)
+            return super().real_download(filename, info_dict)
+        # Con una sola conexión, un .part segmentado se sigue reanudando por segmentos
+        if self.connections < 2 and not os.path.exists(manifest_path):
+            return super().real_download(filename, info_dict)
+
+        headers['Accept-Encoding'] = 'identity'
+        total = self._probe_size(info_dict['url'], headers, info_dict)
+        if not total or total < MIN_SEGMENTED_SIZE:
+            # El servidor no admite rangos o el archivo es pequeño
+            self._discard_segmented(tmpfilename, manifest_path)
+            return super().real_download(filename, info_dict)
+
+        segment_size = self.params.get('segment_size') or SEGMENT_SIZE
+        done = self._load_manifest(manifest_path, tmpfilename, total, segment_size)
+        if not done:
+            with open(tmpfilename, 'wb') as f:
+                f.truncate(total)
+        else:
+            self.to_screen(f"[{self.FD_NAME}] Reanudando: {len(done)} segmentos ya descargados")
+
+        count = math.ceil(total / segment_size)
+        pending = [index for index in range(count) if index not in done]
+        self.report_destination(filename)
+
+        state = {
+            'filename': filename,
+            'tmpfilename': tmpfilename,
+            'manifest': manifest_path,
+            'total': total,
+            'segment_size': segment_size,
+            'done': done,
+            'downloaded': sum(self._segment_length(i, total, segment_size) for i in done),
+            'lock': threading.Lock(),
+            'stop': threading.Event(),
+        }
+        resumed = state['downloaded']
+        started = time.time()
+
+        with ThreadPoolExecutor(max_workers=min(self.connections, len(pending) or 1),
+                                thread_name_prefix='segment') as pool:
+            futures = {pool.submit(self._fetch_segment, index, info_dict, headers, state)
+                       for index in pending}
+            try:
+                while futures:
+                    finished, futures = wait(futures, timeout=PROGRESS_INTERVAL,
+                                             return_when=FIRST_EXCEPTION)
+                    for future in finished:
+                        future.result()
+                    self._report(state, info_dict, started, resumed)
+            except Exception:
+                # Se dejan terminar los segmentos en curso para que queden en el
+                # manifiesto: la próxima vez se reanuda desde ahí
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                raise
+            except BaseException:
+                state['stop'].set()
+                raise
+
+        self.try_rename(tmpfilename, filename)
+        try:
+            os.remove(manifest_path)
+        except OSError:
+            pass
+
+        self._hook_progress({
+            'status': 'finished',
+            'downloaded_bytes': total,
+            'total_bytes': total,
+            'filename': filename,
+            'elapsed': time.time() - started,
+        }, info_dict)
+        return True
+
+    @staticmethod
+    def _discard_segmented(tmpfilename, manifest_path):
+        """Un .part de una descarga segmentada tiene huecos: la descarga normal no
+        puede continuarlo, así que se borra con su manifiesto"""
+        if os.path.exists(manifest_path):
+            for path in (tmpfilename, manifest_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _request(self, url, headers, info_dict, byte_range):
+        extensions = {}
+        impersonate = self._get_impersonate_target(info_dict)
+        if impersonate is not None:
+            extensions['impersonate'] = impersonate
+        headers = dict(headers, Range=f"bytes={byte_range[0]}-{byte_range[1]}")
+        return self.ydl.urlopen(Request(url, headers=headers, extensions=extensions))
+
+    def _probe_size(self, url, headers, info_dict):
+        """Pide el primer byte para confirmar que hay rangos y conocer el tamaño"""
+        try:
+            response = self._request(url, headers, info_dict, (0, 0))
+        except RequestError:
+            return None
+        try:
+            content_range = response.headers.get('Content-Range') or ''
+            if response.status != 206 or '/' not in content_range:
+                return None
+            size = content_range.rsplit('/', 1)[1]
+            return int(size) if size.isdigit() else None
+        finally:
+            response.close()
+
+    @staticmethod
+    def _segment_length(index, total, segment_size):
+        start = index * segment_size
+        return min(total, start + segment_size) - start
+
+    def _fetch_segment(self, index, info_dict, headers, state):
+        """Descarga un segmento en su posición del archivo temporal, con reintentos"""
+        total, segment_size = state['total'], state['segment_size']
+        start = index * segment_size
+        end = start + self._segment_length(index, total, segment_size) - 1
+        written = 0
+        retries = self.params.get('retries', SEGMENT_RETRIES)
+
+        for attempt in range(retries + 1):
+            if state['stop'].is_set():
+                return
+            try:
+                response = self._request(info_dict['url'], headers, info_dict,
+                                         (start + written, end))
+                try:
+                    if response.status != 206:
+                        raise DownloadError(f"El servidor ignoró el rango del segmento {index}")
+                    with open(state['tmpfilename'], 'r+b') as f:
+                        f.seek(start + written)
+                        while not state['stop'].is_set():
+                            chunk = response.read(READ_SIZE)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                            written += len(chunk)
+                            with state['lock']:
+                                state['downloaded'] += len(chunk)
+                finally:
+                    response.close()
+
+                if state['stop'].is_set():
+                    return
+                if start + written != end + 1:
+                    raise DownloadError(
+                        f"Segmento {index} incompleto ({written} de {end - start + 1} bytes)")
+                self._segment_done(index, state)
+                return
+
+            except (RequestError, DownloadError, OSError) as e:
+                if attempt == retries:
+                    raise DownloadError(f"No se pudo descargar el segmento {index}: {e}")
+                self.to_screen(f"[{self.FD_NAME}] Reintentando el segmento {index} "
+                               f"({attempt + 1}/{retries}): {e}")
+                time.sleep(min(2 ** attempt, 30))
+
+    def _segment_done(self, index, state):
+        """Añade el segmento al manifiesto (escritura atómica)"""
+        with state['lock']:
+            state['done'].add(index)
+            manifest = {
+                'size': state['total'],
+                'segment_size': state['segment_size'],
+                'done': sorted(state['done']),
+            }
+            tmp = state['manifest'] + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(tmp, state['manifest'])
+
+    def _load_manifest(self, manifest_path, tmpfilename, total, segment_size):
+        """Segmentos ya descargados según el manifiesto (vacío si no coincide)"""
+        if not self.params.get('continuedl', True):
+            return set()
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if (manifest.get('size') != total or
+                    manifest.get('segment_size') != segment_size or
+                    os.path.getsize(tmpfilename) != total):
+                return set()
+            return set(manifest.get('done') or ())
+        except (OSError, ValueError):
+            return set()
+
+    def _report(self, state, info_dict, started, resumed):
+        """Avisa a los progress_hooks desde el hilo principal de la descarga"""
+        now = time.time()
+        with state['lock']:
+            downloaded = state['downloaded']
+        speed = self.calc_speed(started, now, downloaded - resumed)
+        self._hook_progress({
+            'status': 'downloading',
+            'downloaded_bytes': downloaded,
+            'total_bytes': state['total'],
+            'filename': state['filename'],
+            'tmpfilename': state['tmpfilename'],
+            'speed': speed,
+            'eta': self.calc_eta(speed, state['total'] - downloaded),
+            'elapsed': now - started,
+        }, info_dict)
+
+
+class SegmentedYDL(yt_dlp.YoutubeDL):
+    """YoutubeDL que usa varias conexiones por archivo cuando se configura
+
+    Opciones propias: 'segmented_connections' (conexiones por descarga),
+    'segment_size' y 'connection_limiter' (ConnectionLimiter compartido)
+    """
+
+    def dl(self, name, info, subtitle=False, test=False):
+        connections = self.params.get('segmented_connections') or 1
+        if test or subtitle or name == '-' or not info.get('url'):
+            return super().dl(name, info, subtitle, test)
+        # Sin varias conexiones solo hace falta SegmentedHttpFD para reanudar un .part
+        # que dejó una descarga segmentada anterior
+        if connections < 2 and not self._segmented_leftover(name):
+            return super().dl(name, info, subtitle, test)
+
+        fd_class = get_suitable_downloader(info, self.params)
+        if fd_class is not HttpFD and not (fd_class and issubclass(fd_class, FragmentFD)):
+            return super().dl(name, info, subtitle, test)
+        if connections < 2 and fd_class is not HttpFD:
+            return super().dl(name, info, subtitle, test)
+
+        limiter = self.params.get('connection_limiter')
+        granted = limiter.reserve(connections) if limiter else connections
+        try:
+            # Los descargadores de fragmentos de yt-dlp ya guardan su propio
+            # índice (.ytdl) para reanudar; solo hace falta darles conexiones
+            params = dict(self.params, concurrent_fragment_downloads=granted)
+            if fd_class is HttpFD:
+                fd = SegmentedHttpFD(self, params, connections=granted)
+            else:
+                fd = fd_class(self, params)
+            for ph in self._progress_hooks:
+                fd.add_progress_hook(ph)
+
+            new_info = self._copy_infodict(info)
+            if new_info.get('http_headers') is None:
+                new_info['http_headers'] = self._calc_headers(new_info)
+            return fd.download(name, new_info, subtitle)
+        finally:
+            if limiter:
+                limiter.release(granted)
+
+    def _segmented_leftover(self, name):
+        """Indica si queda el manifiesto de una descarga segmentada de 'name'"""
+        tmpfilename = name if self.params.get('nopart') else f"{name}.part"
+        return os.path.exists(tmpfilename + MANIFEST_SUFFIX)
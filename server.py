@@ -0,0 +1,1594 @@
+#!/usr/bin/env python3
+"""
+YouTube Downloader - Servidor HTTP
+Implementa el API que usa script.js (/analyze-url, /analyze, /download, /status,
+/file, /cleanup) y /metrics (Prometheus) sobre asyncio, enviando las llamadas bloqueantes de yt-dlp
+a un pool acotado de hilos con control de admisión
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import math
+import mimetypes
+import os
+import re
+import shutil
+import socket
+import sys
+import time
+import uuid
+from email.utils import formatdate
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlsplit
+
+from format_selection import AUDIO_CODECS, QualityPolicy, pick_audio
+from job_journal import RESUMABLE_STATUSES, JobJournal
+from job_store import LEASE_TTL, open_job_store
+from metrics import (ACTIVE_JOBS, BYTES_SERVED, CACHE_REQUESTS, FILE_SERVE_SECONDS,
+                     DISK_USED_RATIO, QUEUE_DEPTH, QUEUE_WAIT_SECONDS, SCRATCH_BYTES)
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics
+from playlist_expander import is_collection_url
+from profiling import MODES as PROFILE_MODES, Profiler
+from rate_control import RateLimitedError
+from progress import ProgressTracker
+from result_store import ResultStore, result_key
+from scratch_sweeper import DEFAULT_HIGH_WATER, ScratchSweeper
+from scheduler import DEFAULT_PRIORITY, PRIORITY_WEIGHTS, BandwidthLimiter, FairScheduler
+from single_flight import AsyncSingleFlight, file_lock
+from video_cache import extract_video_id
+from youtube_downloader import YouTubeDownloader
+
+MAX_HEADER_SIZE = 64 * 1024
+MAX_BODY_SIZE = 1024 * 1024
+KEEPALIVE_TIMEOUT = 15
+JOB_TTL = 6 * 60 * 60
+# Tiempo que se conserva un archivo tras entregarlo completo (para reanudar)
+DELIVERED_GRACE = 10 * 60
+# Modo directo: tamaño de bloque y de búfer del pipe con yt-dlp
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_BUFFER_SIZE = 1024 * 1024
+STREAM_START_TIMEOUT = 60
+# Frecuencia máxima de eventos de progreso por conexión y latido para proxies
+SSE_MIN_INTERVAL = 0.25
+SSE_HEARTBEAT = 15
+# Con varias réplicas: frecuencia máxima con la que se publica el progreso en el
+# almacén compartido y con la que se consulta el de los trabajos de otra réplica
+PUBLISH_INTERVAL = 1.0
+REMOTE_POLL_INTERVAL = 1.0
+# Bitrate de las conversiones a MP3 (kbps)
+MP3_BITRATE = 192
+
+TERMINAL_STATUSES = ('completed', 'error')
+
+STATUS_TEXT = {
+    200: 'OK', 204: 'No Content', 206: 'Partial Content', 304: 'Not Modified',
+    400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+    412: 'Precondition Failed', 413: 'Payload Too Large', 416: 'Range Not Satisfiable',
+    429: 'Too Many Requests', 431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable',
+}
+
+
+class HTTPError(Exception):
+    """Error que se devuelve al cliente como JSON {'detail': ...}"""
+
+    def __init__(self, status, detail, headers=None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.headers = headers or {}
+
+
+class Request:
+    """Petición HTTP ya interpretada"""
+
+    def __init__(self, method, target, version, headers, client):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = parse_qs(parts.query)
+        self.version = version
+        self.headers = headers
+        self.client = client
+        self.body = b''
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+    def json(self):
+        """Devuelve el cuerpo como JSON"""
+        try:
+            data = json.loads(self.body or b'{}')
+        except ValueError:
+            raise HTTPError(400, "El cuerpo de la petición no es JSON válido")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "El cuerpo de la petición debe ser un objeto JSON")
+        return data
+
+
+class Response:
+    """Respuesta HTTP con cuerpo en memoria"""
+
+    keep_alive = True
+
+    def __init__(self, status=200, body=b'', headers=None,
+                 content_type='application/json; charset=utf-8'):
+        self.status = status
+        self.body = body
+        self.headers = dict(headers or {})
+        if content_type and body:
+            self.headers.setdefault('Content-Type', content_type)
+
+    def head(self, keep_alive):
+        """Construye la línea de estado y las cabeceras"""
+        lines = [f"HTTP/1.1 {self.status} {STATUS_TEXT.get(self.status, '')}"]
+        self.headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+        lines += [f"{name}: {value}" for name, value in self.headers.items()]
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def send(self, writer, request, keep_alive):
+        """Escribe la respuesta completa en el socket"""
+        self.headers['Content-Length'] = str(len(self.body))
+        writer.write(self.head(keep_alive))
+        if request is None or request.method != 'HEAD':
+            writer.write(self.body)
+        await writer.drain()
+
+
+class FileResponse(Response):
+    """Respuesta que envía un archivo con sendfile, con soporte de Range y ETag"""
+
+    def __init__(self, path, filename, headers=None, on_done=None):
+        super().__init__(200, headers=headers)
+        self.path = Path(path)
+        self.on_done = on_done  # on_done(bytes_enviados, entrega_completa)
+        self.headers['Content-Type'] = (
+            mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        self.headers['Content-Disposition'] = content_disposition(filename)
+        self.headers['Accept-Ranges'] = 'bytes'
+
+    def _select_range(self, request, size, etag):
+        """Devuelve (inicio, fin) del rango pedido o None para el archivo completo"""
+        header = request.headers.get('range')
+        if not header:
+            return None
+
+        # If-Range: solo se respeta el rango si el archivo no ha cambiado
+        if_range = request.headers.get('if-range')
+        if if_range and if_range != etag:
+            return None
+
+        match = re.match(r'^bytes=(\d*)-(\d*)$', header.strip())
+        if not match or match.groups() == ('', ''):
+            return None  # Rangos múltiples o inválidos: se envía el archivo completo
+
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(0, size - int(last))
+            end = size - 1
+
+        if start >= size or start > end:
+            raise HTTPError(416, "Rango no válido",
+                            {'Content-Range': f"bytes */{size}"})
+        return start, end
+
+    def prepare(self, request):
+        """Abre el archivo y resuelve las cabeceras condicionales y el rango"""
+        self._file = open(self.path, 'rb')
+        st = os.fstat(self._file.fileno())
+        size = self._size = st.st_size
+        etag = f'"{st.st_ino:x}-{size:x}-{st.st_mtime_ns:x}"'
+        self.headers['ETag'] = etag
+        self.headers['Last-Modified'] = formatdate(st.st_mtime, usegmt=True)
+
+        if request.headers.get('if-none-match') == etag:
+            self.status = 304
+            self._range = (0, -1)
+            return self
+
+        try:
+            byte_range = self._select_range(request, size, etag)
+        except HTTPError:
+            self._file.close()
+            raise
+
+        if byte_range:
+            self.status = 206
+            self.headers['Content-Range'] = f"bytes {byte_range[0]}-{byte_range[1]}/{size}"
+        self._range = byte_range or (0, size - 1)
+        return self
+
+    async def send(self, writer, request, keep_alive):
+        start, end = self._range
+        count = end - start + 1
+        sent = 0
+        try:
+            self.headers['Content-Length'] = str(count)
+            writer.write(self.head(keep_alive))
+            await writer.drain()
+            if request.method == 'HEAD' or count <= 0:
+                return
+
+            # Copia directa del archivo al socket (os.sendfile cuando es posible)
+            loop = asyncio.get_running_loop()
+            started = time.monotonic()
+            try:
+                sent = await loop.sendfile(writer.transport, self._file, start, count)
+            finally:
+                FILE_SERVE_SECONDS.labels(mode='file').observe(time.monotonic() - started)
+                BYTES_SERVED.labels(mode='file').inc(sent)
+        finally:
+            self._file.close()
+            if self.on_done:
+                self.on_done(sent, sent == count and end == self._size - 1)
+
+
+class EventStreamResponse(Response):
+    """Respuesta Server-Sent Events alimentada por un generador asíncrono"""
+
+    keep_alive = False
+
+    def __init__(self, events, headers=None):
+        super().__init__(200, headers=headers)
+        self.events = events
+        self.headers.update({
+            'Content-Type': 'text/event-stream; charset=utf-8',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',
+        })
+
+    async def send(self, writer, request, keep_alive):
+        writer.write(self.head(False))
+        writer.write(b'retry: 2000\n\n')
+        await writer.drain()
+        async for event in self.events:
+            if event is None:
+                writer.write(b': ping\n\n')
+            else:
+                data = json.dumps(event, ensure_ascii=False)
+                writer.write(f"data: {data}\n\n".encode('utf-8'))
+            await writer.drain()
+
+
+class PipeResponse(Response):
+    """Respuesta chunked que reenvía la salida de un proceso a medida que llega"""
+
+    keep_alive = False
+
+    def __init__(self, process, first_chunk, filename, stderr_task=None, on_done=None,
+                 sink=None):
+        super().__init__(200)
+        self.process = process
+        self.first_chunk = first_chunk
+        self.stderr_task = stderr_task
+        self.on_done = on_done  # on_done(sink_confirmado)
+        self.sink = sink        # StoreWriter que recibe una copia de los bytes
+        self.headers['Content-Type'] = (
+            mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        self.headers['Content-Disposition'] = content_disposition(filename)
+        self.headers['Accept-Ranges'] = 'none'
+        self.headers['Transfer-Encoding'] = 'chunked'
+
+    async def send(self, writer, request, keep_alive):
+        complete = False
+        started = time.monotonic()
+        sent = 0
+        try:
+            writer.write(self.head(False))
+            if self.process is None:
+                await writer.drain()
+                return
+
+            chunk = self.first_chunk
+            while chunk:
+                writer.writelines([b'%x\r\n' % len(chunk), chunk, b'\r\n'])
+                sent += len(chunk)
+                if self.sink:
+                    self.sink.write(chunk)
+                # Mientras el cliente no acepte más datos no se lee del pipe,
+                # y yt-dlp queda bloqueado al escribir en él
+                await writer.drain()
+                chunk = await self.process.stdout.read(STREAM_CHUNK_SIZE)
+
+            # Sin el bloque final el cliente detecta la transferencia incompleta
+            if await self.process.wait() == 0:
+                complete = True
+                writer.write(b'0\r\n\r\n')
+                await writer.drain()
+        finally:
+            if self.process is not None:
+                FILE_SERVE_SECONDS.labels(mode='stream').observe(time.monotonic() - started)
+                BYTES_SERVED.labels(mode='stream').inc(sent)
+                if self.process.returncode is None:
+                    self.process.kill()
+                    await self.process.wait()
+                if self.stderr_task:
+                    self.stderr_task.cancel()
+            if self.sink and not complete:
+                self.sink.abort()
+            if self.on_done:
+                self.on_done(self.sink if complete else None)
+
+
+async def read_tail(stream, limit=4096):
+    """Lee un stream hasta el final conservando solo los últimos bytes"""
+    tail = b''
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return tail
+        tail = (tail + chunk)[-limit:]
+
+
+def json_response(data, status=200, headers=None):
+    """Crea una respuesta JSON"""
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    return Response(status, body, headers)
+
+
+def content_disposition(filename):
+    """Cabecera Content-Disposition con nombre ASCII y UTF-8"""
+    ascii_name = filename.encode('ascii', 'replace').decode('ascii').replace('?', '_')
+    ascii_name = ascii_name.replace('"', "'")
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def format_duration(seconds):
+    """Convierte segundos a m:ss o h:mm:ss"""
+    seconds = int(seconds or 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_views(count):
+    """Convierte el número de visualizaciones a texto corto"""
+    if not count:
+        return "Sin visualizaciones"
+    for divisor, suffix in ((1e9, 'B'), (1e6, 'M'), (1e3, 'K')):
+        if count >= divisor:
+            return f"{count / divisor:.1f}".rstrip('0').rstrip('.') + f"{suffix} visualizaciones"
+    return f"{count} visualizaciones"
+
+
+class Job:
+    """Trabajo de descarga creado por /analyze"""
+
+    def __init__(self, url, media_format, quality, video_info, client, loop=None,
+                 job_id=None, journal=None, store=None):
+        self.id = job_id or str(uuid.uuid4())
+        self.url = url
+        self.format = media_format
+        self.quality = quality
+        self.video_info = video_info
+        self.client = client
+        self.format_id = None
+        self.status = 'pending'
+        self.error = None
+        self.filepath = None
+        self.filename = None
+        self.store_key = None
+        self.store_ref = False  # el trabajo tiene una referencia en el almacén
+        self.stream = False
+        self.stream_ext = 'mp4'
+        self.profile = False    # perfilar la extracción y la descarga
+        self.profiles = []      # artefactos de perfilado generados
+        self.priority = DEFAULT_PRIORITY
+        self.ticket = None      # turno en el planificador mientras espera un hilo
+        self.cpu_seconds = 0.0  # CPU de los procesos de FFmpeg del trabajo
+        self.active_transfers = 0
+        self.delivered = False
+        self.cleanup_requested = False
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+        self.tracker = ProgressTracker(on_update=self._on_progress)
+        self.version = 0
+        self.journal = journal
+        # Almacén compartido entre réplicas (None con una sola réplica)
+        self.store = store
+        self.leased = False         # esta réplica tiene el arriendo del trabajo
+        self.remote = False         # copia de un trabajo que lleva otra réplica
+        self.published = None       # último estado publicado por esa réplica
+        self.node_url = None        # URL de la réplica que tiene el archivo
+        self._published_at = 0.0
+        self._loop = loop
+        self._changed = asyncio.Event()
+
+    @classmethod
+    def from_state(cls, state, loop=None, journal=None, store=None):
+        """Reconstruye un trabajo a partir de su registro (diario o almacén compartido)"""
+        job = cls(state['url'], state['format'], state.get('quality'),
+                  {'title': state['title']}, state['client'], loop=loop,
+                  job_id=state['id'], journal=journal, store=store)
+        job.format_id = state.get('format_id')
+        job.store_key = state.get('store_key')
+        job.stream = state.get('stream', False)
+        job.stream_ext = state.get('stream_ext') or 'mp4'
+        job.priority = state.get('priority') or DEFAULT_PRIORITY
+        job.status = state.get('status') or 'pending'
+        job.error = state.get('error')
+        job.node_url = state.get('node_url')
+        job.created_at, job.updated_at = state['created_at'], state['updated_at']
+        return job
+
+    def save(self, kind='status', **fields):
+        """Anota un cambio del trabajo en el diario (si lo hay)"""
+        if self.journal is not None:
+            self.journal.record(self.id, kind, **fields)
+
+    def set_status(self, status, **fields):
+        """Cambia el estado del trabajo (desde el bucle de eventos)"""
+        self.status = status
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.save(status=status, store_ref=self.store_ref, **fields)
+        if status in TERMINAL_STATUSES:
+            self.tracker.set_phase('done' if status == 'completed' else 'error')
+        self.notify()
+        self.publish(force=True)
+
+    def publish(self, force=False):
+        """Publica el estado en el almacén compartido (como mucho cada PUBLISH_INTERVAL)"""
+        if self.store is None:
+            return
+        now = time.monotonic()
+        if force or now - self._published_at >= PUBLISH_INTERVAL:
+            self._published_at = now
+            self.store.publish(self.id, self.to_status())
+
+    def notify(self):
+        """Despierta a los clientes que esperan cambios de este trabajo"""
+        self.version += 1
+        self.updated_at = time.time()
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_changed(self, version):
+        """Espera hasta que el trabajo cambie respecto a 'version'"""
+        if self.version == version:
+            await self._changed.wait()
+
+    def account_cpu(self, d):
+        """Hook de posprocesado: suma el tiempo de CPU de cada conversión terminada"""
+        if d.get('status') == 'finished':
+            self.cpu_seconds += d.get('cpu_seconds') or 0.0
+
+    def follow(self, leader):
+        """Comparte el progreso de otro trabajo que descarga el mismo resultado"""
+        self.tracker = leader.tracker
+        self.tracker.subscribe(self._on_progress)
+
+    def _on_progress(self):
+        """Callback del tracker (hilo de descarga): pasa el aviso al bucle"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._progress_changed)
+
+    def _progress_changed(self):
+        if self.status in TERMINAL_STATUSES:
+            return
+        phase = self.tracker.phase
+        self.status = 'processing' if phase in ('merging', 'processing') else 'downloading'
+        self.notify()
+        self.publish()
+
+    def to_status(self):
+        """Representación para /status y /progress"""
+        if self.remote and self.published:
+            return self.published
+        snapshot = self.tracker.snapshot()
+        return {
+            'download_id': self.id,
+            'status': self.status,
+            'phase': snapshot['phase'],
+            'progress': 100.0 if self.status == 'completed' else snapshot['percent'],
+            'downloaded_bytes': snapshot['downloaded_bytes'],
+            'total_bytes': snapshot['total_bytes'],
+            'speed': snapshot['speed'],
+            'eta': snapshot['eta'],
+            'stream': self.stream,
+            'priority': self.priority,
+            'queue_position': self.ticket.position() if self.ticket is not None else None,
+            'cpu_seconds': round(self.cpu_seconds, 2),
+            'error': self.error,
+            **({'profiles': self.profiles} if self.profile else {}),
+        }
+
+
+class DownloadServer:
+    """Servidor asyncio con el API del frontend"""
+
+    def __init__(self, downloader=None, max_workers=8, max_queue=64,
+                 max_per_client=4, max_connections=1024, download_root=Path("downloads"),
+                 allowed_origins=None, stream_combined=True, max_streams=32,
+                 store=None, store_budget=10 * 1024 ** 3, lock_dir=None,
+                 connections_per_job=1, max_download_connections=16, journal=None,
+                 profiler=None, max_queued_per_client=16, reserved_interactive=1,
+                 client_bandwidth=0, extract_rate=None, ffmpeg_workers=None,
+                 scratch_ttl=JOB_TTL, disk_high_water=DEFAULT_HIGH_WATER, job_store=None,
+                 node_url=None):
+        self.downloader = downloader or YouTubeDownloader(
+            pool_size=max_workers, lock_dir=lock_dir, connections_per_job=connections_per_job,
+            max_connections=max_download_connections, extract_rate=extract_rate,
+            ffmpeg_workers=ffmpeg_workers)
+        self.download_root = Path(download_root)
+        self.download_root.mkdir(exist_ok=True)
+        self.store = store or ResultStore(self.download_root / ".store", store_budget)
+        # Con un almacén compartido cualquier réplica puede informar de un trabajo,
+        # servirlo o retomarlo; hace también de diario
+        self.job_store = job_store
+        self.node_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.node_url = node_url.rstrip('/') if node_url else None
+        self.journal = journal or job_store or JobJournal(self.download_root / "jobs.sqlite3")
+        # Restos y resultados olvidados en las carpetas de los trabajos (p. ej. si el
+        # navegador se cerró sin llamar a /cleanup); con el disco casi lleno se expulsan
+        # también resultados del almacén
+        self.sweeper = ScratchSweeper(self.download_root, ttl=scratch_ttl,
+                                      high_water=disk_high_water, owners_only=True,
+                                      owner_info=self._owner_info, reclaimers=[self.store.trim],
+                                      verbose=True)
+        # Sin perfilador solo se perfilan los trabajos con la cabecera X-Profile
+        self.profiler = profiler or Profiler(self.download_root.parent / "profiles")
+
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_per_client = max_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.max_connections = max_connections
+        self.allowed_origins = allowed_origins or ['*']
+        self.stream_combined = stream_combined
+        self.max_streams = max_streams
+        self.lock_dir = lock_dir
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers,
+                                           thread_name_prefix='ytdl-worker')
+        # El planificador decide qué tarea ocupa cada hilo del pool
+        self.scheduler = FairScheduler(max_workers, max_running_per_client=max_per_client,
+                                       reserved_interactive=reserved_interactive)
+        # Bytes por segundo por cliente en las descargas a disco (0 = sin límite)
+        self.bandwidth = BandwidthLimiter(client_bandwidth) if client_bandwidth else None
+        self.jobs = {}
+        self._in_flight = 0            # tareas enviadas al pool sin terminar
+        self._in_flight_by_client = {}
+        self._avg_task_seconds = 5.0   # media móvil para estimar Retry-After
+        self._connections = 0
+        self._active_streams = 0
+        # Peticiones idénticas en curso: se agrupan en una sola extracción/descarga
+        self.flights = AsyncSingleFlight()
+        self._leaders = {}             # clave del almacén -> trabajo que descarga
+
+        self.routes = [
+            ('POST', re.compile(r'^/analyze-url$'), self.handle_analyze_url),
+            ('POST', re.compile(r'^/analyze$'), self.handle_analyze),
+            ('POST', re.compile(r'^/download/(?P<job_id>[\w-]+)$'), self.handle_download),
+            ('GET', re.compile(r'^/status/(?P<job_id>[\w-]+)$'), self.handle_status),
+            ('GET', re.compile(r'^/progress/(?P<job_id>[\w-]+)$'), self.handle_progress),
+            ('GET', re.compile(r'^/file/(?P<job_id>[\w-]+)$'), self.handle_file),
+            ('DELETE', re.compile(r'^/cleanup/(?P<job_id>[\w-]+)$'), self.handle_cleanup),
+            ('GET', re.compile(r'^/health$'), self.handle_health),
+            ('GET', re.compile(r'^/metrics$'), self.handle_metrics),
+        ]
+
+        # Medidores que se calculan al exportar las métricas
+        ACTIVE_JOBS.set_function(lambda: sum(
+            1 for job in self.jobs.values() if job.status in RESUMABLE_STATUSES))
+        QUEUE_DEPTH.set_function(self.scheduler.waiting)
+        SCRATCH_BYTES.labels(area='jobs').set_function(self._scratch_bytes)
+        SCRATCH_BYTES.labels(area='store').set_function(lambda: self.store.stats()['bytes'])
+        DISK_USED_RATIO.set_function(lambda: (self.sweeper.disk_usage() or (0,))[0])
+
+    # -- Control de admisión -------------------------------------------------
+
+    def _retry_after(self):
+        """Estima en segundos cuándo habrá hueco en el pool"""
+        waves = max(1, self._in_flight - self.max_workers + 1) / self.max_workers
+        return max(1, math.ceil(waves * self._avg_task_seconds))
+
+    def admit(self, client):
+        """Rechaza la petición si el pool o el cliente están saturados"""
+        if self._in_flight >= self.max_workers + self.max_queue:
+            raise HTTPError(503, "Servidor ocupado, intenta de nuevo en unos segundos",
+                            {'Retry-After': str(self._retry_after())})
+        # Las tareas de un cliente por encima de max_per_client esperan su turno;
+        # solo se rechazan cuando además llenan su parte de la cola
+        if self._in_flight_by_client.get(client, 0) >= \
+                self.max_per_client + self.max_queued_per_client:
+            raise HTTPError(429, "Demasiadas peticiones simultáneas",
+                            {'Retry-After': str(self._retry_after())})
+
+    async def run_blocking(self, client, fn, *args, priority=DEFAULT_PRIORITY, job=None,
+                           **kwargs):
+        """Ejecuta una llamada bloqueante en el pool cuando el planificador le da turno"""
+        self.admit(client)
+        self._in_flight += 1
+        self._in_flight_by_client[client] = self._in_flight_by_client.get(client, 0) + 1
+        started = time.monotonic()
+        ticket = self.scheduler.enqueue(client, priority)
+        if job is not None:
+            job.ticket = ticket  # /status muestra la posición mientras espera
+        try:
+            await self.scheduler.wait(ticket)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(
+                self._timed_call, started, fn, *args, **kwargs))
+        finally:
+            if job is not None:
+                job.ticket = None
+            if ticket.running:
+                self.scheduler.release(ticket)
+                self._notify_queued()
+            elapsed = time.monotonic() - started
+            self._avg_task_seconds = 0.9 * self._avg_task_seconds + 0.1 * elapsed
+            self._in_flight -= 1
+            remaining = self._in_flight_by_client[client] - 1
+            if remaining:
+                self._in_flight_by_client[client] = remaining
+            else:
+                del self._in_flight_by_client[client]
+
+    def _notify_queued(self):
+        """Avisa a los trabajos en espera: su posición en la cola ha cambiado"""
+        for job in self.jobs.values():
+            if job.ticket is not None:
+                job.notify()
+
+    def _profiled_call(self, tag, artifacts, fn, *args, **kwargs):
+        """Ejecuta fn con el perfilado activo en el hilo del pool"""
+        with self.profiler.session(tag) as session:
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                artifacts.extend(session.artifacts)
+
+    def _request_priority(self, request, default=DEFAULT_PRIORITY):
+        """Clase de prioridad pedida con la cabecera X-Priority (interactive o batch)"""
+        priority = request.headers.get('x-priority', '').strip().lower()
+        if not priority:
+            return default
+        if priority not in PRIORITY_WEIGHTS:
+            raise HTTPError(400, f"Prioridad no válida (usa {' o '.join(PRIORITY_WEIGHTS)})")
+        return priority
+
+    def _wants_profile(self, request):
+        """Perfilar si el cliente lo pide (X-Profile: 1) o si toca por muestreo"""
+        forced = request.headers.get('x-profile', '').lower() in ('1', 'true', 'yes')
+        return self.profiler.wanted(forced)
+
+    @staticmethod
+    def _timed_call(queued_at, fn, *args, **kwargs):
+        """Anota cuánto esperó la tarea en la cola antes de ejecutarla"""
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - queued_at)
+        return fn(*args, **kwargs)
+
+    # -- Manejadores -----------------------------------------------------------
+
+    def _get_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            raise HTTPError(404, "Descarga no encontrada")
+        return job
+
+    async def _find_job(self, job_id):
+        """Trabajo de esta réplica o, con almacén compartido, copia del de otra réplica"""
+        job = self.jobs.get(job_id)
+        if self.job_store is None or (job is not None and
+                                      (job.leased or job.status != 'pending')):
+            return self._get_job(job_id)
+        # Un trabajo analizado aquí pero sin arriendo puede haberlo tomado otra réplica
+        state = await self._store_call(self.job_store.get, job_id)
+        if state is None:
+            return self._get_job(job_id)
+        if job is not None:
+            if state.get('lease_owner') is None and state.get('status') == 'pending':
+                return job
+            # La copia local se ha quedado en 'pending': el estado está en el almacén
+            self.jobs.pop(job_id, None)
+        job = Job.from_state(state, loop=asyncio.get_running_loop(), journal=self.journal,
+                             store=self.job_store)
+        job.remote = True
+        job.published = state.get('progress')
+        job.filepath = Path(state['filepath']) if state.get('filepath') else None
+        job.filename = state.get('filename')
+        return job
+
+    async def _store_call(self, fn, *args):
+        """Consulta el almacén compartido desde el bucle de eventos"""
+        try:
+            return await asyncio.wrap_future(self.job_store.submit(fn, *args))
+        except Exception as e:
+            raise HTTPError(503, f"Almacén de trabajos no disponible: {e}", {'Retry-After': '1'})
+
+    async def _acquire(self, job):
+        """Toma el arriendo del trabajo; False si ya lo tiene otra réplica (o petición)"""
+        if not await self._store_call(self.job_store.acquire, job.id, self.node_id, LEASE_TTL):
+            return False
+        job.leased = True
+        job.save(node=self.node_id, node_url=self.node_url)
+        return True
+
+    def _release_lease(self, job):
+        if job.leased:
+            job.leased = False
+            self.job_store.submit(self.job_store.release, job.id, self.node_id)
+
+    async def _analyze(self, request, profile_tag=None, profiles=None):
+        """Valida la URL y obtiene la información del video"""
+        data = request.json()
+        url = str(data.get('url') or '').strip()
+        if not url or not self.downloader.validate_youtube_url(url):
+            raise HTTPError(400, "La URL no parece ser de YouTube")
+        if is_collection_url(url):
+            raise HTTPError(400, "Las listas y canales solo se pueden descargar en el modo por lotes")
+
+        key = ('info', extract_video_id(url) or url)
+        priority = self._request_priority(request)
+        call = (self.downloader.get_video_info, url)
+        if profile_tag:
+            # Solo se perfila si esta petición hace la extracción (sin caché ni agrupación)
+            call = (self._profiled_call, profile_tag, profiles) + call
+        try:
+            video_info = await self.flights.run(key, functools.partial(
+                self.run_blocking, request.client, *call, priority=priority))
+        except HTTPError:
+            raise
+        except RateLimitedError as e:
+            raise HTTPError(503, str(e), {'Retry-After': str(math.ceil(e.retry_after) or 1)})
+        except Exception as e:
+            raise HTTPError(400, str(e))
+        return data, url, video_info
+
+    def _public_info(self, video_info):
+        """Información del video en el formato que espera script.js"""
+        video_id = video_info.get('video_id')
+        thumbnail = video_info.get('thumbnail') or (
+            f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg" if video_id else '')
+        formats_available = {'mp4': {}, 'mp3': {}}
+        for fmt in video_info['formats']:
+            size = self.downloader.format_filesize(fmt['filesize'],
+                                                   fmt.get('filesize_estimated'))
+            formats_available['mp4'][fmt['quality']] = {
+                'format_id': fmt['format_id'],
+                'label': f"{fmt['quality']} • {size}",
+                'filesize': fmt['filesize'],
+            }
+        mp3_size = int(MP3_BITRATE * 1000 / 8 * video_info['duration']) \
+            if video_info.get('duration') else 0
+        formats_available['mp3'][f'{MP3_BITRATE}kbps'] = {
+            'label': f"MP3 {MP3_BITRATE} kbps • {self.downloader.format_filesize(mp3_size, True)}",
+            'filesize': mp3_size,
+        }
+        # Pistas que se entregan tal cual, sin recodificar
+        for codec in AUDIO_CODECS[1:]:
+            track, chosen = pick_audio(video_info.get('audio_formats'), (codec,))
+            if track is None or chosen != codec:
+                continue
+            size = self.downloader.format_filesize(track['filesize'], track['filesize_estimated'])
+            formats_available[codec] = {f"{track['abr']}kbps": {
+                'format_id': track['format_id'],
+                'label': f"{codec.upper()} {track['abr']} kbps (original) • {size}",
+                'filesize': track['filesize'],
+            }}
+
+        return {
+            'id': video_id,
+            'title': video_info['title'],
+            'uploader': video_info['uploader'],
+            'thumbnail': thumbnail,
+            'duration': format_duration(video_info['duration']),
+            'views': format_views(video_info.get('view_count')),
+            'formats_available': formats_available,
+        }
+
+    def _select_format(self, video_info, quality):
+        """Elige el formato más cercano a la calidad pedida sin superarla"""
+        formats = video_info['formats']
+        if not formats:
+            raise HTTPError(400, "No se encontraron formatos MP4 disponibles")
+        policy = QualityPolicy.parse(f"best<={quality}" if quality else 'best')
+        return policy.select(formats) or min(formats, key=lambda fmt: fmt['height'])
+
+    async def handle_analyze_url(self, request):
+        _, _, video_info = await self._analyze(request)
+        return json_response({'video_info': self._public_info(video_info)})
+
+    async def handle_analyze(self, request):
+        job_id = str(uuid.uuid4())
+        profile = self._wants_profile(request)
+        profiles = []
+        data, url, video_info = await self._analyze(request, job_id if profile else None, profiles)
+        media_format = data.get('format') or 'mp4'
+        if media_format != 'mp4' and media_format not in AUDIO_CODECS:
+            raise HTTPError(400, f"Formato no soportado (usa mp4, {', '.join(AUDIO_CODECS)})")
+
+        quality = data.get('quality') if media_format == 'mp4' else None
+        job = Job(url, media_format, quality, video_info, request.client,
+                  loop=asyncio.get_running_loop(), job_id=job_id, journal=self.journal,
+                  store=self.job_store)
+        job.profile = profile
+        job.profiles = profiles
+        job.priority = self._request_priority(request)
+        video_id = video_info.get('video_id') or extract_video_id(url)
+
+        estimated_size = None
+        if media_format in AUDIO_CODECS:
+            # 'accept': códecs que el cliente también admite, por preferencia; una pista
+            # m4a u opus aceptada se copia sin recodificar en lugar de convertir a MP3
+            accept = data.get('accept') or [media_format]
+            if not isinstance(accept, list) or not set(accept) <= set(AUDIO_CODECS):
+                raise HTTPError(400, f"'accept' debe ser una lista de {', '.join(AUDIO_CODECS)}")
+            track, job.format = pick_audio(video_info.get('audio_formats'), accept)
+            if job.format is None:
+                raise HTTPError(400, "El video no tiene audio en ninguno de los formatos aceptados")
+            job.format_id = track['format_id'] if track else None
+            if video_id:
+                job.store_key = result_key(video_id, job.format_id or 'bestaudio', job.format)
+            if track and job.format != 'mp3' and track['filesize']:
+                estimated_size = self.downloader.format_filesize(
+                    track['filesize'], track['filesize_estimated'])
+        else:
+            selected = self._select_format(video_info, quality)
+            job.format_id = selected['format_id']
+            if video_id:
+                job.store_key = result_key(video_id, job.format_id, 'mp4')
+            # Los formatos con video y audio en una sola pista se envían sin pasar por disco
+            if self.stream_combined and selected.get('type') == 'combined':
+                job.stream = True
+                job.stream_ext = selected.get('ext') or 'mp4'
+            if selected['filesize']:
+                estimated_size = self.downloader.format_filesize(
+                    selected['filesize'], selected.get('filesize_estimated'))
+
+        self.jobs[job.id] = job
+        job.save('created', url=url, format=job.format, quality=quality,
+                 title=video_info['title'], client=request.client, format_id=job.format_id,
+                 store_key=job.store_key, stream=job.stream, stream_ext=job.stream_ext,
+                 priority=job.priority, status=job.status)
+        if self.job_store is not None:
+            # /download puede llegar a otra réplica: el registro tiene que estar escrito
+            await asyncio.wrap_future(self.job_store.sync())
+        return json_response({
+            'download_id': job.id,
+            'video_info': self._public_info(video_info),
+            'estimated_size': estimated_size,
+            'format': job.format,
+            'stream': job.stream,
+        })
+
+    async def handle_download(self, request, job_id):
+        job = await self._find_job(job_id)
+        if job.status != 'pending':
+            return json_response(job.to_status())
+        if self.job_store is not None:
+            # Una sola réplica prepara cada trabajo, aunque se pida a varias
+            if not await self._acquire(job):
+                if not job.remote and not job.leased:
+                    # Lo lleva otra réplica: su estado se consulta en el almacén
+                    self.jobs.pop(job.id, None)
+                return json_response(job.to_status())
+            if job.remote:
+                job.remote = False
+                self.jobs[job.id] = job
+
+        if not job.profile and self._wants_profile(request):
+            job.profile = True
+        # Un cliente que ya ocupa su cupo pasa a la clase por lotes y no retrasa a los
+        # usuarios interactivos; X-Priority puede bajar la prioridad, nunca subirla
+        job.priority = self._request_priority(request, job.priority)
+        if self.scheduler.running(job.client) + self.scheduler.waiting(job.client) >= \
+                self.max_per_client:
+            job.priority = 'batch'
+
+        # Resultado ya descargado por otro trabajo: se sirve desde el almacén (en un hilo:
+        # el almacén puede esperar a una expulsión o a otro proceso)
+        hit = await self._store_acquire(job.store_key) if job.store_key else None
+        if job.store_key:
+            CACHE_REQUESTS.labels(cache='store', result='hit' if hit else 'miss').inc()
+        if hit:
+            job.stream = False
+            job.store_ref = True
+            job.set_status('completed', filepath=hit[0], filename=hit[1])
+            self._release_lease(job)
+            return json_response(job.to_status())
+
+        if job.stream:
+            # No hay nada que preparar: /file reenvía los bytes según llegan
+            job.set_status('completed')
+            self._release_lease(job)
+            return json_response(job.to_status())
+
+        leader = self._leaders.get(job.store_key) if job.store_key else None
+        if leader is not None:
+            # Mismo video y formato en curso: se espera esa descarga sin ocupar el pool
+            job.follow(leader)
+        else:
+            try:
+                self.admit(request.client)
+            except HTTPError:
+                self._release_lease(job)
+                raise
+            if job.store_key:
+                self._leaders[job.store_key] = job
+        job.set_status('queued')
+        asyncio.ensure_future(self._run_job(job))
+        return json_response(job.to_status())
+
+    async def _run_job(self, job):
+        """Ejecuta la descarga (o se une a la que ya está en curso) y actualiza el estado"""
+        try:
+            if job.store_key:
+                leading = self._leaders.get(job.store_key) is job
+                try:
+                    filepath, filename = await self.flights.run(
+                        job.store_key, functools.partial(self._produce_result, job))
+                finally:
+                    if self._leaders.get(job.store_key) is job:
+                        del self._leaders[job.store_key]
+
+                # El trabajo que descargó ya tiene su referencia; los demás piden la suya
+                if not leading:
+                    hit = await self._store_acquire(job.store_key)
+                    if hit is None:
+                        raise Exception("El resultado compartido ya no está disponible")
+                    filepath, filename = hit
+                job.store_ref = True
+            else:
+                filepath, filename = await self._produce_result(job)
+            job.set_status('completed', filepath=Path(filepath), filename=filename)
+
+        except HTTPError as e:
+            job.set_status('error', error=e.detail)
+        except Exception as e:
+            job.set_status('error', error=str(e))
+        finally:
+            self._release_lease(job)
+
+    async def _produce_result(self, job):
+        """Descarga el resultado del trabajo en el pool de hilos"""
+        output_dir = self.download_root / job.id
+        output_dir.mkdir(parents=True, exist_ok=True)
+        call = (self._download_to_store, job, output_dir)
+        if job.profile:
+            call = (self._profiled_call, job.id, job.profiles) + call
+        result = await self.run_blocking(job.client, *call, priority=job.priority, job=job)
+        if isinstance(result, Future):
+            # Descarga terminada: su hilo ya atiende otra tarea mientras FFmpeg une las pistas
+            filepath = await asyncio.wrap_future(result)
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, self._store_file, job, filepath)
+        return result
+
+    def _download_to_store(self, job, output_dir):
+        """Descarga el archivo y lo incorpora al almacén (en un hilo del pool)"""
+        lock_dir = self.lock_dir if job.store_key else None
+        with file_lock(lock_dir, job.store_key):
+            if lock_dir is not None:
+                # Otro proceso puede haberlo descargado mientras se esperaba el bloqueo
+                hit = self.store.acquire(job.store_key)
+                if hit:
+                    return hit
+
+            title = job.video_info['title']
+            options = {
+                'quiet': True,
+                'output_dir': output_dir,
+                'progress_hooks': [job.tracker.progress_hook],
+                'postprocessor_hooks': [job.tracker.postprocessor_hook, job.account_cpu],
+            }
+            if self.bandwidth is not None:
+                options['progress_hooks'].append(self.bandwidth.progress_hook(job.client))
+            if job.format in AUDIO_CODECS:
+                filepath = self.downloader.download_audio(
+                    job.url, title, codec=job.format, bitrate=str(MP3_BITRATE),
+                    format_id=job.format_id, **options)
+            else:
+                # Con bloqueo entre procesos la unión se espera aquí, dentro del bloqueo
+                filepath = self.downloader.download_video(job.url, job.format_id, title,
+                                                          defer_merge=lock_dir is None,
+                                                          **options)
+                if isinstance(filepath, Future):
+                    return filepath
+            return self._store_file(job, filepath)
+
+    def _store_file(self, job, filepath):
+        """Incorpora el archivo terminado al almacén (o lo deja en la carpeta del trabajo)"""
+        if not filepath or not Path(filepath).exists():
+            raise Exception("No se encontró el archivo descargado")
+        filepath = Path(filepath)
+        if job.store_key:
+            return self.store.put_file(job.store_key, filepath, filepath.name)
+        return filepath, filepath.name
+
+    async def handle_status(self, request, job_id):
+        job = await self._find_job(job_id)
+        return json_response(job.to_status())
+
+    async def handle_progress(self, request, job_id):
+        job = await self._find_job(job_id)
+        if job.remote:
+            return EventStreamResponse(self._remote_progress_events(job))
+        return EventStreamResponse(self._progress_events(job))
+
+    async def _progress_events(self, job):
+        """Genera un evento por cambio del trabajo, como máximo cada SSE_MIN_INTERVAL"""
+        version = None
+        while True:
+            if job.version != version:
+                version = job.version
+                yield job.to_status()
+                if job.status in TERMINAL_STATUSES:
+                    return
+                # Agrupar los cambios que lleguen mientras tanto en un solo evento
+                await asyncio.sleep(SSE_MIN_INTERVAL)
+                continue
+            try:
+                await asyncio.wait_for(job.wait_changed(version), SSE_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield None
+
+    async def _remote_progress_events(self, job):
+        """Como _progress_events para un trabajo de otra réplica, consultando el almacén"""
+        last, idle = None, 0.0
+        while True:
+            status = job.to_status()
+            if status != last:
+                last, idle = status, 0.0
+                yield status
+                if status['status'] in TERMINAL_STATUSES:
+                    return
+            elif idle >= SSE_HEARTBEAT:
+                idle = 0.0
+                yield None
+            await asyncio.sleep(REMOTE_POLL_INTERVAL)
+            idle += REMOTE_POLL_INTERVAL
+            try:
+                job = await self._find_job(job.id)
+            except HTTPError:
+                return
+
+    async def handle_file(self, request, job_id):
+        job = await self._find_job(job_id)
+        if job.stream and job.status == 'completed':
+            return await self._stream_response(request, job)
+        if job.remote:
+            return self._remote_file(request, job)
+        if job.status != 'completed' or not job.filepath or not job.filepath.exists():
+            raise HTTPError(409, "La descarga todavía no está lista")
+
+        job.active_transfers += 1
+        response = FileResponse(job.filepath, job.filename or job.filepath.name,
+                                on_done=functools.partial(self._transfer_done, job))
+        try:
+            return response.prepare(request)
+        except BaseException:
+            job.active_transfers -= 1
+            raise
+
+    async def _stream_response(self, request, job):
+        """Lanza yt-dlp escribiendo en stdout y reenvía su salida al cliente"""
+        filename = f"{self.downloader.safe_filename(job.video_info['title'])}.{job.stream_ext}"
+        if request.method == 'HEAD':
+            return PipeResponse(None, b'', filename)
+        if self._active_streams >= self.max_streams:
+            raise HTTPError(503, "Demasiadas descargas directas en curso", {'Retry-After': '5'})
+
+        self._active_streams += 1
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, '-m', 'yt_dlp', '--quiet', '--no-warnings', '--no-playlist',
+                '--no-part', '-f', job.format_id, '-o', '-', job.url,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                limit=STREAM_BUFFER_SIZE)
+        except BaseException:
+            self._active_streams -= 1
+            raise
+
+        stderr_task = asyncio.ensure_future(read_tail(process.stderr))
+        try:
+            first_chunk = await asyncio.wait_for(process.stdout.read(STREAM_CHUNK_SIZE),
+                                                 STREAM_START_TIMEOUT)
+        except asyncio.TimeoutError:
+            first_chunk = b''
+
+        if not first_chunk:
+            if process.returncode is None:
+                process.kill()
+            await process.wait()
+            stderr = (await stderr_task).decode('utf-8', 'replace').strip()
+            self._active_streams -= 1
+            raise HTTPError(502, f"Error durante la descarga: {stderr or 'sin datos del origen'}")
+
+        # Copia al almacén mientras se envía: la siguiente petición sale de disco
+        sink = self.store.writer(job.store_key, filename) if job.store_key else None
+        return PipeResponse(process, first_chunk, filename, stderr_task,
+                            on_done=functools.partial(self._stream_done, job), sink=sink)
+
+    def _remote_file(self, request, job):
+        """Archivo de un trabajo de otra réplica: se redirige a ella, que lleva la cuenta de
+        sus envíos (no borra el archivo durante un envío ni antes de una reanudación)"""
+        if job.status == 'completed' and job.node_url and job.node_url != self.node_url:
+            return Response(307, headers={'Location': f"{job.node_url}/file/{job.id}"})
+        if job.status == 'completed' and job.filepath and job.filepath.exists():
+            # La réplica no anuncia su URL: solo queda el volumen compartido
+            return FileResponse(job.filepath, job.filename or job.filepath.name).prepare(request)
+        raise HTTPError(409, "La descarga todavía no está lista")
+
+    def _stream_done(self, job, sink):
+        """Fin de un envío directo; si se completó, el resultado pasa al almacén"""
+        self._active_streams -= 1
+        if sink is not None:
+            asyncio.ensure_future(self._store_stream(job, sink))
+
+    async def _store_stream(self, job, sink):
+        """Incorpora al almacén la copia de un envío directo completo"""
+        loop = asyncio.get_running_loop()
+        try:
+            filepath, filename = await loop.run_in_executor(None, sink.commit)
+        except OSError:
+            return
+        if job.stream and job.id in self.jobs:
+            # Las siguientes peticiones del trabajo se sirven desde disco (con Range)
+            job.stream = False
+            job.store_ref = True
+            job.filepath, job.filename = filepath, filename
+            job.save(stream=False, store_ref=True, filepath=filepath, filename=filename)
+        else:
+            await loop.run_in_executor(None, self.store.release, sink.key)
+
+    async def _store_acquire(self, key):
+        """store.acquire fuera del bucle de eventos"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.store.acquire, key)
+
+    def _transfer_done(self, job, sent, complete):
+        """Tras una entrega completa, el archivo se borra pasado un margen para reanudar"""
+        job.active_transfers -= 1
+        if complete and not job.delivered:
+            job.delivered = True
+            asyncio.get_running_loop().call_later(DELIVERED_GRACE, self._release_job, job.id)
+        elif job.cleanup_requested and job.active_transfers == 0:
+            self._release_job(job.id)
+
+    def _release_job(self, job_id):
+        """Elimina el trabajo y sus archivos si no hay transferencias en curso"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job.active_transfers:
+            job.cleanup_requested = True
+            return
+        self.jobs.pop(job_id, None)
+        job.save('released')
+        self._release_lease(job)
+        if job.store_ref:
+            job.store_ref = False
+            asyncio.get_running_loop().run_in_executor(None, self.store.release, job.store_key)
+        self._remove_job_files(job)
+
+    async def handle_cleanup(self, request, job_id):
+        job = await self._find_job(job_id)
+        if job.remote:
+            # Su réplica lo libera al ver que ya no está en el almacén (prune_jobs)
+            job.save('released')
+        else:
+            self._release_job(job_id)
+        return json_response({'message': 'Archivos eliminados', 'download_id': job_id})
+
+    async def handle_health(self, request):
+        store_stats = await asyncio.get_running_loop().run_in_executor(None, self.store.stats)
+        return json_response({
+            'status': 'ok',
+            'jobs': len(self.jobs),
+            'in_flight': self._in_flight,
+            'workers': self.max_workers,
+            'connections': self._connections,
+            'streams': self._active_streams,
+            'store': store_stats,
+            'coalesced': self.flights.stats(),
+            'scheduler': self.scheduler.stats(),
+            'rate_control': self.downloader.rate_control.stats(),
+            'ffmpeg': self.downloader.ffmpeg_pool.stats(),
+            'sweeper': self.sweeper.stats(),
+            'job_store': dict(self.job_store.stats(), node=self.node_id, leases=sum(
+                1 for job in self.jobs.values() if job.leased)) if self.job_store else None,
+        })
+
+    async def handle_metrics(self, request):
+        # Algunas métricas consultan el almacén de resultados: se calculan en un hilo
+        text = await asyncio.get_running_loop().run_in_executor(None, render_metrics)
+        return Response(200, text.encode('utf-8'), content_type=METRICS_CONTENT_TYPE)
+
+    def _scratch_bytes(self):
+        """Bytes en las carpetas de los trabajos (descargas en curso o sin entregar)"""
+        total = 0
+        for job_id in list(self.jobs):
+            for dirpath, _, filenames in os.walk(self.download_root / job_id):
+                for name in filenames:
+                    try:
+                        total += os.path.getsize(os.path.join(dirpath, name))
+                    except OSError:
+                        pass
+        return total
+
+    def _remove_job_files(self, job):
+        shutil.rmtree(self.download_root / job.id, ignore_errors=True)
+
+    def _owner_info(self, job_id):
+        """Para la limpieza (desde su hilo): (en curso, último acceso) del trabajo o None"""
+        job = self.jobs.get(job_id)
+        if job is None and self.job_store is not None:
+            # Con un volumen compartido la carpeta puede ser de otra réplica
+            try:
+                state = self.job_store.submit(self.job_store.get, job_id).result()
+            except Exception:
+                return True, 0      # sin almacén no se sabe: mejor no borrar
+            if state is not None:
+                return (state.get('status') in RESUMABLE_STATUSES or
+                        state.get('lease_owner') is not None), state.get('updated_at') or 0
+        if job is None:
+            return None     # carpeta huérfana (p. ej. de antes de reiniciar)
+        active = job.status in RESUMABLE_STATUSES or job.active_transfers > 0
+        return active, job.updated_at
+
+    async def sweep_scratch(self, interval=60):
+        """Limpia periódicamente las carpetas de los trabajos"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                report = await loop.run_in_executor(None, self.sweeper.sweep)
+            except Exception as e:
+                print(f"⚠️  Error en la limpieza: {e}")
+                continue
+            # Los trabajos cuyo archivo se ha borrado ya no pueden servirse
+            for job_id in report['owners']:
+                job = self.jobs.get(job_id)
+                if job is not None and job.status == 'completed' and not job.stream and \
+                        not job.active_transfers and \
+                        (job.filepath is None or not job.filepath.exists()):
+                    self._release_job(job_id)
+
+    async def prune_jobs(self, interval=60):
+        """Elimina periódicamente los trabajos antiguos y sus archivos"""
+        while True:
+            await asyncio.sleep(interval)
+            limit = time.time() - JOB_TTL
+            for job in list(self.jobs.values()):
+                if job.updated_at < limit and job.status not in ('queued', 'downloading', 'processing'):
+                    self._release_job(job.id)
+
+            # Trabajos liberados con /cleanup desde otra réplica
+            finished = [job_id for job_id, job in self.jobs.items()
+                        if job.status in TERMINAL_STATUSES]
+            if self.job_store is None or not finished:
+                continue
+            try:
+                existing = await self._store_call(self.job_store.existing, finished)
+            except HTTPError:
+                continue
+            for job_id in finished:
+                if job_id not in existing:
+                    self._release_job(job_id)
+
+    async def keep_leases(self):
+        """Latido: renueva los arriendos de los trabajos en curso y publica su estado"""
+        while True:
+            await asyncio.sleep(LEASE_TTL / 3)
+            leased = [job for job in self.jobs.values() if job.leased]
+            if not leased:
+                continue
+            try:
+                lost = await self._store_call(self.job_store.renew, [job.id for job in leased],
+                                              self.node_id, LEASE_TTL)
+            except HTTPError as e:
+                print(f"⚠️  No se pudieron renovar los arriendos: {e.detail}")
+                continue
+            for job in leased:
+                if job.id in lost:
+                    job.leased = False
+                    print(f"⚠️  El trabajo {job.id} ha pasado a otra réplica")
+                else:
+                    job.publish(force=True)
+
+    async def claim_orphans(self):
+        """Retoma los trabajos a medias de las réplicas caídas (arriendo caducado)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                orphans = await self._store_call(self.job_store.orphans)
+            except HTTPError:
+                orphans = []
+            for job_id in orphans:
+                if job_id in self.jobs or not await self._store_call(
+                        self.job_store.acquire, job_id, self.node_id, LEASE_TTL):
+                    continue
+                state = await self._store_call(self.job_store.get, job_id)
+                if state is None or 'url' not in state:
+                    self.job_store.submit(self.job_store.release, job_id, self.node_id)
+                    continue
+                job = Job.from_state(state, loop=loop, journal=self.journal,
+                                     store=self.job_store)
+                job.leased = True
+                job.save(node=self.node_id, node_url=self.node_url)
+                self.jobs[job.id] = job
+                self._resume(job)
+                print(f"📒 Trabajo {job.id} retomado de otra réplica")
+            await asyncio.sleep(LEASE_TTL)
+
+    # -- HTTP ------------------------------------------------------------------
+
+    def _cors_headers(self, request):
+        origin = request.headers.get('origin') if request else None
+        if not origin:
+            return {}
+        if '*' not in self.allowed_origins and origin not in self.allowed_origins:
+            return {}
+        return {
+            'Access-Control-Allow-Origin': origin if '*' not in self.allowed_origins else '*',
+            'Access-Control-Allow-Methods': 'GET, POST, DELETE, OPTIONS',
+            'Access-Control-Allow-Headers': ('Content-Type, Range, If-Range, If-None-Match, '
+                                             'X-Profile, X-Priority'),
+            'Access-Control-Expose-Headers': ('Content-Disposition, Content-Length, Content-Range, '
+                                              'Accept-Ranges, ETag, Retry-After'),
+            'Vary': 'Origin',
+        }
+
+    async def dispatch(self, request):
+        """Busca la ruta y ejecuta su manejador"""
+        if request.method == 'OPTIONS':
+            return Response(204)
+
+        method = 'GET' if request.method == 'HEAD' else request.method
+        path_matched = False
+        for route_method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            path_matched = True
+            if route_method == method:
+                return await handler(request, **match.groupdict())
+
+        if path_matched:
+            raise HTTPError(405, "Método no permitido")
+        raise HTTPError(404, "Ruta no encontrada")
+
+    async def read_request(self, reader, client):
+        """Lee una petición del socket (None si el cliente cerró la conexión)"""
+        try:
+            raw = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Cabeceras demasiado grandes")
+
+        lines = raw.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "Petición mal formada")
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        request = Request(method.upper(), target, version, headers, client)
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HTTPError(400, "Content-Length no válido")
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "Cuerpo de la petición demasiado grande")
+        if length:
+            request.body = await reader.readexactly(length)
+        return request
+
+    async def handle_connection(self, reader, writer):
+        """Atiende una conexión (con keep-alive) hasta que se cierra"""
+        peer = writer.get_extra_info('peername')
+        client = peer[0] if peer else 'unknown'
+        self._connections += 1
+
+        try:
+            if self._connections > self.max_connections:
+                response = json_response({'detail': "Demasiadas conexiones"}, 503,
+                                         {'Retry-After': '1'})
+                await response.send(writer, None, keep_alive=False)
+                return
+
+            while True:
+                request = None
+                try:
+                    request = await self.read_request(reader, client)
+                    if request is None:
+                        break
+                    response = await self.dispatch(request)
+                except HTTPError as e:
+                    response = json_response({'detail': e.detail}, e.status, e.headers)
+                except Exception as e:
+                    response = json_response({'detail': f"Error interno: {e}"}, 500)
+
+                keep_alive = request is not None and request.keep_alive and response.keep_alive
+                response.headers.update(self._cors_headers(request))
+                await response.send(writer, request, keep_alive)
+                if not keep_alive:
+                    break
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    def recover(self):
+        """Reconstruye los trabajos del diario y reanuda las descargas interrumpidas"""
+        loop = asyncio.get_running_loop()
+        resumed = 0
+        for state in self.journal.replay():
+            job = Job.from_state(state, loop=loop, journal=self.journal)
+            if job.status == 'completed' and not job.stream:
+                # El archivo sigue en el almacén (o en la carpeta del trabajo)
+                hit = self.store.acquire(job.store_key) if state.get('store_ref') else None
+                filepath = Path(state['filepath']) if state.get('filepath') else None
+                if hit:
+                    job.store_ref = True
+                    job.filepath, job.filename = hit
+                elif filepath and not state.get('store_ref') and filepath.exists():
+                    job.filepath, job.filename = filepath, state.get('filename')
+                else:
+                    job.status, job.error = 'error', "El archivo ya no está disponible"
+            if job.status in TERMINAL_STATUSES:
+                job.tracker.set_phase('done' if job.status == 'completed' else 'error')
+            self.jobs[job.id] = job
+
+            if job.status in RESUMABLE_STATUSES:
+                self._resume(job)
+                resumed += 1
+
+        count = self.journal.compact()
+        if count:
+            print(f"📒 {count} trabajos recuperados del diario, {resumed} descargas reanudadas")
+
+    def _resume(self, job):
+        """Vuelve a lanzar un trabajo interrumpido en su misma carpeta de salida"""
+        # yt-dlp continúa desde los archivos .part
+        leader = self._leaders.get(job.store_key) if job.store_key else None
+        if leader is not None:
+            job.follow(leader)
+        elif job.store_key:
+            self._leaders[job.store_key] = job
+        job.set_status('queued')
+        asyncio.ensure_future(self._run_job(job))
+
+    async def serve(self, host='0.0.0.0', port=8000):
+        """Arranca el servidor y atiende peticiones indefinidamente"""
+        if self.job_store is None:
+            self.recover()
+        server = await asyncio.start_server(self.handle_connection, host, port,
+                                            limit=MAX_HEADER_SIZE, backlog=1024)
+        asyncio.ensure_future(self.prune_jobs())
+        asyncio.ensure_future(self.sweep_scratch())
+        if self.job_store is not None:
+            if self.node_url is None:
+                print("⚠️  Sin --node-url, /file de los trabajos de esta réplica se sirve desde el "
+                      "volumen compartido y su limpieza no ve esos envíos")
+            # Los trabajos de las réplicas caídas se retoman en lugar de recuperar un diario
+            asyncio.ensure_future(self.keep_leases())
+            asyncio.ensure_future(self.claim_orphans())
+        print(f"🚀 Servidor escuchando en http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+def parse_args(argv=None):
+    """Interpreta los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Servidor HTTP del YouTube Downloader")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WORKERS', 8)),
+                        help="llamadas simultáneas a yt-dlp (por defecto: 8)")
+    parser.add_argument('--max-queue', type=int, default=int(os.environ.get('MAX_QUEUE', 64)),
+                        help="tareas en espera antes de responder 503 (por defecto: 64)")
+    parser.add_argument('--max-per-client', type=int,
+                        default=int(os.environ.get('MAX_PER_CLIENT', 4)),
+                        help="tareas en ejecución a la vez por IP; el resto espera turno (por defecto: 4)")
+    parser.add_argument('--max-queued-per-client', type=int,
+                        default=int(os.environ.get('MAX_QUEUED_PER_CLIENT', 16)),
+                        help="tareas en espera por IP antes de responder 429 (por defecto: 16)")
+    parser.add_argument('--reserved-interactive', type=int,
+                        default=int(os.environ.get('RESERVED_INTERACTIVE', 1)),
+                        help="hilos que las tareas por lotes no pueden ocupar (por defecto: 1)")
+    parser.add_argument('--client-bandwidth', type=float,
+                        default=float(os.environ.get('CLIENT_BANDWIDTH_MBPS', 0)),
+                        help="MB/s por IP en las descargas a disco (por defecto: 0, sin límite)")
+    parser.add_argument('--scratch-ttl', type=float,
+                        default=float(os.environ.get('SCRATCH_TTL_HOURS', JOB_TTL / 3600)),
+                        help="horas que se conservan los archivos de un trabajo sin actividad "
+                             f"(por defecto: {JOB_TTL // 3600})")
+    parser.add_argument('--disk-high-water', type=float,
+                        default=float(os.environ.get('DISK_HIGH_WATER', DEFAULT_HIGH_WATER)),
+                        help="fracción del disco a partir de la cual se liberan archivos sin "
+                             f"esperar a que caduquen (por defecto: {DEFAULT_HIGH_WATER})")
+    parser.add_argument('--no-stream', action='store_true',
+                        help="descargar siempre a disco en lugar de reenviar los formatos combinados")
+    parser.add_argument('--store-budget', type=float,
+                        default=float(os.environ.get('STORE_BUDGET_GB', 10)),
+                        help="espacio máximo en GB del almacén de resultados (por defecto: 10)")
+    parser.add_argument('--connections-per-job', type=int,
+                        default=int(os.environ.get('CONNECTIONS_PER_JOB', 1)),
+                        help="conexiones por descarga; con más de 1 se descarga por rangos (por defecto: 1)")
+    parser.add_argument('--max-download-connections', type=int,
+                        default=int(os.environ.get('MAX_DOWNLOAD_CONNECTIONS', 16)),
+                        help="conexiones de descarga entre todos los trabajos (por defecto: 16)")
+    parser.add_argument('--extract-rate', type=float,
+                        default=float(os.environ.get('EXTRACT_RATE', 0)),
+                        help="extracciones por segundo hacia YouTube (por defecto: 0, sin límite "
+                             "hasta el primer 429)")
+    parser.add_argument('--ffmpeg-workers', type=int,
+                        default=int(os.environ.get('FFMPEG_WORKERS', 0)),
+                        help="procesos de FFmpeg simultáneos (por defecto: 0, uno por núcleo)")
+    parser.add_argument('--job-store', default=os.environ.get('JOB_STORE'),
+                        help="almacén de trabajos compartido entre réplicas: "
+                             "sqlite:////volumen/jobs.sqlite3 o redis://host:6379/0")
+    parser.add_argument('--node-url', default=os.environ.get('NODE_URL'),
+                        help="URL de esta réplica a la que las demás redirigen /file si el "
+                             "archivo no está en un volumen compartido")
+    parser.add_argument('--lock-dir', default=os.environ.get('LOCK_DIR'),
+                        help="carpeta de bloqueos compartida para agrupar descargas entre procesos")
+    parser.add_argument('--profile-rate', type=float,
+                        default=float(os.environ.get('PROFILE_RATE', 0)),
+                        help="fracción de trabajos que se perfilan (por defecto: 0, solo con X-Profile)")
+    parser.add_argument('--profile-mode', choices=PROFILE_MODES,
+                        default=os.environ.get('PROFILE_MODE', 'sample'),
+                        help="'sample' (pilas colapsadas) o 'deterministic' (cProfile/pstats)")
+    parser.add_argument('--profile-dir', default=os.environ.get('PROFILE_DIR', 'profiles'),
+                        help="carpeta de los perfiles (por defecto: profiles)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """Punto de entrada del servidor"""
+    args = parse_args(argv)
+    origins = [o.strip() for o in os.environ.get('ALLOWED_ORIGINS', '*').split(',') if o.strip()]
+    server = DownloadServer(max_workers=args.workers, max_queue=args.max_queue,
+                            max_per_client=args.max_per_client,
+                            max_queued_per_client=args.max_queued_per_client,
+                            reserved_interactive=args.reserved_interactive,
+                            client_bandwidth=int(args.client_bandwidth * 1024 ** 2),
+                            extract_rate=args.extract_rate or None,
+                            ffmpeg_workers=args.ffmpeg_workers or None,
+                            scratch_ttl=args.scratch_ttl * 3600,
+                            disk_high_water=args.disk_high_water,
+                            allowed_origins=origins,
+                            stream_combined=not args.no_stream,
+                            store_budget=int(args.store_budget * 1024 ** 3),
+                            lock_dir=args.lock_dir,
+                            job_store=open_job_store(args.job_store) if args.job_store else None,
+                            node_url=args.node_url,
+                            connections_per_job=args.connections_per_job,
+                            max_download_connections=args.max_download_connections,
+                            profiler=Profiler(args.profile_dir, sample_rate=args.profile_rate,
+                                              mode=args.profile_mode))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n👋 Servidor detenido")
+
+
+if __name__ == "__main__":
+    main()
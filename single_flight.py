@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Agrupación de llamadas simultáneas (single-flight)
+Las peticiones idénticas que llegan mientras otra está en curso esperan su
+resultado en lugar de repetir la extracción o la descarga. Opcionalmente se
+coordina con otros procesos mediante bloqueos de archivo
+"""
+
+import functools
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo agrupación dentro del proceso
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_dir, key):
+    """Bloqueo exclusivo entre procesos para una clave (no hace nada sin lock_dir)"""
+    if lock_dir is None or fcntl is None:
+        yield
+        return
+
+    lock_dir = Path(lock_dir)
+    lock_dir.mkdir(parents=True, exist_ok=True)
+    name = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    with open(lock_dir / f"{name}.lock", 'a') as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class _Call:
+    """Llamada en curso compartida por varios hilos"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Agrupa llamadas bloqueantes con la misma clave hechas desde varios hilos"""
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'leaders': 0, 'followers': 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Ejecuta fn una sola vez por clave en curso y reparte su resultado"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats['leaders'] += 1
+            else:
+                self._stats['followers'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            with file_lock(self.lock_dir, key):
+                call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        """Devuelve cuántas llamadas se ejecutaron y cuántas se agruparon"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+
+class AsyncSingleFlight:
+    """Agrupa corrutinas con la misma clave dentro del bucle de eventos"""
+
+    def __init__(self):
+        self._tasks = {}
+        self._stats = {'leaders': 0, 'followers': 0}
+
+    async def run(self, key, factory):
+        """Espera la tarea en curso de la clave o lanza factory() si no la hay"""
+        import asyncio  # solo lo usa el servidor; la CLI no paga su importación
+
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(factory())
+            task.add_done_callback(functools.partial(self._task_done, key))
+            self._stats['leaders'] += 1
+        else:
+            self._stats['followers'] += 1
+        # Si quien espera se cancela, la tarea compartida sigue para los demás
+        return await asyncio.shield(task)
+
+    def _task_done(self, key, task):
+        """Retira la tarea terminada y recoge su excepción"""
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+        if not task.cancelled():
+            task.exception()  # evita el aviso de excepción no recuperada
+
+    def stats(self):
+        """Devuelve cuántas tareas se lanzaron y cuántas se agruparon"""
+        stats = dict(self._stats)
+        stats['in_flight'] = len(self._tasks)
+        return stats
+
@@ -0,0 +1,57 @@
+"""Pruebas del modo por lotes"""
+
+import threading
+
+from batch_downloader import BatchRunner
+
+
+class InvalidUrlDownloader:
+    """Downloader que rechaza todas las URLs"""
+
+    def validate_youtube_url(self, url):
+        return False
+
+
+class NoFormatPolicy:
+    """Política que no acepta ningún formato"""
+
+    container = 'mp4'
+
+    def select(self, formats):
+        return None
+
+
+class NoFormatDownloader(InvalidUrlDownloader):
+    def validate_youtube_url(self, url):
+        return True
+
+    def get_video_info(self, url):
+        return {'title': url, 'formats': []}
+
+
+def run_batch(downloader, urls, workers=1):
+    results = []
+    runner = BatchRunner(downloader, NoFormatPolicy(), workers=workers, on_result=results.append)
+    summary = {}
+    thread = threading.Thread(target=lambda: summary.update(runner.run(urls)), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+    assert not thread.is_alive(), "El lote no terminó: quedaron huecos sin liberar"
+    return summary, results
+
+
+def test_invalid_urls_are_skipped_without_hanging():
+    urls = [f"https://example.com/{n}" for n in range(4)]
+    summary, results = run_batch(InvalidUrlDownloader(), urls)
+
+    assert summary == {'ok': 0, 'error': 0, 'skipped': 4}
+    assert sorted(r['index'] for r in results) == [0, 1, 2, 3]
+    assert all(r['status'] == 'skipped' for r in results)
+
+
+def test_no_matching_format_is_skipped():
+    urls = [f"https://www.youtube.com/watch?v=abcdefghij{n}" for n in range(3)]
+    summary, results = run_batch(NoFormatDownloader(), urls, workers=2)
+
+    assert summary['skipped'] == 3
+    assert all('elapsed' in r for r in results)
@@ -0,0 +1,59 @@
+"""Reanudación de descargas segmentadas contra el servidor de medios sintéticos"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS))
+
+from fake_media import FakeMediaServer, payload  # noqa: E402
+from segmented_downloader import (MANIFEST_SUFFIX, MIN_SEGMENTED_SIZE,  # noqa: E402
+                                  ConnectionLimiter, SegmentedYDL)
+
+SIZE = MIN_SEGMENTED_SIZE + 123_457
+SEGMENT_SIZE = 1024 * 1024
+DONE = [0, 1, 2, 5]
+
+
+def expected_digest():
+    digest = hashlib.sha256()
+    for chunk in payload(0, SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def leave_segmented_part(target):
+    """Deja el .part y el manifiesto de una descarga segmentada interrumpida"""
+    part = Path(f"{target}.part")
+    with open(part, 'wb') as f:
+        f.truncate(SIZE)        # los segmentos pendientes quedan a cero
+        for index in DONE:
+            f.seek(index * SEGMENT_SIZE)
+            for chunk in payload(index * SEGMENT_SIZE, (index + 1) * SEGMENT_SIZE):
+                f.write(chunk)
+    Path(f"{part}{MANIFEST_SUFFIX}").write_text(
+        json.dumps({'size': SIZE, 'segment_size': SEGMENT_SIZE, 'done': DONE}))
+
+
+@pytest.mark.parametrize('connections, limit', [(1, 16), (4, 1)],
+                         ids=['una-conexion', 'limite-global-1'])
+def test_resume_with_one_connection(tmp_path, connections, limit):
+    target = tmp_path / "video.mp4"
+    leave_segmented_part(target)
+    options = {
+        'quiet': True, 'no_warnings': True, 'retries': 0,
+        'outtmpl': str(tmp_path / "video.%(ext)s"),
+        'segmented_connections': connections,
+        'segment_size': SEGMENT_SIZE,
+        'connection_limiter': ConnectionLimiter(limit),
+    }
+
+    with FakeMediaServer() as media, SegmentedYDL(options) as ydl:
+        ydl.extract_info(f"{media.origin}/progressive/{SIZE}/video.mp4")
+
+    assert hashlib.sha256(target.read_bytes()).hexdigest() == expected_digest()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["video.mp4"]
@@ -0,0 +1,52 @@
+"""Descarga de video y audio por separado contra el servidor de medios sintéticos"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCHMARKS = Path(__file__).resolve().parent.parent / "benchmarks"
+sys.path.insert(0, str(BENCHMARKS))
+
+from fake_media import FakeMediaServer  # noqa: E402
+from ffmpeg_pool import FFmpegPool  # noqa: E402
+from replay import ReplaySource, load_recordings, replay_downloader, video_url  # noqa: E402
+
+# FFmpeg de prueba: escribe sus argumentos en el archivo de salida
+FAKE_FFMPEG = f"""#!{sys.executable}
+import json, sys
+with open(sys.argv[-1], 'w') as output:
+    json.dump(sys.argv[1:], output)
+"""
+
+
+@pytest.fixture
+def downloader(tmp_path, monkeypatch):
+    recordings = load_recordings()
+    if not recordings:
+        pytest.skip("No hay grabaciones en benchmarks/data")
+    monkeypatch.chdir(tmp_path)  # caché y diario en el directorio temporal
+
+    ffmpeg = tmp_path / "ffmpeg"
+    ffmpeg.write_text(FAKE_FFMPEG)
+    ffmpeg.chmod(0o755)
+
+    with FakeMediaServer() as media:
+        source = ReplaySource(recordings, media.origin, media_size=64 * 1024)
+        downloader = replay_downloader(source, pool_size=1)
+        downloader.ffmpeg_pool = FFmpegPool(workers=1, niceness=0, ffmpeg=str(ffmpeg))
+        yield downloader
+
+
+@pytest.mark.parametrize('format_id', ['137+140', '140+137'])
+def test_tracks_are_picked_by_codec(downloader, tmp_path, format_id):
+    filepath = downloader.download_video(video_url(1), format_id, 'Split', quiet=True,
+                                         output_dir=tmp_path)
+
+    args = json.loads(Path(filepath).read_text())
+    inputs = [args[i + 1] for i, arg in enumerate(args) if arg == '-i']
+    assert [Path(name).name for name in inputs] == ['Split.f137.mp4', 'Split.f140.m4a']
+    # Las pistas se borran después de unirlas
+    assert not any(os.path.exists(name) for name in inputs)
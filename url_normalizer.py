@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Normalización y deduplicación de URLs de YouTube
+Reduce cualquier forma de URL de video (watch, shorts, embed, live, youtu.be,
+music, con parámetros de seguimiento) a su ID canónico con una sola expresión
+precompilada, y filtra flujos de millones de líneas descartando los videos
+repetidos con un conjunto compacto de IDs de 64 bits
+"""
+
+import binascii
+import re
+from array import array
+from collections import OrderedDict
+
+URL_REGEX = re.compile(r'''
+    (?:https?://)?(?:(?:www|m|music)\.)?
+    (?:
+        youtu\.be/
+      | youtube(?:-nocookie)?\.com/
+        (?:
+            (?:shorts|embed|live|v|e)/
+          | (?:watch|attribution_link)?/?\?(?:[^#&\s]*&)*?(?:v=|u=(?:/|%2F)watch%3Fv%3D)
+        )
+    )
+    (?P<id>[A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])
+''', re.VERBOSE)
+
+CANONICAL_URL = "https://www.youtube.com/watch?v={}"
+
+# URLs que no son de videos (listas, canales, líneas no válidas) que se recuerdan
+MAX_OTHERS = 100_000
+
+# El último carácter de un ID real solo lleva 4 bits: 10 × 6 + 4 = 64 bits exactos
+_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+_PACKABLE_LAST = frozenset(_ALPHABET[::4])
+
+_GOLDEN = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+
+
+def video_id(url):
+    """ID de 11 caracteres de una URL de video de YouTube (o None)"""
+    match = URL_REGEX.match(url.strip())
+    return match.group('id') if match else None
+
+
+def canonical_url(video_id):
+    """URL canónica de un ID de video"""
+    return CANONICAL_URL.format(video_id)
+
+
+def normalize(url):
+    """URL canónica del video de la URL (o None si no es de un video)"""
+    found = video_id(url)
+    return canonical_url(found) if found else None
+
+
+def pack_id(video_id):
+    """Empaqueta un ID en un entero de 64 bits sin pérdida (o None si no se puede)"""
+    if video_id[10] not in _PACKABLE_LAST:
+        return None
+    return int.from_bytes(binascii.a2b_base64(
+        video_id.replace('-', '+').replace('_', '/') + '='), 'big')
+
+
+class VideoIdSet:
+    """Conjunto de IDs de video en una tabla abierta array('Q') (~16 bytes por ID)"""
+
+    def __init__(self, capacity=1024):
+        bits = max(4, (capacity * 2 - 1).bit_length())
+        self._table = array('Q', [0]) * (1 << bits)
+        self._shift = 64 - bits
+        self._mask = (1 << bits) - 1
+        self._count = 0
+        self._has_zero = False  # el 0 marca las celdas vacías
+        self._other = set()     # IDs no empaquetables (no son de YouTube)
+
+    def __len__(self):
+        return self._count + self._has_zero + len(self._other)
+
+    def __contains__(self, video_id):
+        key = pack_id(video_id)
+        if key is None:
+            return video_id in self._other
+        if key == 0:
+            return self._has_zero
+        table, mask = self._table, self._mask
+        slot = ((key * _GOLDEN) & _MASK64) >> self._shift
+        while table[slot]:
+            if table[slot] == key:
+                return True
+            slot = (slot + 1) & mask
+        return False
+
+    def add(self, video_id):
+        """Añade el ID; devuelve False si ya estaba"""
+        key = pack_id(video_id)
+        if key is None:
+            if video_id in self._other:
+                return False
+            self._other.add(video_id)
+            return True
+        if key == 0:
+            if self._has_zero:
+                return False
+            self._has_zero = True
+            return True
+        if not self._insert(self._table, self._mask, self._shift, key):
+            return False
+        self._count += 1
+        if self._count * 2 > len(self._table):
+            self._grow()
+        return True
+
+    @staticmethod
+    def _insert(table, mask, shift, key):
+        """Sondeo lineal desde la posición del hash multiplicativo"""
+        slot = ((key * _GOLDEN) & _MASK64) >> shift
+        current = table[slot]
+        while current:
+            if current == key:
+                return False
+            slot = (slot + 1) & mask
+            current = table[slot]
+        table[slot] = key
+        return True
+
+    def _grow(self):
+        """Duplica la tabla al pasar de la mitad de ocupación"""
+        old = self._table
+        bits = 64 - self._shift + 1
+        self._table = array('Q', [0]) * (1 << bits)
+        self._shift = 64 - bits
+        self._mask = (1 << bits) - 1
+        table, mask, shift = self._table, self._mask, self._shift
+        for key in old:
+            if key:
+                self._insert(table, mask, shift, key)
+
+    def memory_bytes(self):
+        """Memoria aproximada de la tabla"""
+        return self._table.itemsize * len(self._table)
+
+
+class UrlDeduplicator:
+    """Filtra un flujo de URLs: normaliza los videos y descarta los repetidos"""
+
+    def __init__(self, capacity=1024, max_others=MAX_OTHERS):
+        self.seen = VideoIdSet(capacity)
+        # Listas, canales y líneas no reconocidas, por texto; solo se recuerdan las
+        # max_others más recientes para que una entrada sin IDs no agote la memoria
+        self._others = OrderedDict()
+        self.max_others = max_others
+        self.stats = {'videos': 0, 'duplicates': 0, 'others': 0}
+
+    def admit(self, url):
+        """Devuelve la URL canónica la primera vez que aparece el video, o None si se repite"""
+        found = video_id(url)
+        if found is not None:
+            if self.seen.add(found):
+                self.stats['videos'] += 1
+                return CANONICAL_URL.format(found)
+            self.stats['duplicates'] += 1
+            return None
+
+        # Listas, canales o URLs no válidas: pasan tal cual (una vez)
+        url = url.strip()
+        others = self._others
+        if url in others:
+            others.move_to_end(url)
+            self.stats['duplicates'] += 1
+            return None
+        others[url] = None
+        if len(others) > self.max_others:
+            others.popitem(last=False)
+        self.stats['others'] += 1
+        return url
+
+    def filter(self, urls):
+        """Genera cada video una sola vez (como URL canónica) en el orden de llegada"""
+        admit = self.admit
+        for url in urls:
+            url = admit(url)
+            if url is not None:
+                yield url
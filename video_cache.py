@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Caché de información de videos
+Guarda el resultado reducido de get_video_info por ID de video, en memoria (LRU)
+y en disco (SQLite en modo WAL), con expiración por TTL y límite de tamaño
+"""
+
+import copy
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from url_normalizer import video_id
+
+# Las URLs de formatos de YouTube caducan a las ~6 horas; usamos un margen
+DEFAULT_TTL = 5 * 60 * 60
+# Margen de seguridad respecto al parámetro 'expire' de las URLs de formatos
+EXPIRE_MARGIN = 10 * 60
+
+
+def extract_video_id(url):
+    """Extrae el ID de 11 caracteres de una URL de YouTube (o None)"""
+    return video_id(url)
+
+
+def ttl_from_info(info, default=DEFAULT_TTL):
+    """Calcula el TTL a partir del parámetro 'expire' de las URLs de formatos"""
+    expires = []
+    for fmt in info.get('formats') or []:
+        url = fmt.get('url')
+        if not url or 'expire=' not in url:
+            continue
+        try:
+            expires.append(int(parse_qs(urlparse(url).query)['expire'][0]))
+        except (KeyError, ValueError, IndexError):
+            continue
+
+    if not expires:
+        return default
+
+    ttl = min(expires) - time.time() - EXPIRE_MARGIN
+    return max(0, min(ttl, default))
+
+
+class VideoInfoCache:
+    """Caché de dos niveles (memoria LRU + SQLite) para la información de videos"""
+
+    def __init__(self, db_path=Path("cache") / "video_info.sqlite3",
+                 ttl=DEFAULT_TTL, memory_size=256, max_entries=10000):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+
+        self._memory = OrderedDict()  # video_id -> (expires_at, info)
+        self._lock = threading.Lock()
+        self._stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+        }
+
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS video_info ("
+            " video_id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_video_info_access ON video_info(last_access)"
+        )
+        self._db.commit()
+
+    def get(self, video_id):
+        """Devuelve la información guardada o None si no existe o ha caducado"""
+        if not video_id:
+            return None
+
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(video_id)
+            if entry is not None:
+                expires_at, info = entry
+                if expires_at > now:
+                    self._memory.move_to_end(video_id)
+                    self._stats['memory_hits'] += 1
+                    return copy.deepcopy(info)
+                del self._memory[video_id]
+
+            row = self._db.execute(
+                "SELECT data, expires_at FROM video_info WHERE video_id = ?",
+                (video_id,)
+            ).fetchone()
+
+            if row is None:
+                self._stats['misses'] += 1
+                return None
+
+            data, expires_at = row
+            if expires_at <= now:
+                self._db.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+                self._db.commit()
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+
+            self._db.execute(
+                "UPDATE video_info SET last_access = ? WHERE video_id = ?",
+                (now, video_id)
+            )
+            self._db.commit()
+
+            info = json.loads(data)
+            self._remember(video_id, expires_at, info)
+            self._stats['disk_hits'] += 1
+            return copy.deepcopy(info)
+
+    def set(self, video_id, info, ttl=None):
+        """Guarda la información de un video en ambos niveles"""
+        if not video_id:
+            return
+
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+
+        expires_at = now + ttl
+        data = json.dumps(info, ensure_ascii=False)
+
+        with self._lock:
+            self._remember(video_id, expires_at, copy.deepcopy(info))
+            self._db.execute(
+                "INSERT OR REPLACE INTO video_info (video_id, data, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?)",
+                (video_id, data, expires_at, now)
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def invalidate(self, video_id):
+        """Elimina un video de la caché"""
+        with self._lock:
+            self._memory.pop(video_id, None)
+            self._db.execute("DELETE FROM video_info WHERE video_id = ?", (video_id,))
+            self._db.commit()
+
+    def stats(self):
+        """Devuelve los contadores de aciertos y fallos"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['disk_entries'] = self._db.execute(
+                "SELECT COUNT(*) FROM video_info"
+            ).fetchone()[0]
+
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (
+            (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        )
+        return stats
+
+    def close(self):
+        """Cierra la conexión con la base de datos"""
+        with self._lock:
+            self._db.close()
+
+    def _remember(self, video_id, expires_at, info):
+        """Inserta en el nivel de memoria respetando el tamaño máximo"""
+        self._memory[video_id] = (expires_at, info)
+        self._memory.move_to_end(video_id)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        """Elimina entradas caducadas y las menos usadas si se supera el límite"""
+        cursor = self._db.execute("DELETE FROM video_info WHERE expires_at <= ?", (now,))
+        self._stats['expired'] += cursor.rowcount
+
+        count = self._db.execute("SELECT COUNT(*) FROM video_info").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM video_info WHERE video_id IN ("
+                " SELECT video_id FROM video_info ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            )
+            self._stats['evictions'] += excess
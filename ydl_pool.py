@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Pool de instancias de yt-dlp
+Mantiene instancias YoutubeDL reutilizables (con sus conexiones HTTP y cookies)
+agrupadas por conjunto de opciones, en lugar de crear una nueva en cada llamada
+"""
+
+import importlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# Opciones que cambian en cada llamada y se aplican al sacar la instancia del pool
+PER_CALL_OPTIONS = ('format', 'outtmpl', 'progress_hooks', 'postprocessor_hooks')
+
+# yt-dlp tarda cientos de milisegundos en importarse: se carga con la primera instancia
+DEFAULT_YDL_CLASS = 'yt_dlp:YoutubeDL'
+
+
+def resolve_class(ydl_class):
+    """Admite la clase o su ruta 'módulo:Clase' (se importa al usarla)"""
+    if isinstance(ydl_class, str):
+        module, _, name = ydl_class.partition(':')
+        return getattr(importlib.import_module(module), name)
+    return ydl_class
+
+
+def expected_errors():
+    """Errores esperables (video no disponible, formato inexistente...) que no
+    indican que la instancia esté dañada"""
+    from yt_dlp.utils import DownloadError, ExtractorError
+    return (DownloadError, ExtractorError)
+
+
+def partition_key(ydl_opts):
+    """Clave de partición: las opciones comunes, sin las que cambian por llamada"""
+    shared = {k: v for k, v in ydl_opts.items() if k not in PER_CALL_OPTIONS}
+    return json.dumps(shared, sort_keys=True, default=repr)
+
+
+class PooledYDL:
+    """Instancia YoutubeDL con contadores de uso y hooks de progreso por llamada"""
+
+    def __init__(self, ydl_opts, ydl_class=DEFAULT_YDL_CLASS):
+        shared = {k: v for k, v in ydl_opts.items() if k not in PER_CALL_OPTIONS}
+        self.ydl = resolve_class(ydl_class)(shared)
+        self.ydl.add_progress_hook(self._dispatch_progress)
+        self.ydl.add_postprocessor_hook(self._dispatch_postprocessor)
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.healthy = True
+        self.progress_hooks = []
+        self.postprocessor_hooks = []
+
+    def _dispatch_progress(self, d):
+        """Reenvía el progreso a los hooks de la llamada actual"""
+        for hook in self.progress_hooks:
+            hook(d)
+
+    def _dispatch_postprocessor(self, d):
+        """Reenvía los eventos de postprocesado a los hooks de la llamada actual"""
+        for hook in self.postprocessor_hooks:
+            hook(d)
+
+    def configure(self, ydl_opts):
+        """Aplica las opciones propias de esta llamada"""
+        ydl = self.ydl
+        ydl._download_retcode = 0
+
+        format_spec = ydl_opts.get('format')
+        if ydl.params.get('format') != format_spec:
+            ydl.params['format'] = format_spec
+            ydl.format_selector = (
+                format_spec if format_spec in (None, '-') or callable(format_spec)
+                else ydl.build_format_selector(format_spec))
+
+        outtmpl = ydl_opts.get('outtmpl')
+        ydl.params['outtmpl'] = {} if outtmpl is None else (
+            dict(outtmpl) if isinstance(outtmpl, dict) else {'default': outtmpl})
+        ydl._parse_outtmpl()
+
+        self.progress_hooks = list(ydl_opts.get('progress_hooks', []))
+        self.postprocessor_hooks = list(ydl_opts.get('postprocessor_hooks', []))
+
+    def close(self):
+        """Cierra las conexiones de la instancia"""
+        try:
+            self.ydl.close()
+        except Exception:
+            pass
+
+
+class YDLPool:
+    """Pool acotado de instancias YoutubeDL, particionado por opciones"""
+
+    def __init__(self, max_per_partition=4, max_uses=50, max_age=30 * 60,
+                 ydl_class=DEFAULT_YDL_CLASS):
+        self.max_per_partition = max_per_partition
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.ydl_class = ydl_class
+
+        self._lock = threading.Condition()
+        self._idle = {}     # clave -> [PooledYDL]
+        self._counts = {}   # clave -> instancias creadas (libres + en uso)
+        self._stats = {'created': 0, 'reused': 0, 'recycled': 0, 'waits': 0}
+
+    @contextmanager
+    def acquire(self, ydl_opts, timeout=None):
+        """Saca una instancia del pool y la devuelve al terminar"""
+        key = partition_key(ydl_opts)
+        pooled = self._checkout(key, ydl_opts, timeout)
+
+        try:
+            pooled.configure(ydl_opts)
+            yield pooled.ydl
+        except BaseException as e:
+            if not isinstance(e, expected_errors()):
+                pooled.healthy = False
+            raise
+        finally:
+            pooled.progress_hooks = []
+            pooled.postprocessor_hooks = []
+            self._checkin(key, pooled)
+
+    def warm(self, ydl_opts):
+        """Crea por adelantado una instancia (importa yt-dlp y carga los extractores)"""
+        try:
+            with self.acquire(ydl_opts):
+                pass
+        except Exception:
+            pass  # El error se verá en la primera llamada real
+
+    def _checkout(self, key, ydl_opts, timeout):
+        """Obtiene una instancia sana de la partición o crea una nueva"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        with self._lock:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                while idle:
+                    pooled = idle.pop()
+                    if self._is_usable(pooled):
+                        pooled.uses += 1
+                        self._stats['reused'] += 1
+                        return pooled
+                    self._discard(key, pooled)
+
+                if self._counts.get(key, 0) < self.max_per_partition:
+                    self._counts[key] = self._counts.get(key, 0) + 1
+                    break
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No hay instancias de yt-dlp disponibles en el pool")
+                self._stats['waits'] += 1
+                self._lock.wait(remaining)
+
+        # Crear la instancia fuera del lock: la inicialización es lenta
+        try:
+            pooled = PooledYDL(ydl_opts, self.ydl_class)
+        except BaseException:
+            with self._lock:
+                self._counts[key] -= 1
+                self._lock.notify()
+            raise
+
+        pooled.uses = 1
+        with self._lock:
+            self._stats['created'] += 1
+        return pooled
+
+    def _checkin(self, key, pooled):
+        """Devuelve una instancia al pool (o la recicla si ya no sirve)"""
+        with self._lock:
+            if self._is_usable(pooled):
+                self._idle.setdefault(key, []).append(pooled)
+            else:
+                self._discard(key, pooled)
+            self._lock.notify()
+
+    def _is_usable(self, pooled):
+        """Comprueba la salud de la instancia y si debe reciclarse"""
+        return (pooled.healthy and
+                pooled.uses < self.max_uses and
+                time.monotonic() - pooled.created_at < self.max_age)
+
+    def _discard(self, key, pooled):
+        """Cierra una instancia y libera su hueco en la partición"""
+        self._counts[key] -= 1
+        self._stats['recycled'] += 1
+        pooled.close()
+
+    def stats(self):
+        """Devuelve contadores del pool"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['partitions'] = len(self._counts)
+            stats['instances'] = sum(self._counts.values())
+            stats['idle'] = sum(len(idle) for idle in self._idle.values())
+        return stats
+
+    def close(self):
+        """Cierra todas las instancias libres"""
+        with self._lock:
+            for key, idle in self._idle.items():
+                for pooled in idle:
+                    self._discard(key, pooled)
+                idle.clear()
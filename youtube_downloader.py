@@ -7,133 +7,336 @@ Descarga videos de YouTube en formato MP4 con selección de calidad
 import os
 import sys
 import re
+import argparse
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from importlib.util import find_spec
 from pathlib import Path
-try:
-    import yt_dlp
-except ImportError:
+
+# yt-dlp se importa al crear la primera instancia del pool, no al arrancar
+if find_spec('yt_dlp') is None:
     print("Error: yt-dlp no está instalado.")
     print("Instala con: pip install yt-dlp")
     sys.exit(1)
 
+from ffmpeg_pool import FFmpegPool, audio_args, merge_args
+from format_selection import LOSSLESS_AUDIO, format_filesize, select_audio_formats, select_formats
+from metrics import (CACHE_REQUESTS, EXTRACTION_SECONDS, FAILURES, DownloadInstrument,
+                     error_class)
+from playlist_expander import is_collection_url
+import profiling
+from rate_control import RateController, RateLimitedError, ThroughputMonitor
+from single_flight import SingleFlight
+from video_cache import VideoInfoCache, extract_video_id, ttl_from_info
+from ydl_pool import YDLPool
+
+# 'video+audio' sin alternativas: las pistas se descargan por separado y se unen en el pool
+SEPARATE_FORMAT_REGEX = re.compile(r'^[\w-]+\+[\w-]+$')
+
 class YouTubeDownloader:
-    def __init__(self):
+    def __init__(self, pool_size=4, lock_dir=None, connections_per_job=1, max_connections=16,
+                 extract_rate=None, ffmpeg_workers=None):
         self.download_path = Path("downloads")
         self.download_path.mkdir(exist_ok=True)
+        self.info_cache = VideoInfoCache()
+        self.ydl_pool = YDLPool(max_per_partition=pool_size,
+                                ydl_class='segmented_downloader:SegmentedYDL')
+        # Con más de una conexión por trabajo los archivos se descargan por rangos
+        # en paralelo, sin superar max_connections entre todas las descargas
+        self.connections_per_job = connections_per_job
+        self.connection_limiter = None
+        if connections_per_job > 1:
+            from segmented_downloader import ConnectionLimiter
+            self.connection_limiter = ConnectionLimiter(max_connections)
+        # Ritmo adaptativo frente a los 429/403 y los flujos estrangulados de YouTube
+        self.rate_control = RateController(max_extractions=pool_size, max_downloads=pool_size,
+                                           extract_rate=extract_rate)
+        # Conversiones y uniones fuera de yt-dlp, como mucho una por núcleo
+        self.ffmpeg_pool = FFmpegPool(workers=ffmpeg_workers)
+        # Con lock_dir las extracciones se coordinan también con otros procesos
+        self.flights = SingleFlight(lock_dir=lock_dir)
+        # Perfilado de la CLI/GUI; el servidor abre sus propias sesiones por trabajo
+        self.profiler = None
+        self.profile_all = False
     
     def validate_youtube_url(self, url):
-        """Valida si la URL es de YouTube"""
-        youtube_regex = re.compile(
-            r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-            r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-        )
-        return youtube_regex.match(url) is not None
+        """Valida si la URL es de YouTube (video, lista de reproducción o canal)"""
+        return extract_video_id(url) is not None or is_collection_url(url)
     
     def get_video_info(self, url):
         """Obtiene información del video y formatos disponibles"""
+        video_id = extract_video_id(url)
+        cached = self.info_cache.get(video_id)
+        CACHE_REQUESTS.labels(cache='info', result='miss' if cached is None else 'hit').inc()
+        if cached is not None:
+            return cached
+        
+        # Las peticiones simultáneas del mismo video comparten una sola extracción
+        return self.flights.do(('info', video_id or url), self._extract_video_info, url, video_id)
+    
+    def _extract_video_info(self, url, video_id):
+        """Extrae la información con yt-dlp y la guarda en la caché"""
+        if self.flights.lock_dir is not None:
+            # Otro proceso puede haberla guardado mientras se esperaba el bloqueo
+            cached = self.info_cache.get(video_id)
+            if cached is not None:
+                return cached
+        
         try:
             ydl_opts = {
                 'quiet': True,
                 'no_warnings': True,
+                'noplaylist': True,
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                # Obtener formatos disponibles con mejor calidad
-                formats = []
-                
-                # Primero intentar obtener formatos combinados (video+audio)
-                for fmt in info.get('formats', []):
-                    if (fmt.get('height') and 
-                        fmt.get('vcodec') != 'none' and 
-                        fmt.get('acodec') != 'none'):
-                        formats.append({
-                            'format_id': fmt['format_id'],
-                            'height': fmt['height'],
-                            'fps': fmt.get('fps', 30),
-                            'filesize': fmt.get('filesize', 0),
-                            'quality': f"{fmt['height']}p",
-                            'type': 'combined'
-                        })
+            with self.ydl_pool.acquire(ydl_opts) as ydl:
+                started = time.monotonic()
+                with self._profiled('extract', video_id):
+                    info = self.rate_control.call('extract', ydl.extract_info, url,
+                                                  download=False)
+                EXTRACTION_SECONDS.observe(time.monotonic() - started)
                 
-                # Si no hay suficientes formatos combinados, agregar formatos de video solo
-                # (yt-dlp automáticamente combinará con audio)
-                if len(formats) < 3:
-                    for fmt in info.get('formats', []):
-                        if (fmt.get('height') and 
-                            fmt.get('vcodec') != 'none' and 
-                            fmt.get('acodec') == 'none'):
-                            formats.append({
-                                'format_id': f"{fmt['format_id']}+bestaudio",
-                                'height': fmt['height'],
-                                'fps': fmt.get('fps', 30),
-                                'filesize': fmt.get('filesize', 0),
-                                'quality': f"{fmt['height']}p",
-                                'type': 'separate'
-                            })
-                
-                # Ordenar por calidad (altura) descendente
-                formats.sort(key=lambda x: x['height'], reverse=True)
-                
-                # Eliminar duplicados por altura
-                seen_heights = set()
-                unique_formats = []
-                for fmt in formats:
-                    if fmt['height'] not in seen_heights:
-                        unique_formats.append(fmt)
-                        seen_heights.add(fmt['height'])
-                
-                return {
+                video_info = {
+                    'video_id': info.get('id'),
                     'title': info.get('title', 'Video sin título'),
                     'duration': info.get('duration', 0),
                     'uploader': info.get('uploader', 'Desconocido'),
-                    'formats': unique_formats[:10]  # Limitar a 10 opciones
+                    'thumbnail': info.get('thumbnail'),
+                    'view_count': info.get('view_count'),
+                    'formats': select_formats(info),
+                    'audio_formats': select_audio_formats(info),
                 }
+                
+                self.info_cache.set(video_id or info.get('id'), video_info, ttl_from_info(info))
+                return video_info
         
+        except RateLimitedError as e:
+            FAILURES.labels(stage='extract', error=error_class(e)).inc()
+            raise
         except Exception as e:
+            FAILURES.labels(stage='extract', error=error_class(e)).inc()
             raise Exception(f"Error al obtener información del video: {str(e)}")
     
-    def format_filesize(self, size_bytes):
+    def format_filesize(self, size_bytes, estimated=False):
         """Convierte bytes a formato legible"""
-        if not size_bytes:
-            return "Tamaño desconocido"
-        
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        return format_filesize(size_bytes, estimated)
     
-    def download_video(self, url, format_id, title):
-        """Descarga el video en el formato seleccionado"""
+    def download_video(self, url, format_id, title, container='mp4', quiet=False,
+                       output_dir=None, progress_hooks=None, postprocessor_hooks=None,
+                       defer_merge=False):
+        """Descarga el video en el formato seleccionado y devuelve la ruta del archivo
+
+        Con video y audio separados la unión se hace en el pool de FFmpeg; con
+        defer_merge se devuelve un Future de la ruta al terminar la descarga.
+        """
         try:
-            # Limpiar el título para el nombre del archivo
-            safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)
-            safe_title = safe_title[:100]  # Limitar longitud
-            
-            output_path = self.download_path / f"{safe_title}.%(ext)s"
+            output_dir = Path(output_dir) if output_dir else self.download_path
+            if self.ffmpeg_pool.available and SEPARATE_FORMAT_REGEX.match(format_id):
+                return self._download_separate(url, format_id, title, container, quiet,
+                                               output_dir, progress_hooks, postprocessor_hooks,
+                                               defer_merge)
+            output_path = output_dir / f"{self.safe_filename(title)}.%(ext)s"
             
             ydl_opts = {
                 'format': format_id,
                 'outtmpl': str(output_path),
                 'noplaylist': True,
-                'merge_output_format': 'mp4',  # Asegurar salida en MP4
+                'merge_output_format': container,  # Asegurar salida en MP4
                 'writesubtitles': False,
                 'writeautomaticsub': False,
             }
             
-            print(f"\n🔄 Descargando: {title}")
-            print("=" * 50)
+            return self._download(url, ydl_opts, title, quiet, progress_hooks, postprocessor_hooks,
+                                  kind='video')
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+        except Exception as e:
+            raise Exception(f"Error durante la descarga: {str(e)}")
+    
+    def _download_separate(self, url, format_id, title, container, quiet, output_dir,
+                           progress_hooks, postprocessor_hooks, defer_merge):
+        """Descarga las pistas sin unirlas y encarga la unión al pool de FFmpeg"""
+        name = self.safe_filename(title)
+        ydl_opts = {
+            'format': format_id.replace('+', ','),  # cada pista en su archivo
+            'outtmpl': str(output_dir / f"{name}.f%(format_id)s.%(ext)s"),
+            'noplaylist': True,
+            'writesubtitles': False,
+            'writeautomaticsub': False,
+        }
+        files = self._download(url, ydl_opts, title, quiet, progress_hooks, postprocessor_hooks,
+                               kind='video', all_files=True)
+        # yt-dlp no garantiza el orden de las pistas: se identifican por sus códecs
+        video = next((f['filepath'] for f in files
+                      if f.get('filepath') and f.get('vcodec') not in (None, 'none')), None)
+        audio = next((f['filepath'] for f in files
+                      if f.get('filepath') and f.get('filepath') != video
+                      and f.get('acodec') not in (None, 'none')), None)
+        if video is None or audio is None:
+            raise Exception("No se descargaron las pistas de video y audio")
+        
+        merged = self._merge(Path(video), Path(audio), output_dir / f"{name}.{container}",
+                             container, postprocessor_hooks)
+        if defer_merge:
+            return merged
+        if not quiet:
+            print("🔗 Uniendo video y audio...")
+        filepath = merged.result()
+        if not quiet:
+            print(f"✅ Archivo listo: {Path(filepath).name}")
+        return filepath
+    
+    def _merge(self, video, audio, target, container, postprocessor_hooks):
+        """Pone la unión en la cola del pool; el Future devuelve la ruta del archivo"""
+        event = {'postprocessor': 'FFmpegMerger', 'stage': 'merge'}
+        for hook in postprocessor_hooks or ():
+            hook(dict(event, status='started'))
+        
+        merged = Future()
+        
+        def done(future):
+            # En el hilo del pool, al terminar FFmpeg
+            try:
+                result = future.result()
+                video.unlink(missing_ok=True)
+                audio.unlink(missing_ok=True)
+                for hook in postprocessor_hooks or ():
+                    hook(dict(event, status='finished', **result))
+            except Exception as e:
+                target.unlink(missing_ok=True)
+                merged.set_exception(Exception(f"Error al unir video y audio: {e}"))
+            else:
+                merged.set_result(str(target))
+        
+        # Primero copiando las pistas; si el contenedor no admite el audio, se recodifica
+        self.ffmpeg_pool.submit(
+            merge_args(video, audio, target, container), 'merge',
+            fallback=merge_args(video, audio, target, container, reencode_audio=True),
+        ).add_done_callback(done)
+        return merged
+    
+    def download_audio(self, url, title, codec='mp3', bitrate='192', quiet=False,
+                       output_dir=None, progress_hooks=None, postprocessor_hooks=None,
+                       format_id=None):
+        """Descarga solo la pista de audio: m4a/opus se copian sin recodificar y MP3 se
+        convierte en el pool de FFmpeg (por defecto a 192 kbps)"""
+        try:
+            lossless = LOSSLESS_AUDIO.get(codec)
+            if codec != 'mp3' and lossless is None:
+                raise Exception(f"Códec de audio no soportado: {codec}")
+            if codec == 'mp3' and not self.ffmpeg_pool.available:
+                # Mejor fallar antes de descargar nada
+                raise Exception("FFmpeg no está instalado. Instálalo para convertir a MP3.")
+
+            output_dir = Path(output_dir) if output_dir else self.download_path
+            output_path = output_dir / f"{self.safe_filename(title)}.%(ext)s"
             
-            print(f"\n✅ ¡Descarga completada!")
-            print(f"📁 Ubicación: {self.download_path.absolute()}")
+            ydl_opts = {
+                'format': format_id or (lossless['selector'] if lossless else 'bestaudio/best'),
+                'outtmpl': str(output_path),
+                'noplaylist': True,
+            }
+            
+            filepath = self._download(url, ydl_opts, title, quiet, progress_hooks,
+                                      postprocessor_hooks, kind='audio')
+            if not filepath:
+                return filepath
+            return self._convert_audio(Path(filepath), codec, bitrate, quiet, postprocessor_hooks)
             
         except Exception as e:
             raise Exception(f"Error durante la descarga: {str(e)}")
     
+    def _convert_audio(self, source, codec, bitrate, quiet, postprocessor_hooks):
+        """Lleva la pista descargada al códec pedido y devuelve la ruta final"""
+        if source.suffix == f".{codec}" or codec == 'm4a':
+            return source
+        if codec == 'opus' and not self.ffmpeg_pool.available:
+            # Sin FFmpeg la pista Opus se entrega en su WebM original
+            return source
+        
+        target = source.with_suffix(f".{codec}")
+        stage = 'transcode' if codec == 'mp3' else 'remux'
+        event = {'postprocessor': 'FFmpegExtractAudio', 'stage': stage}
+        for hook in postprocessor_hooks or ():
+            hook(dict(event, status='started'))
+        if not quiet:
+            print(f"🎵 Convirtiendo a {codec.upper()}...")
+        
+        try:
+            result = self.ffmpeg_pool.run(audio_args(source, target, codec, bitrate), stage)
+        except Exception:
+            target.unlink(missing_ok=True)
+            raise
+        source.unlink(missing_ok=True)
+        
+        for hook in postprocessor_hooks or ():
+            hook(dict(event, status='finished', **result))
+        if not quiet:
+            print(f"✅ Audio listo en {result['seconds']:.1f} s "
+                  f"(CPU {result['cpu_seconds']:.1f} s): {target.name}")
+        return str(target)
+    
+    def safe_filename(self, title):
+        """Limpia el título para usarlo como nombre de archivo"""
+        safe_title = re.sub(r'[<>:"/\\|?*]', '_', title)
+        return safe_title[:100]  # Limitar longitud
+    
+    def _download(self, url, ydl_opts, title, quiet, progress_hooks, postprocessor_hooks,
+                  kind='video', all_files=False):
+        """Ejecuta la descarga con una instancia del pool (all_files: ruta y códecs de cada
+        formato descargado)"""
+        # Separa en las métricas el tiempo de descarga del de unión/conversión
+        instrument = DownloadInstrument(kind)
+        monitor = ThroughputMonitor()
+        ydl_opts['progress_hooks'] = ([instrument.progress_hook, monitor.progress_hook] +
+                                      list(progress_hooks or ()))
+        ydl_opts['postprocessor_hooks'] = ([instrument.postprocessor_hook] +
+                                           list(postprocessor_hooks or ()))
+        
+        if self.connections_per_job > 1:
+            ydl_opts['segmented_connections'] = self.connections_per_job
+            ydl_opts['connection_limiter'] = self.connection_limiter
+        
+        if quiet:
+            ydl_opts.update({'quiet': True, 'no_warnings': True, 'noprogress': True})
+        else:
+            print(f"\n🔄 Descargando: {title}")
+            print("=" * 50)
+        
+        with self.ydl_pool.acquire(ydl_opts) as ydl, instrument.measure(), \
+                self._profiled('download', extract_video_id(url)):
+            info = self.rate_control.call('download', ydl.extract_info, url, download=True,
+                                          throttled=lambda: monitor.throttled)
+        
+        downloads = info.get('requested_downloads') or [{}]
+        filepath = downloads[-1].get('filepath')
+        
+        if not quiet:
+            location = Path(filepath).parent if filepath else self.download_path
+            print(f"\n✅ ¡Descarga completada!")
+            print(f"📁 Ubicación: {location.absolute()}")
+        
+        if all_files:
+            return [{key: download.get(key) for key in ('filepath', 'vcodec', 'acodec')}
+                    for download in downloads]
+        return filepath
+    
+    @contextmanager
+    def _profiled(self, phase, tag):
+        """Perfila la fase con la sesión del hilo o, en la CLI, con una sesión propia"""
+        if (self.profiler is None or profiling.current_session() is not None or
+                not self.profiler.wanted(self.profile_all)):
+            with profiling.phase(phase):
+                yield
+            return
+        
+        with self.profiler.session(tag or 'video') as session:
+            with session.phase(phase):
+                yield
+        for artifact in session.artifacts:
+            print(f"🔬 Perfil de {artifact['phase']} ({artifact['seconds']} s): {artifact['path']}",
+                  file=sys.stderr)
+    
     def run(self):
         """Función principal del programa"""
         print("🎥 YouTube Video Downloader")
@@ -158,6 +361,10 @@ class YouTubeDownloader:
                     print("❌ La URL no parece ser de YouTube. Intenta de nuevo.")
                     continue
                 
+                if is_collection_url(url):
+                    print("📋 Es una lista o un canal: usa el modo por lotes (--batch) para descargarla.")
+                    continue
+                
                 # Obtener información del video
                 print("\n🔍 Obteniendo información del video...")
                 video_info = self.get_video_info(url)
@@ -179,7 +386,7 @@ class YouTubeDownloader:
                 print(f"\n🎬 Calidades disponibles:")
                 print("-" * 50)
                 for i, fmt in enumerate(formats, 1):
-                    filesize_str = self.format_filesize(fmt['filesize'])
+                    filesize_str = self.format_filesize(fmt['filesize'], fmt.get('filesize_estimated'))
                     fps_str = f" @ {fmt['fps']}fps" if fmt['fps'] != 'N/A' else ""
                     print(f"{i}. {fmt['quality']}{fps_str} - {filesize_str}")
                 
@@ -221,10 +428,142 @@ class YouTubeDownloader:
                 print(f"\n❌ Error: {e}")
                 print("Intenta con otro video o verifica tu conexión a internet.")
 
-def main():
+def parse_args(argv=None):
+    """Interpreta los argumentos de línea de comandos"""
+    parser = argparse.ArgumentParser(description="Descarga videos de YouTube en formato MP4")
+    parser.add_argument('--batch', metavar='ARCHIVO',
+                        help="archivo con una URL por línea ('-' para leer de stdin)")
+    parser.add_argument('--calidad', default='best<=1080p mp4',
+                        help="política de calidad para el modo por lotes (por defecto: 'best<=1080p mp4')")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="descargas simultáneas en el modo por lotes (por defecto: 4)")
+    parser.add_argument('--informe', metavar='ARCHIVO',
+                        help="archivo JSON Lines con el resultado de cada URL (por defecto: stdout)")
+    parser.add_argument('--conexiones', type=int, default=1,
+                        help="conexiones simultáneas por descarga (por defecto: 1)")
+    parser.add_argument('--max-conexiones', type=int, default=16,
+                        help="conexiones simultáneas entre todas las descargas (por defecto: 16)")
+    parser.add_argument('--ritmo', type=float, default=0, metavar='N',
+                        help="extracciones por segundo hacia YouTube (por defecto: sin límite "
+                             "hasta el primer 429)")
+    parser.add_argument('--estado', metavar='ARCHIVO', default=str(Path("cache") / "playlists.json"),
+                        help="índice procesado de cada lista o canal, para reanudar "
+                             "(por defecto: cache/playlists.json)")
+    parser.add_argument('--perfil', action='store_true',
+                        help="perfila la extracción y la descarga de cada video")
+    parser.add_argument('--perfil-muestreo', type=float, default=0.0, metavar='FRACCIÓN',
+                        help="perfila solo esta fracción de los videos (p. ej. 0.05)")
+    parser.add_argument('--perfil-modo', choices=profiling.MODES, default='sample',
+                        help="'sample' (pilas colapsadas) o 'deterministic' (cProfile/pstats)")
+    parser.add_argument('--perfil-dir', default='profiles',
+                        help="carpeta de los perfiles (por defecto: profiles)")
+    parser.add_argument('--info', metavar='URL',
+                        help="muestra la información del video en JSON y termina")
+    parser.add_argument('--daemon', action='store_true',
+                        help="arranca el daemon residente que mantiene yt-dlp cargado")
+    parser.add_argument('--detener-daemon', action='store_true',
+                        help="detiene el daemon residente")
+    parser.add_argument('--socket', default=str(Path("cache") / "daemon.sock"),
+                        help="socket Unix del daemon (por defecto: cache/daemon.sock)")
+    parser.add_argument('--sin-daemon', action='store_true',
+                        help="no usa el daemon aunque esté en marcha")
+    return parser.parse_args(argv)
+
+def configure_profiling(downloader, args):
+    """Activa el perfilado pedido en la línea de comandos"""
+    if args.perfil or args.perfil_muestreo > 0:
+        downloader.profiler = profiling.Profiler(args.perfil_dir, sample_rate=args.perfil_muestreo,
+                                                 mode=args.perfil_modo)
+        downloader.profile_all = args.perfil
+
+def make_downloader(args, **kwargs):
+    """Usa el daemon residente si está escuchando; si no, un descargador local"""
+    # El perfilado mide este proceso: con él activo se trabaja en local
+    if not (args.sin_daemon or args.perfil or args.perfil_muestreo > 0):
+        import resident
+        remote = resident.connect(args.socket)
+        if remote is not None:
+            return remote
+    downloader = YouTubeDownloader(**kwargs)
+    configure_profiling(downloader, args)
+    return downloader
+
+def sweep_downloads(downloader, periodic=False):
+    """Borra las descargas a medias abandonadas en la carpeta de descargas"""
+    from scratch_sweeper import LOCAL_PARTIAL_TTL, ScratchSweeper, sweep_in_background
+    # Los videos descargados son del usuario: solo se borran .part, fragmentos y pistas sueltas
+    options = {'keep_finals': True, 'partial_ttl': LOCAL_PARTIAL_TTL}
+    if periodic:
+        return ScratchSweeper(downloader.download_path, verbose=True, **options).start()
+    return sweep_in_background(downloader.download_path, **options)
+
+def run_daemon(args):
+    """Arranca el daemon residente en primer plano"""
+    import resident
+    downloader = YouTubeDownloader(pool_size=args.workers, connections_per_job=args.conexiones,
+                                   max_connections=args.max_conexiones,
+                                   extract_rate=args.ritmo or None)
+    sweep_downloads(downloader, periodic=True)
+    resident.serve(args.socket, downloader)
+
+def stop_daemon(args):
+    """Pide al daemon residente que termine"""
+    import resident
+    remote = resident.connect(args.socket)
+    if remote is None:
+        print(f"ℹ️  No hay ningún daemon escuchando en {args.socket}")
+        return 1
+    remote.call({'op': 'shutdown'})
+    print("👋 Daemon detenido")
+    return 0
+
+def run_batch(args):
+    """Ejecuta el modo por lotes sin interacción"""
+    from batch_downloader import BatchRunner, iter_urls
+    from format_selection import QualityPolicy
+    from playlist_expander import PlaylistExpander
+    from url_normalizer import UrlDeduplicator
+    
+    policy = QualityPolicy.parse(args.calidad)
+    downloader = make_downloader(args, pool_size=args.workers,
+                                 connections_per_job=args.conexiones,
+                                 max_connections=args.max_conexiones,
+                                 extract_rate=args.ritmo or None)
+    sweep_downloads(downloader)
+    # Las listas y canales se expanden a medida que se leen y entran directamente en la cola
+    expander = PlaylistExpander(downloader, metadata_workers=args.workers,
+                                state_path=args.estado)
+    runner = BatchRunner(downloader, policy, workers=args.workers, report_path=args.informe,
+                         on_result=expander.mark_done)
+    
+    print(f"📋 Modo por lotes: calidad '{policy}', {runner.workers} descargas simultáneas",
+          file=sys.stderr)
+    # Cada video entra una sola vez en la cola, escriba como se escriba su URL y
+    # aunque también aparezca en una lista o canal
+    deduplicator = UrlDeduplicator()
+    counts = runner.run(expander.expand(iter_urls(args.batch), deduplicator))
+    print(f"✅ {counts['ok']} completadas, ❌ {counts['error']} con error, "
+          f"⏭️  {counts['skipped']} omitidas, "
+          f"🔁 {deduplicator.stats['duplicates']} repetidas", file=sys.stderr)
+    return 1 if counts['error'] else 0
+
+def main(argv=None):
     """Punto de entrada del programa"""
+    args = parse_args(argv)
     try:
-        downloader = YouTubeDownloader()
+        if args.daemon:
+            return run_daemon(args)
+        if args.detener_daemon:
+            sys.exit(stop_daemon(args))
+        if args.batch:
+            sys.exit(run_batch(args))
+        downloader = make_downloader(args)
+        if args.info:
+            import json
+            print(json.dumps(downloader.get_video_info(args.info), ensure_ascii=False, indent=2,
+                             default=str))
+            return
+        sweep_downloads(downloader)
         downloader.run()
     except KeyboardInterrupt:
         print("\n👋 ¡Hasta luego!")
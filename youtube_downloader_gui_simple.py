@@ -8,16 +8,36 @@ import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import threading
 import os
+import queue
 import re
 from pathlib import Path
 import sys
 
-try:
-    import yt_dlp
-except ImportError:
+from importlib.util import find_spec
+
+# yt-dlp se importa en segundo plano una vez abierta la ventana
+if find_spec('yt_dlp') is None:
     messagebox.showerror("Error", "yt-dlp no está instalado.\nInstala con: pip install yt-dlp")
     sys.exit(1)
 
+from progress import ProgressTracker, format_progress
+from format_selection import FormatPolicy, format_filesize, select_formats
+from scratch_sweeper import LOCAL_PARTIAL_TTL, sweep_in_background
+from video_cache import VideoInfoCache, extract_video_id, ttl_from_info
+from ydl_pool import YDLPool
+
+# Opciones de la extracción de información (misma partición que el precalentado)
+INFO_OPTIONS = {
+    'quiet': True,
+    'no_warnings': True,
+}
+
+# Intervalo del sondeo de la cola de la interfaz (como mucho 20 refrescos por segundo)
+UI_POLL_MS = 50
+
+# Solo formatos combinados, sin filtrar por extensión: no hace falta FFmpeg
+FORMAT_POLICY = FormatPolicy(combined_only=True, max_options=8, fallback=True)
+
 class YouTubeDownloaderGUI:
     def __init__(self, root):
         self.root = root
@@ -30,8 +50,18 @@ class YouTubeDownloaderGUI:
         self.download_path.mkdir(exist_ok=True)
         self.video_info = None
         self.formats = []
+        self.info_cache = VideoInfoCache()
+        self.ydl_pool = YDLPool()
+        # Los hilos de trabajo no tocan Tk: encolan las actualizaciones y un único
+        # temporizador del hilo de la interfaz las aplica
+        self.ui_queue = queue.Queue()
         
         self.setup_ui()
+        self.root.after(UI_POLL_MS, self.poll_ui_queue)
+        # Cargar yt-dlp y sus extractores mientras el usuario pega la URL
+        threading.Thread(target=self.ydl_pool.warm, args=(INFO_OPTIONS,), daemon=True).start()
+        # Borrar descargas a medias abandonadas (los videos descargados no se tocan)
+        sweep_in_background(self.download_path, keep_finals=True, partial_ttl=LOCAL_PARTIAL_TTL)
     
     def setup_ui(self):
         """Configura la interfaz de usuario"""
@@ -109,29 +139,63 @@ class YouTubeDownloaderGUI:
                                          command=self.download_video_thread, state="disabled")
         self.download_button.grid(row=4, column=0, columnspan=3, pady=20)
         
-        # Barra de progreso
-        self.progress = ttk.Progressbar(main_frame, mode='indeterminate')
+        # Barra de progreso (en porcentaje de bytes durante la descarga)
+        self.progress_var = tk.DoubleVar(value=0.0)
+        self.progress = ttk.Progressbar(main_frame, mode='determinate', maximum=100,
+                                        variable=self.progress_var)
         self.progress.grid(row=5, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(0, 10))
         
         # Label de estado
         self.status_var = tk.StringVar(value="Listo para usar")
         self.status_label = ttk.Label(main_frame, textvariable=self.status_var)
         self.status_label.grid(row=6, column=0, columnspan=3)
+        
+        # Bytes descargados, velocidad y tiempo restante
+        self.detail_var = tk.StringVar(value="")
+        ttk.Label(main_frame, textvariable=self.detail_var).grid(row=7, column=0, columnspan=3)
+    
+    def post(self, fn, *args):
+        """Encola una actualización de la interfaz (desde cualquier hilo)"""
+        self.ui_queue.put((fn, args))
+    
+    def poll_ui_queue(self):
+        """Aplica las actualizaciones encoladas y vuelve a programarse"""
+        try:
+            while True:
+                try:
+                    fn, args = self.ui_queue.get_nowait()
+                except queue.Empty:
+                    break
+                fn(*args)
+        finally:
+            self.root.after(UI_POLL_MS, self.poll_ui_queue)
+    
+    def start_busy(self):
+        """Barra en movimiento mientras no hay bytes que medir"""
+        self.progress.config(mode='indeterminate')
+        self.progress.start()
+    
+    def stop_busy(self):
+        self.progress.stop()
+        self.progress.config(mode='determinate')
+        self.progress_var.set(0.0)
+    
+    def show_progress(self, tracker):
+        """Refleja en la barra el progreso agregado por el tracker de la descarga"""
+        snapshot = tracker.snapshot()
+        self.progress_var.set(snapshot['percent'])
+        if snapshot['phase'] == 'merging':
+            self.status_var.set("Uniendo video y audio...")
+        elif snapshot['phase'] == 'processing':
+            self.status_var.set("Procesando archivo...")
+        self.detail_var.set(format_progress(snapshot))
     
     def validate_youtube_url(self, url):
         """Valida si la URL es de YouTube"""
-        youtube_regex = re.compile(
-            r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-            r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-        )
-        return youtube_regex.match(url) is not None
+        return extract_video_id(url) is not None
     
     def get_video_info_thread(self):
-        """Ejecuta get_video_info en un hilo separado"""
-        threading.Thread(target=self.get_video_info, daemon=True).start()
-    
-    def get_video_info(self):
-        """Obtiene información del video"""
+        """Valida la URL y ejecuta get_video_info en un hilo separado"""
         url = self.url_var.get().strip()
         
         if not url:
@@ -143,83 +207,45 @@ class YouTubeDownloaderGUI:
             return
         
         # Actualizar UI
-        self.root.after(0, lambda: self.status_var.set("Obteniendo información del video..."))
-        self.root.after(0, lambda: self.progress.start())
-        self.root.after(0, lambda: self.info_button.config(state="disabled"))
-        
+        self.status_var.set("Obteniendo información del video...")
+        self.start_busy()
+        self.info_button.config(state="disabled")
+        threading.Thread(target=self.get_video_info, args=(url,), daemon=True).start()
+    
+    def get_video_info(self, url):
+        """Obtiene información del video"""
         try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-            }
+            # Reutilizar la información si el video se analizó recientemente
+            video_id = extract_video_id(url)
+            cached = self.info_cache.get(video_id)
+            if cached is not None:
+                self.video_info = cached
+                self.post(self.update_video_info_ui)
+                return
+            
+            ydl_opts = dict(INFO_OPTIONS)
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.ydl_pool.acquire(ydl_opts) as ydl:
                 info = ydl.extract_info(url, download=False)
                 
-                # Obtener solo formatos combinados (sin necesidad de FFmpeg)
-                formats = []
-                
-                # Buscar formatos que ya tengan video y audio combinados
-                for fmt in info.get('formats', []):
-                    if (fmt.get('height') and 
-                        fmt.get('vcodec') != 'none' and 
-                        fmt.get('acodec') != 'none'):
-                        formats.append({
-                            'format_id': fmt['format_id'],
-                            'height': fmt['height'],
-                            'fps': fmt.get('fps', 30),
-                            'filesize': fmt.get('filesize', 0),
-                            'quality': f"{fmt['height']}p",
-                            'ext': fmt.get('ext', 'mp4')
-                        })
-                
-                # Si no hay formatos combinados, agregar opciones básicas
-                if len(formats) == 0:
-                    basic_formats = [
-                        {'id': 'best[ext=mp4]', 'height': 720, 'quality': 'Mejor calidad disponible (MP4)'},
-                        {'id': 'worst[ext=mp4]', 'height': 360, 'quality': 'Menor calidad (MP4)'},
-                        {'id': '18', 'height': 360, 'quality': '360p (MP4)'},
-                        {'id': 'best', 'height': 480, 'quality': 'Mejor calidad disponible'}
-                    ]
-                    
-                    for fmt_info in basic_formats:
-                        formats.append({
-                            'format_id': fmt_info['id'],
-                            'height': fmt_info['height'],
-                            'fps': 30,
-                            'filesize': 0,
-                            'quality': fmt_info['quality'],
-                            'ext': 'mp4'
-                        })
-                
-                # Ordenar por calidad
-                formats.sort(key=lambda x: x['height'], reverse=True)
-                
-                # Eliminar duplicados por altura
-                seen_heights = set()
-                unique_formats = []
-                for fmt in formats:
-                    if fmt['height'] not in seen_heights:
-                        unique_formats.append(fmt)
-                        seen_heights.add(fmt['height'])
-                
                 self.video_info = {
                     'title': info.get('title', 'Video sin título'),
                     'duration': info.get('duration', 0),
                     'uploader': info.get('uploader', 'Desconocido'),
-                    'formats': unique_formats[:8]  # Limitar a 8 opciones
+                    'formats': select_formats(info, FORMAT_POLICY)
                 }
+                self.info_cache.set(video_id or info.get('id'), self.video_info, ttl_from_info(info))
                 
                 # Actualizar UI en el hilo principal
-                self.root.after(0, self.update_video_info_ui)
+                self.post(self.update_video_info_ui)
         
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Error al obtener información: {str(e)}"))
+            self.post(messagebox.showerror, "Error", f"Error al obtener información: {str(e)}")
         
         finally:
-            self.root.after(0, lambda: self.progress.stop())
-            self.root.after(0, lambda: self.info_button.config(state="normal"))
-            self.root.after(0, lambda: self.status_var.set("Listo"))
+            self.post(self.stop_busy)
+            self.post(lambda: self.info_button.config(state="normal"))
+            self.post(self.status_var.set, "Listo")
     
     def update_video_info_ui(self):
         """Actualiza la UI con la información del video"""
@@ -240,7 +266,7 @@ class YouTubeDownloaderGUI:
         self.formats = self.video_info['formats']
         
         for fmt in self.formats:
-            filesize_str = self.format_filesize(fmt['filesize'])
+            filesize_str = self.format_filesize(fmt['filesize'], fmt.get('filesize_estimated'))
             fps_str = f" @ {fmt['fps']}fps" if fmt['fps'] != 30 else ""
             display_text = f"{fmt['quality']}{fps_str} - {filesize_str}"
             self.quality_listbox.insert(tk.END, display_text)
@@ -249,16 +275,9 @@ class YouTubeDownloaderGUI:
         self.download_button.config(state="normal")
         self.status_var.set("Video listo para descargar")
     
-    def format_filesize(self, size_bytes):
+    def format_filesize(self, size_bytes, estimated=False):
         """Convierte bytes a formato legible"""
-        if not size_bytes:
-            return "Tamaño desconocido"
-        
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        return format_filesize(size_bytes, estimated)
     
     def select_download_path(self):
         """Selecciona la carpeta de descarga"""
@@ -268,11 +287,7 @@ class YouTubeDownloaderGUI:
             self.path_var.set(str(self.download_path.absolute()))
     
     def download_video_thread(self):
-        """Ejecuta download_video en un hilo separado"""
-        threading.Thread(target=self.download_video, daemon=True).start()
-    
-    def download_video(self):
-        """Descarga el video seleccionado"""
+        """Comprueba la selección y ejecuta download_video en un hilo separado"""
         selection = self.quality_listbox.curselection()
         if not selection:
             messagebox.showerror("Error", "Por favor selecciona una calidad")
@@ -282,9 +297,18 @@ class YouTubeDownloaderGUI:
         url = self.url_var.get().strip()
         
         # Actualizar UI
-        self.root.after(0, lambda: self.status_var.set("Descargando video..."))
-        self.root.after(0, lambda: self.progress.start())
-        self.root.after(0, lambda: self.download_button.config(state="disabled"))
+        self.status_var.set("Descargando video...")
+        self.progress_var.set(0.0)
+        self.detail_var.set("")
+        self.download_button.config(state="disabled")
+        threading.Thread(target=self.download_video, args=(url, selected_format),
+                         daemon=True).start()
+    
+    def download_video(self, url, selected_format):
+        """Descarga el video seleccionado"""
+        # Los hooks de yt-dlp solo suman bytes; el tracker avisa como mucho a 20 Hz
+        tracker = ProgressTracker(on_update=lambda: self.post(self.show_progress, tracker),
+                                  min_interval=UI_POLL_MS / 1000)
         
         try:
             # Limpiar título para nombre de archivo
@@ -298,22 +322,25 @@ class YouTubeDownloaderGUI:
                 'format': selected_format['format_id'],
                 'outtmpl': str(output_path),
                 'noplaylist': True,
+                'progress_hooks': [tracker.progress_hook],
+                'postprocessor_hooks': [tracker.postprocessor_hook],
             }
             
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            with self.ydl_pool.acquire(ydl_opts) as ydl:
                 ydl.download([url])
             
-            self.root.after(0, lambda: messagebox.showinfo("Éxito", 
-                f"¡Video descargado exitosamente!\n\nUbicación: {self.download_path.absolute()}"))
-            self.root.after(0, lambda: self.status_var.set("Descarga completada"))
+            tracker.set_phase('done')
+            self.post(self.status_var.set, "Descarga completada")
+            self.post(messagebox.showinfo, "Éxito",
+                      f"¡Video descargado exitosamente!\n\nUbicación: {self.download_path.absolute()}")
         
         except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Error durante la descarga: {str(e)}"))
-            self.root.after(0, lambda: self.status_var.set("Error en la descarga"))
+            tracker.set_phase('error')
+            self.post(self.status_var.set, "Error en la descarga")
+            self.post(messagebox.showerror, "Error", f"Error durante la descarga: {str(e)}")
         
         finally:
-            self.root.after(0, lambda: self.progress.stop())
-            self.root.after(0, lambda: self.download_button.config(state="normal"))
+            self.post(lambda: self.download_button.config(state="normal"))
 
 def main():
     """Función principal"""